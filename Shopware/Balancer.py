@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+
+from Shopware.Transport import Httplib2Transport
+
+
+class Node(object):
+    """State of a single endpoint of the EndpointPool"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejectedUntil = 0
+
+
+class EndpointPool(object):
+    """Balances the requests across several endpoints of the same shop, e.g.
+    the internal addresses of all app servers
+
+    Every request goes to the endpoint with the least outstanding requests
+    ('least-outstanding') or with the lowest expected waiting time, based on
+    the average latency ('latency'). Endpoints failing *maxFailures* times in
+    a row (connection or server errors) are ejected for *ejectSeconds*; then
+    they get a single trial request which decides, if they are reinserted.
+    With *healthCheckInterval*, ejected endpoints are checked in the
+    background instead and reinserted as soon as they respond.
+
+    The pool is thread safe and can be shared by several clients and all
+    threads of a ThreadedClient.
+
+    :param endpoints: List of API endpoints, e.g. ['http://10.0.0.1/api',
+        'http://10.0.0.2/api']
+    :param strategy: 'least-outstanding' or 'latency'
+    :param maxFailures: Number of failures in a row ejecting an endpoint
+    :param ejectSeconds: Seconds an ejected endpoint does not get requests
+    :param healthCheckInterval: Optional: Seconds between active health
+        checks of ejected endpoints
+    """
+
+    ## Weight of the latest request for the average latency
+    smoothing = 0.2
+
+    def __init__(self, endpoints, strategy='least-outstanding', maxFailures=3,
+        ejectSeconds=30, healthCheckInterval=None):
+        if strategy not in ('least-outstanding', 'latency'):
+            raise ValueError("Unknown strategy {}".format(strategy))
+
+        self.nodes = [Node(endpoint.rstrip("/").rstrip("\\")) for endpoint in endpoints]
+        self.endpoints = [node.endpoint for node in self.nodes]
+        self.strategy = strategy
+        self.maxFailures = maxFailures
+        self.ejectSeconds = ejectSeconds
+        self.healthCheckInterval = healthCheckInterval
+
+        self.lock = threading.Lock()
+        self.next = 0
+        self.checker = None
+
+    def acquire(self):
+        """Choose the endpoint for the next request
+
+        Needs to be followed by a call of **release**.
+
+        :returns: The endpoint
+        """
+
+        now = time.time()
+        with self.lock:
+            nodes = [node for node in self.nodes if node.ejectedUntil <= now]
+            if not nodes:
+                ## All endpoints are ejected, try the one back first
+                nodes = [min(self.nodes, key=lambda node: node.ejectedUntil)]
+
+            ## Rotate the start, so ties are distributed evenly
+            self.next = (self.next + 1) % len(nodes)
+            nodes = nodes[self.next:] + nodes[:self.next]
+
+            node = min(nodes, key=self.cost)
+            node.outstanding += 1
+            if node.ejectedUntil:
+                ## Trial request of an ejected endpoint, hold the others back
+                node.ejectedUntil = now + self.ejectSeconds
+            return node.endpoint
+
+    def cost(self, node):
+        if self.strategy == 'latency':
+            return (node.outstanding + 1) * (node.latency or 0)
+        return node.outstanding
+
+    def release(self, endpoint, success, seconds=None):
+        """Report the outcome of a request
+
+        :param endpoint: The endpoint returned by **acquire**
+        :param success: False for connection and server errors, None if the
+            request was not sent at all
+        :param seconds: Duration of the request
+        """
+
+        with self.lock:
+            node = self.node(endpoint)
+            node.outstanding -= 1
+            if success is None:
+                return
+
+            if success:
+                if node.ejectedUntil:
+                    logging.info("Endpoint {} reinserted".format(endpoint))
+                node.failures = 0
+                node.ejectedUntil = 0
+                if seconds is not None:
+                    if node.latency is None:
+                        node.latency = seconds
+                    else:
+                        node.latency += self.smoothing * (seconds - node.latency)
+                return
+
+            node.failures += 1
+            if node.failures >= self.maxFailures:
+                if not node.ejectedUntil:
+                    logging.warning("Endpoint {} ejected".format(endpoint))
+                node.ejectedUntil = time.time() + self.ejectSeconds
+
+    def node(self, endpoint):
+        for node in self.nodes:
+            if node.endpoint == endpoint:
+                return node
+        raise KeyError(endpoint)
+
+    def status(self):
+        """Returns a dict endpoint => dict with 'outstanding' requests,
+        average 'latency' and whether it is 'ejected'"""
+
+        now = time.time()
+        with self.lock:
+            return {
+                node.endpoint: {
+                    'outstanding': node.outstanding,
+                    'latency': node.latency,
+                    'ejected': node.ejectedUntil > now
+                } for node in self.nodes
+            }
+
+    def startHealthChecks(self, user, key, resource='version', transport=None):
+        """Start checking ejected endpoints in a background thread, if a
+        *healthCheckInterval* is configured. Called by the Request
+
+        :param transport: Optional: Shopware.Transport.Transport sending the
+            checks, usually the one of the client
+        """
+
+        with self.lock:
+            if not self.healthCheckInterval or self.checker:
+                return
+            self.checker = threading.Thread(
+                target=self.checkHealth,
+                args=(user, key, resource, transport or Httplib2Transport(cache=None)),
+                name='HealthChecks'
+            )
+            self.checker.daemon = True
+            self.checker.start()
+
+    def checkHealth(self, user, key, resource, transport):
+        timeout = (self.healthCheckInterval, self.healthCheckInterval)
+
+        while True:
+            time.sleep(self.healthCheckInterval)
+            with self.lock:
+                ejected = [node.endpoint for node in self.nodes if node.ejectedUntil]
+
+            for endpoint in ejected:
+                try:
+                    status, content = transport.request('GET',
+                        endpoint + "/" + resource + "/", None, {}, (user, key),
+                        timeout=timeout)
+                    healthy = status < 500
+                except Exception:
+                    healthy = False
+
+                if healthy:
+                    with self.lock:
+                        node = self.node(endpoint)
+                        node.failures = 0
+                        node.ejectedUntil = 0
+                    logging.info("Endpoint {} reinserted".format(endpoint))
@@ -0,0 +1,198 @@
+import collections
+import logging
+import queue
+import threading
+
+
+class BatchCallback(object):
+    """Wraps a function taking a list of completed tasks, so it can be passed
+    as success or error callback of many tasks
+
+    The ThreadedExecutor and OrderedExecutor call the function once for each
+    batch they take from their buffer, after the other callbacks of the
+    batch. The other executors call it with a list of a single task. Failed
+    tasks carry their error in *task.error*.
+
+    :param function: Function called with the list of tasks
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, *args):
+        self.function([args[-1]])
+
+    def batch(self, calls):
+        """Call the function once for the arguments of several callbacks"""
+
+        self.function([args[-1] for args in calls])
+
+
+class InlineExecutor(object):
+    """Calls the callbacks right away in the worker thread which processed
+    the task. This is the default of the ThreadedClient
+
+    Slow callbacks stall the worker, callbacks need to be thread safe.
+    """
+
+    ## If True, the ThreadedClient runs **process** while it waits in join
+    drainedByCaller = False
+
+    def dispatch(self, callback, *args):
+        callback(*args)
+
+    def process(self, max=None, timeout=0):
+        return 0
+
+    def join(self, timeout=None):
+        return True
+
+    def shutdown(self):
+        pass
+
+
+class QueueExecutor(InlineExecutor):
+    """Collects the callbacks in a queue, the caller runs them in its own
+    thread by calling **process** regularly
+
+    No locking is needed in the callbacks, as they all run in the caller's
+    thread. If the queue is full, the workers wait for the caller.
+
+    :param maxPending: Number of callbacks to buffer at most, 0 for no limit
+    """
+
+    drainedByCaller = True
+
+    def __init__(self, maxPending=10000):
+        self.queue = queue.Queue(maxPending)
+
+    def dispatch(self, callback, *args):
+        self.queue.put((callback, args))
+
+    def process(self, max=None, timeout=0):
+        """Run the pending callbacks in the current thread
+
+        :param max: Optional: Number of callbacks to run at most
+        :param timeout: Seconds to wait for the first callback
+        :returns: Number of callbacks run
+        """
+
+        count = 0
+        block = bool(timeout)
+        while max is None or count < max:
+            try:
+                callback, args = self.queue.get(block, timeout)
+            except queue.Empty:
+                break
+            block = False
+            callback(*args)
+            count += 1
+        return count
+
+    def join(self, timeout=None):
+        self.process()
+        return True
+
+
+class ThreadedExecutor(InlineExecutor):
+    """Runs the callbacks in a pool of dedicated threads, so the workers can
+    continue with the next request right away
+
+    :param numThreads: Number of callback threads
+    :param maxPending: Number of callbacks to buffer at most, 0 for no limit.
+        If the buffer is full, the workers wait for the callback threads
+    :param batchSize: Number of callbacks a callback thread takes from the
+        buffer at once. The callbacks still run one by one, except for a
+        BatchCallback, which gets the tasks of the whole batch at once
+    """
+
+    def __init__(self, numThreads=2, maxPending=10000, batchSize=50):
+        self.queue = queue.Queue(maxPending)
+        self.batchSize = batchSize
+        ## Callbacks are not queued behind the exit markers
+        self.lock = threading.Lock()
+        self.stopped = False
+
+        self.threads = []
+        for i in range(numThreads):
+            thread = threading.Thread(target=self.run, name="Callbacks-{}".format(i))
+            thread.start()
+            self.threads.append(thread)
+
+    def dispatch(self, callback, *args):
+        with self.lock:
+            if self.stopped:
+                logging.warning("Callback {} dropped, the executor was shut down".format(callback))
+                return
+            self.queue.put((callback, args))
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                ## Stop at the exit marker, it belongs to this thread
+                while len(batch) < self.batchSize and batch[-1] is not None:
+                    batch.append(self.queue.get(block=False))
+            except queue.Empty:
+                pass
+
+            batched = collections.OrderedDict()
+            for item in batch:
+                if item is None:
+                    continue
+                callback, args = item
+                if isinstance(callback, BatchCallback):
+                    batched.setdefault(callback, []).append(args)
+                else:
+                    self.call(callback, *args)
+
+            for callback, calls in batched.items():
+                self.call(callback.batch, calls)
+
+            for item in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            logging.exception("Error in callback {}".format(callback))
+
+    def join(self, timeout=None):
+        """Block until all buffered callbacks ran"""
+
+        with self.queue.all_tasks_done:
+            return self.queue.all_tasks_done.wait_for(
+                lambda: not self.queue.unfinished_tasks, timeout
+            )
+
+    def shutdown(self):
+        """Run the buffered callbacks and stop the callback threads. Blocks
+        until they are done, unless called from a callback"""
+
+        with self.lock:
+            if self.stopped:
+                return
+            self.stopped = True
+            for thread in self.threads:
+                self.queue.put(None)
+
+        current = threading.current_thread()
+        for thread in self.threads:
+            if thread is not current:
+                thread.join()
+
+
+class OrderedExecutor(ThreadedExecutor):
+    """Runs the callbacks one after another in a single dedicated thread, in
+    the order the tasks finished. Callbacks do not need to be thread safe
+
+    :param maxPending: Number of callbacks to buffer at most, 0 for no limit
+    :param batchSize: Number of callbacks taken from the buffer at once, see
+        ThreadedExecutor
+    """
+
+    def __init__(self, maxPending=10000, batchSize=50):
+        ThreadedExecutor.__init__(self, 1, maxPending, batchSize)
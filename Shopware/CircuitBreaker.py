@@ -0,0 +1,141 @@
+import collections
+import logging
+import threading
+import time
+
+
+class Circuit(object):
+    """State of a single circuit of the CircuitBreaker"""
+
+    def __init__(self, windowSize):
+        self.state = CircuitBreaker.CLOSED
+        self.calls = collections.deque(maxlen=windowSize)
+        self.openedAt = 0
+        self.probing = 0
+        self.probeSuccesses = 0
+
+
+class CircuitBreaker(object):
+    """Stops sending requests to a shop which is unhealthy
+
+    The breaker tracks the outcome of the recent requests. If too many of
+    them failed (connection errors, server errors or - optionally - requests
+    taking too long), the circuit opens and requests fail right away with a
+    Shopware.Request.CircuitOpenError instead of adding load to the shop.
+    After *resetTimeout* seconds a few probe requests are let through; if
+    they succeed the circuit closes again, otherwise it stays open.
+
+    One breaker can be shared by several clients and all threads of a
+    ThreadedClient.
+
+    :param failureRate: Rate of failed requests (0-1) opening the circuit
+    :param slowCallSeconds: Optional: Requests taking longer count as failed
+    :param windowSize: Number of recent requests to consider
+    :param minCalls: Number of requests needed before the circuit may open
+    :param resetTimeout: Seconds until probe requests are sent
+    :param probes: Number of successful probe requests closing the circuit
+    :param perResource: If True, every resource has its own circuit,
+        otherwise there is one circuit per endpoint
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failureRate=0.5, slowCallSeconds=None, windowSize=50,
+        minCalls=10, resetTimeout=30, probes=3, perResource=False):
+        self.failureRate = failureRate
+        self.slowCallSeconds = slowCallSeconds
+        self.windowSize = windowSize
+        self.minCalls = minCalls
+        self.resetTimeout = resetTimeout
+        self.probes = probes
+        self.perResource = perResource
+
+        self.lock = threading.Lock()
+        self.circuits = {}
+
+    def key(self, endpoint, resource):
+        """Returns the key of the circuit for the given endpoint/resource"""
+
+        if self.perResource:
+            return endpoint + "/" + resource
+        return endpoint
+
+    def state(self, key):
+        """Returns the state of a circuit: CLOSED, OPEN or HALF_OPEN"""
+
+        with self.lock:
+            return self.circuit(key).state
+
+    def circuit(self, key):
+        circuit = self.circuits.get(key)
+        if circuit is None:
+            circuit = self.circuits[key] = Circuit(self.windowSize)
+        return circuit
+
+    def acquire(self, key):
+        """Ask for permission to send a request
+
+        :returns: 0 if the request may be sent, otherwise the seconds until
+            it makes sense to ask again
+        """
+
+        now = time.time()
+        with self.lock:
+            circuit = self.circuit(key)
+            if circuit.state == self.OPEN:
+                wait = circuit.openedAt + self.resetTimeout - now
+                if wait > 0:
+                    return wait
+                logging.info("Circuit {} half-open, sending probes".format(key))
+                circuit.state = self.HALF_OPEN
+                circuit.probing = 0
+                circuit.probeSuccesses = 0
+
+            if circuit.state == self.HALF_OPEN:
+                if circuit.probing >= self.probes:
+                    return min(1, self.resetTimeout)
+                circuit.probing += 1
+            return 0
+
+    def record(self, key, success, seconds):
+        """Record the outcome of a request sent after **acquire**
+
+        :param key: Key of the circuit
+        :param success: False for connection and server errors
+        :param seconds: Duration of the request
+        """
+
+        if self.slowCallSeconds is not None and seconds > self.slowCallSeconds:
+            success = False
+
+        with self.lock:
+            circuit = self.circuit(key)
+            if circuit.state == self.HALF_OPEN:
+                circuit.probing -= 1
+                if not success:
+                    self.open(key, circuit)
+                    return
+                circuit.probeSuccesses += 1
+                if circuit.probeSuccesses >= self.probes:
+                    logging.info("Circuit {} closed".format(key))
+                    circuit.state = self.CLOSED
+                    circuit.calls.clear()
+                return
+
+            ## Late results of requests sent before the circuit opened
+            if circuit.state == self.OPEN:
+                return
+
+            circuit.calls.append(success)
+            if len(circuit.calls) >= self.minCalls:
+                failures = circuit.calls.count(False)
+                if failures >= self.failureRate * len(circuit.calls):
+                    self.open(key, circuit)
+
+    def open(self, key, circuit):
+        logging.warning("Circuit {} opened".format(key))
+        circuit.state = self.OPEN
+        circuit.openedAt = time.time()
+        circuit.calls.clear()
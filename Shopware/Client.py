@@ -1,8 +1,19 @@
+import collections
 import logging
 import queue
+import threading
+import time
 
-from Shopware.Request import Request, ThreadedRequest
-from Shopware.Tasks import APITask, ExitTask
+from Shopware.Request import Request, ThreadedRequest, DependencyError, \
+    CancelledError, PreparedRequest
+from Shopware.Tasks import APITask, MediaTask, UpsertTask, UpsertBatchTask, \
+    PreparedTask, WarmUpTask, ExitTask
+from Shopware.Media import MediaCache
+from Shopware.Callbacks import InlineExecutor
+from Shopware.Balancer import EndpointPool
+from Shopware.Transport import Httplib2Transport
+from Shopware.WorkQueue import ShardedQueue, SpillQueue
+from Shopware.Profiler import startProfiler
 
 
 
@@ -10,14 +21,39 @@ class SimpleClient(Request):
     """Interface to a shopware shop's API
 
     :param endpoint: Endpoint of your shopware API,
-        e.g. http://www.myshop/api
+        e.g. http://www.myshop/api. Pass a list of endpoints or a
+        Shopware.Balancer.EndpointPool to balance the requests across
+        several app servers
     :param user: Your backend user name
     :param key: Your API key, configured for each backend user
+    :param index: Optional: Shopware.Index.IdIndex. Calls by number (e.g.
+        **updateByNumber**) are sent to the id-based url, if the index knows
+        the id of the number
+    :param circuitBreaker: Optional: Shopware.CircuitBreaker.CircuitBreaker.
+        While the shop is unhealthy, requests fail right away with a
+        Shopware.Request.CircuitOpenError
+    :param transport: Optional: Shopware.Transport.Transport sending the
+        requests, e.g. Shopware.Transport.Http2Transport. Defaults to
+        httplib2
+    :param hedging: Optional: Shopware.Hedging.HedgingPolicy. GET requests
+        without response after the policy's delay are sent a second time,
+        the first response wins
+    :param timeout: Optional: Timeout of every request in seconds or a tuple
+        of connect and read timeout. Use **withLimits** for deadlines
+    :param lazy: If True, responses are returned as
+        Shopware.Request.LazyResponse: success and data.id are read without
+        decoding the response, everything else decodes it on first access
+    :param profile: Optional: Path to write a profile to at exit (see
+        Shopware.Profiler.SamplingProfiler) or a SamplingProfiler
     """
 
     def __init__(self, *args, **kwargs):
+        profile = kwargs.pop('profile', None)
         Request.__init__(self, *args, **kwargs)
 
+        self.mediaCache = MediaCache()
+        self.profiler = startProfiler(profile)
+
     def create(self, resource, data, params={}):
         """Create a resource
 
@@ -207,6 +243,60 @@ class SimpleClient(Request):
         params['useNumberAsId'] = True
         return self.read(resource, id, params=params)
 
+    def readPages(self, resource, params={}, pageSize=500, sizer=None):
+        """Read all entities of a resource page by page
+
+        :param resource: API resource, e.g. 'articles'
+        :param params: Additional params of the list reads, e.g. filters.
+            Sorted by id by default, so the pages are stable
+        :param pageSize: Entities per request
+        :param sizer: Optional: Shopware.Paging.PageSizer choosing the page
+            size instead
+        :returns: Generator of the pages, lists of entities
+        """
+
+        params = dict(params)
+        if not any(key.startswith('sort[') for key in params):
+            params['sort[0][property]'] = 'id'
+            params['sort[0][direction]'] = 'ASC'
+
+        start = 0
+        while True:
+            limit = sizer.size(resource) if sizer is not None else pageSize
+            params['start'] = start
+            params['limit'] = limit
+
+            began = time.time()
+            entities = self.read(resource, params=params)['data']
+            if sizer is not None:
+                sizer.observe(resource, limit, len(entities),
+                    time.time() - began, getattr(self.local, 'received', None))
+
+            if entities:
+                yield entities
+            if len(entities) < limit:
+                return
+            start += len(entities)
+
+    def uploadMedia(self, source, data=None, params={}, mimeType=None):
+        """Upload a file to the media resource
+
+        The file is memory mapped and streamed as base64 encoded JSON body, so
+        it is never held in memory as a whole. Files are remembered by their
+        content hash: uploading the same content with the same fields again
+        returns the result of the first upload without another request.
+
+        :param source: Path of the file or any object supporting the buffer
+            protocol (bytes, bytearray, memoryview, mmap)
+        :param data: Additional fields of the media object, e.g.
+            {'album': -1, 'description': 'My image'}
+        :param params: Additional params to append to the request *URL*
+        :param mimeType: Optional: Mime type of the file. Guessed from the
+            file name if not set
+        """
+
+        return self.mediaCache.upload(self, source, data, params, mimeType)
+
 class ThreadedClient(object):
     """The threaded client allows you to query the API asynchronous
 
@@ -230,26 +320,133 @@ class ThreadedClient(object):
     keep an eye on thise while increasing the number of threads used by this
     script.
 
-    :param endpoint: API endpoint, e.g. http://www.shopware.dev/api
+    **Dependencies**
+
+    Tasks may depend on other tasks, e.g. articles on the categories they are
+    assigned to. Pass the tasks returned by **push** as *dependsOn* or use
+    Shopware.Tasks.ResultOf placeholders to refer to the id of a created
+    object. A task is queued as soon as all of its dependencies finished, so
+    independent branches are processed in parallel. If a dependency fails,
+    the dependent tasks fail with a Shopware.Request.DependencyError.
+    Call **join** to wait for all pushed tasks.
+
+    :param endpoint: API endpoint, e.g. http://www.shopware.dev/api, a list of
+        endpoints or a Shopware.Balancer.EndpointPool shared by all threads
     :param user: API user
     :param key: API user's key
     :param numThreads: Number of threads to spawn
+    :param maxMediaUploads: Number of media uploads (see **pushMedia**)
+        processed at the same time
+    :param index: Optional: Shopware.Index.IdIndex shared by all threads, see
+        SimpleClient
+    :param warmUp: If True, all threads connect to the shop before the
+        constructor returns, see **warmUp**
+    :param callbackExecutor: Optional: Where to run the callbacks, see
+        Shopware.Callbacks. By default they are called by the worker thread
+        which processed the task
+    :param circuitBreaker: Optional: Shopware.CircuitBreaker.CircuitBreaker
+        shared by all threads
+    :param pauseOnOpenCircuit: If True, the threads pause while the circuit
+        is open and process the tasks afterwards. Otherwise the tasks fail
+        with a Shopware.Request.CircuitOpenError
+    :param transport: Optional: Shopware.Transport.Transport shared by all
+        threads, e.g. Shopware.Transport.Http2Transport multiplexing the
+        requests of all threads over a few connections
+    :param maxPending: Optional: Number of unfinished tasks at most. If
+        reached, **push** blocks until a task finished, so producers cannot
+        outrun the threads. Do not push tasks from callbacks then
+    :param hedging: Optional: Shopware.Hedging.HedgingPolicy shared by all
+        threads, see SimpleClient
+    :param timeout: Optional: Timeout of every request in seconds or a tuple
+        of connect and read timeout, so a hung connection does not block a
+        thread forever
+    :param deadline: Optional: Seconds all tasks need to be done in, see
+        **setDeadline**
+    :param sharded: If True, every thread takes its tasks from a queue of its
+        own and steals from the others when idle, see
+        Shopware.WorkQueue.ShardedQueue. Tasks on the same object (resource
+        and id) are processed in the order they were pushed then
+    :param spillAfter: Optional: Number of queued tasks to keep in memory.
+        Further tasks are written to disk until the threads catch up, see
+        Shopware.WorkQueue.SpillQueue. Unlike *maxPending*, **push** never
+        blocks
+    :param spillDirectory: Optional: Directory for the spilled tasks, a
+        temporary directory by default
+    :param profile: Optional: Path to write a profile of all threads to on
+        **exit** (see Shopware.Profiler.SamplingProfiler) or a
+        SamplingProfiler
+    :param sink: Optional: Shopware.Sink.SqliteSink recording the outcome of
+        every task. It is closed on **exit**
+    :param lazy: If True, task results are Shopware.Request.LazyResponse
+        objects, decoded only when read. Saves most of the decoding for
+        writes whose responses are not looked at
 
     """
 
-    def __init__(self, endpoint, user, key, numThreads=3):
+    ## Shops by name, see Shopware.Shops.ShopManager
+    shops = None
+
+    def __init__(self, endpoint, user, key, numThreads=3, maxMediaUploads=2,
+        index=None, warmUp=False, callbackExecutor=None, circuitBreaker=None,
+        pauseOnOpenCircuit=False, transport=None, maxPending=0, hedging=None,
+        timeout=None, deadline=None, sharded=False, spillAfter=0,
+        spillDirectory=None, profile=None, sink=None, lazy=False):
+        if sharded and spillAfter:
+            raise ValueError("A sharded queue cannot spill to disk")
+
+        if isinstance(endpoint, (list, tuple)):
+            endpoint = EndpointPool(endpoint)
         self.endpoint = endpoint
         self.user = user
         self.key = key
+        self.index = index
+        self.circuitBreaker = circuitBreaker
+        self.pauseOnOpenCircuit = pauseOnOpenCircuit
+        self.transport = transport or Httplib2Transport()
+        self.hedging = hedging
+        self.timeout = timeout
+        self.lazy = lazy
+        self.deadline = None
+        if deadline is not None:
+            self.setDeadline(deadline)
 
         self.numThreads = numThreads
-        self.queue = queue.Queue()
+        self.sharded = sharded
+        if sharded:
+            self.queue = ShardedQueue(numThreads)
+        elif spillAfter:
+            self.queue = SpillQueue(spillAfter, spillDirectory)
+        else:
+            self.queue = queue.Queue()
 
         self.defaultSuccessCallback = None
         self.defaultErrorCallback = None
 
+        ## Tasks not finished yet and tasks waiting for their dependencies
+        self.lock = threading.Condition()
+        self.unfinished = 0
+        self.waiting = set()
+        ## Room for at least one task per thread
+        self.maxPending = maxPending and max(maxPending, numThreads)
+
+        ## Concurrency limits of task groups, tasks exceeding the limit are
+        ## held back until another task of the group finished
+        self.groupLimits = {'media': maxMediaUploads}
+        self.running = collections.Counter()
+        self.throttled = collections.defaultdict(collections.deque)
+        ## Unfinished tasks by tag, see cancel
+        self.tagged = collections.defaultdict(set)
+
+        self.mediaCache = MediaCache()
+        self.callbackExecutor = callbackExecutor or InlineExecutor()
+        self.profiler = startProfiler(profile)
+        self.sink = sink
+
         self.spawnThreads()
 
+        if warmUp:
+            self.readiness = self.warmUp()
+
     def spawnThreads(self):
         """Internal helper function to spawn the configured number of threads"""
 
@@ -257,29 +454,310 @@ class ThreadedClient(object):
         for id in range(self.numThreads):
             thread = ThreadedRequest(
                 id,
-                self.queue,
+                self.queue.worker(id) if self.sharded else self.queue,
                 self.endpoint,
                 self.user,
-                self.key
+                self.key,
+                onTaskDone=self.taskDone,
+                index=self.index,
+                callbackExecutor=self.callbackExecutor,
+                circuitBreaker=self.circuitBreaker,
+                pauseOnOpenCircuit=self.pauseOnOpenCircuit,
+                transport=self.transport,
+                hedging=self.hedging,
+                timeout=self.timeout,
+                shops=self.shops,
+                lazy=self.lazy,
+                onTaskStart=self.taskStarted
             )
             thread.start()
             self.threads.append(thread)
 
+    def warmUp(self, timeout=None):
+        """Let all threads connect to the shop in parallel
+
+        The transport resolves the shop's host (the default transport caches
+        the addresses for all following connections), every thread opens its
+        connection and authenticates it, so the first real tasks do not pay
+        for the connection setup.
+
+        :param timeout: Optional: Seconds to wait for the threads at most
+        :returns: A dict with the number of 'ready' and 'failed' threads, the
+            'errors' of the failed ones and the 'seconds' it took
+        """
+
+        start = time.time()
+        barrier = threading.Barrier(self.numThreads)
+        tasks = [WarmUpTask(barrier, timeout) for i in range(self.numThreads)]
+        for task in tasks:
+            self.schedule(task)
+        for task in tasks:
+            task.wait(timeout)
+
+        errors = [task.error for task in tasks if task.error is not None]
+        readiness = {
+            'ready': len([task for task in tasks if task.finished and task.error is None]),
+            'failed': len(errors),
+            'errors': errors,
+            'seconds': time.time() - start
+        }
+        logging.info("{} of {} threads connected in {} seconds".format(
+            readiness['ready'], self.numThreads, round(readiness['seconds'], 2)
+        ))
+        return readiness
+
     def exit(self):
-        """Clear the queue and put exit tasks into it"""
+        """Clear the queue and put exit tasks into it. Waits for the tasks in
+        progress, so their callbacks still run and their outcome is recorded.
+        Tasks which did not start fail with a Shopware.Request.CancelledError
+        """
 
-        ## Empty the queue
-        try:
-            while self.queue.get(block=False):
-                pass
-        except queue.Empty:
-            pass
+        failed = []
+        with self.lock:
+            ## Tasks still waiting for their dependencies or a free slot,
+            ## taken first, so failing the queued ones admits none of them
+            discarded = list(self.waiting)
+            for tasks in self.throttled.values():
+                discarded.extend(tasks)
+                tasks.clear()
+            self._discard(discarded, failed)
+        with self.lock:
+            self._discard(self._drain(), failed)
+        self._dispatch([], failed)
 
         ## Push ExitTasks
         for i in range(self.numThreads):
             self.queue.put(ExitTask())
 
+        current = threading.current_thread()
+        for thread in self.threads:
+            if thread is not current:
+                thread.join()
+
+        ## Queued meanwhile, e.g. by other threads pushing
+        failed = []
+        with self.lock:
+            self._discard(self._drain(), failed)
+        self._dispatch([], failed)
+        if isinstance(self.queue, SpillQueue):
+            self.queue.close()
+
+        self.callbackExecutor.shutdown()
+
+        if self.sink is not None:
+            self.sink.close()
+
+        if self.profiler is not None:
+            self.profiler.stop()
 
+    def _drain(self):
+        """Internal helper removing all tasks from the queue"""
+
+        tasks = []
+        try:
+            while True:
+                task = self.queue.get(block=False)
+                self.queue.task_done()
+                if not isinstance(task, ExitTask):
+                    tasks.append(task)
+        except queue.Empty:
+            pass
+        return tasks
+
+    def _discard(self, tasks, failed):
+        """Internal helper failing tasks which did not start, as the client
+        exits. Needs to be called with the lock held"""
+
+        while tasks:
+            ready = []
+            for task in tasks:
+                if task.finished:
+                    ## Failed already as a dependent of another one
+                    continue
+                self.waiting.discard(task)
+                task.cancelled.set()
+                task.error = CancelledError("Client exited before the task was processed")
+                failed.append(task)
+                self._finish(task, ready, failed)
+            tasks = ready
+
+    def join(self, timeout=None):
+        """Block until all pushed tasks (including the ones waiting for their
+        dependencies) were processed
+
+        :param timeout: Optional: Seconds to wait at most
+        :returns: True if all tasks are done, False if the timeout was hit
+        """
+
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        executor = self.callbackExecutor
+        while True:
+            ## Callbacks queued for the caller need to be run meanwhile
+            wait = 0.05 if executor.drainedByCaller else None
+            if timeout is not None:
+                remaining = max(deadline - time.time(), 0)
+                wait = remaining if wait is None else min(wait, remaining)
+
+            executor.process()
+            with self.lock:
+                if self.lock.wait_for(lambda: self.unfinished <= 0, wait):
+                    break
+            if timeout is not None and time.time() >= deadline:
+                return False
+
+        if timeout is not None:
+            return executor.join(max(deadline - time.time(), 0))
+        return executor.join()
+
+    def taskStarted(self, task):
+        """Internal helper called by the worker threads before a task is
+        processed"""
+
+    def taskDone(self, task):
+        """Internal helper called by the worker threads once a task was
+        processed. Queues dependent tasks which are ready now or fails them,
+        if the task itself failed"""
+
+        ready, failed = [], []
+        with self.lock:
+            self._finish(task, ready, failed)
+        self._dispatch(ready, failed)
+
+    def _finish(self, task, ready, failed):
+        """Mark a task as finished and collect its dependents which are ready
+        to run or need to fail now. Needs to be called with the lock held"""
+
+        task.finished = True
+        self.unfinished -= 1
+        self.lock.notify_all()
+
+        if self.sink is not None:
+            self.sink.record(task)
+
+        for tag in task.tags:
+            tagged = self.tagged[tag]
+            tagged.discard(task)
+            if not tagged:
+                del self.tagged[tag]
+
+        ## Free the group slots for the next tasks of the groups
+        slots, task.slots = task.slots, []
+        for slot in slots:
+            self.running[slot] -= 1
+        for slot in slots:
+            throttled = self.throttled[slot]
+            if throttled:
+                self._admit(throttled.popleft(), ready)
+
+        for dependent in task.dependents:
+            if dependent not in self.waiting:
+                continue
+            if task.error is not None:
+                self.waiting.discard(dependent)
+                dependent.error = DependencyError(
+                    "Task depends on a failed task", task
+                )
+                failed.append(dependent)
+                self._finish(dependent, ready, failed)
+                continue
+
+            dependent.waitingFor -= 1
+            if dependent.waitingFor == 0:
+                self.waiting.discard(dependent)
+                self._admit(dependent, ready)
+
+        if task not in failed:
+            task.done.set()
+
+    def groupsOf(self, task):
+        """Returns the groups with a concurrency limit the task belongs to"""
+
+        if task.group in self.groupLimits:
+            return [task.group]
+        return []
+
+    def _admit(self, task, ready):
+        """Mark a task ready to run, if the concurrency limits of its groups
+        allow for it. Needs to be called with the lock held"""
+
+        groups = self.groupsOf(task)
+        for group in groups:
+            if self.running[group] >= self.groupLimits[group]:
+                self.throttled[group].append(task)
+                return
+        for group in groups:
+            self.running[group] += 1
+        task.slots = groups
+        ready.append(task)
+
+    def _dispatch(self, ready, failed):
+        """Queue tasks which are ready and call the error callbacks of tasks
+        which failed due to their dependencies. Called without the lock"""
+
+        for task in ready:
+            self.queue.put(task)
+
+        for task in failed:
+            if task.errorCallback:
+                self.callbackExecutor.dispatch(task.errorCallback, task.error, task)
+            else:
+                print(task.error)
+            task.done.set()
+
+
+
+    def setDeadline(self, seconds):
+        """Set a deadline for the whole job: tasks pushed from now on fail
+        with a Shopware.Request.DeadlineError, if they are not done within
+        *seconds*. Their requests time out at the deadline
+
+        :param seconds: Seconds from now, None to remove the deadline
+        """
+
+        self.deadline = time.time() + seconds if seconds is not None else None
+
+    def cancel(self, task=None, tag=None):
+        """Cancel a task or all unfinished tasks with the given tag
+
+        Tasks which did not start yet fail with a
+        Shopware.Request.CancelledError, tasks depending on them with a
+        DependencyError. Tasks in progress do not send any further request
+        (e.g. the create of an upsert or the next batch), a request already
+        sent is finished though.
+
+        :param task: The task to cancel, as returned by **push**
+        :param tag: Cancel all unfinished tasks with this tag instead
+        :returns: Number of tasks cancelled
+        """
+
+        ready, failed = [], []
+        with self.lock:
+            if tag is not None:
+                tasks = list(self.tagged.get(tag, ()))
+            else:
+                tasks = [task] if task is not None and not task.finished else []
+
+            for task in tasks:
+                task.cancelled.set()
+
+                ## Tasks not queued yet are failed right away, queued and
+                ## running ones by their worker
+                throttled = [self.throttled[group] for group in self.groupsOf(task)
+                    if task in self.throttled.get(group, ())]
+                if task in self.waiting:
+                    self.waiting.discard(task)
+                elif throttled:
+                    throttled[0].remove(task)
+                else:
+                    continue
+                task.error = CancelledError("Task was cancelled")
+                failed.append(task)
+                self._finish(task, ready, failed)
+
+        self._dispatch(ready, failed)
+        return len(tasks)
 
     def setDefaultSuccessCallback(self, callback):
         """Set the default callback for successfull taks.
@@ -298,7 +776,8 @@ class ThreadedClient(object):
         self.defaultErrorCallback = callback
 
     def push(self, resource, action='GET', id=None, data=None, params={},
-        successCallback=None, errorCallback=None):
+        successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+        deadline=None, tags=None):
         """Push a task to the queue
 
         Adds a new taks to the queue which is processed by the threaded request
@@ -318,6 +797,14 @@ class ThreadedClient(object):
         :param successCallback: Function to be called if the request was process
         successfully
         :param errorCallback: Function to be called if an error occurred
+        :param dependsOn: Optional: List of tasks (as returned by push) which
+            need to be finished before this task is processed
+        :param timeout: Optional: Timeout of every request of the task in
+            seconds or a tuple of connect and read timeout
+        :param deadline: Optional: Seconds the task needs to be done in
+        :param tags: Optional: Tags to **cancel** the task by
+        :returns: The task object, which can be used as dependency, for
+            Shopware.Tasks.ResultOf placeholders or to **wait** for it
         """
 
         ## Get default success/error callbacks if non was passed here
@@ -328,10 +815,206 @@ class ThreadedClient(object):
 
         ## Create a task object
         t = APITask(resource, action, id, data, params,
-            successCallback=successCallback, errorCallback=errorCallback
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
+
+        self.schedule(t)
+        return t
+
+    def pushMedia(self, source, data=None, params={}, mimeType=None,
+        successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+        deadline=None, tags=None):
+        """Push a media upload to the queue
+
+        The file is streamed from disk by the worker, see
+        SimpleClient.uploadMedia. At most *maxMediaUploads* uploads are
+        processed at the same time, so the other workers stay available for
+        regular tasks. Files with the same content and fields are only
+        uploaded once.
+
+        :param source: Path of the file or any object supporting the buffer
+            protocol (bytes, bytearray, memoryview, mmap)
+        :param data: Additional fields of the media object, e.g.
+            {'album': -1, 'description': 'My image'}
+        :param params: Additional params to add to the url
+        :param mimeType: Optional: Mime type of the file
+        :param successCallback: Function to be called if the request was process
+        successfully
+        :param errorCallback: Function to be called if an error occurred
+        :param dependsOn: Optional: List of tasks which need to be finished
+            before the upload is processed
+        :param timeout: Optional: Timeout of every request of the task in
+            seconds or a tuple of connect and read timeout
+        :param deadline: Optional: Seconds the task needs to be done in
+        :param tags: Optional: Tags to **cancel** the task by
+        :returns: The task object
+        """
+
+        if not successCallback:
+            successCallback = self.defaultSuccessCallback
+        if not errorCallback:
+            errorCallback = self.defaultErrorCallback
+
+        t = MediaTask(source, self.mediaCache, data, params, mimeType,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
         )
 
-        ## Push the task to queue
-        self.queue.put(t)
+        self.schedule(t)
+        return t
+
+    def upsert(self, resource, number, data, params={},
+        successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+        deadline=None, tags=None):
+        """Push a task updating the object with the given number or creating
+        it, if it does not exist yet. See Shopware.Request.Request.upsert
+
+        The task's result has 'operation' set to 'update' or 'create'.
+
+        :param resource: API resource, e.g. 'articles'
+        :param number: Number of the object, e.g. the article number
+        :param data: Data you want to send
+        :param params: Additional params to add to the url
+        :param successCallback: Function to be called if the request was process
+        successfully
+        :param errorCallback: Function to be called if an error occurred
+        :param dependsOn: Optional: List of tasks which need to be finished
+            before this task is processed
+        :param timeout: Optional: Timeout of every request of the task in
+            seconds or a tuple of connect and read timeout
+        :param deadline: Optional: Seconds the task needs to be done in
+        :param tags: Optional: Tags to **cancel** the task by
+        :returns: The task object
+        """
 
+        if not successCallback:
+            successCallback = self.defaultSuccessCallback
+        if not errorCallback:
+            errorCallback = self.defaultErrorCallback
+
+        t = UpsertTask(resource, number, data, params,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
+
+        self.schedule(t)
+        return t
+
+    def upsertBatch(self, resource, items, params={}, batchSize=100,
+        successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+        deadline=None, tags=None):
+        """Push a task updating or creating many objects using the batch mode
+        of the API. See Shopware.Request.Request.upsertBatch
+
+        The task's result is the list of per-item results. Push several
+        smaller batches to process them in parallel.
+
+        :param resource: API resource, e.g. 'articles'
+        :param items: List of (number, data) tuples or a dict number => data
+        :param params: Additional params to add to the url
+        :param batchSize: Number of items to send with one request
+        :param successCallback: Function to be called if the request was process
+        successfully
+        :param errorCallback: Function to be called if an error occurred
+        :param dependsOn: Optional: List of tasks which need to be finished
+            before this task is processed
+        :param timeout: Optional: Timeout of every request of the task in
+            seconds or a tuple of connect and read timeout
+        :param deadline: Optional: Seconds the task needs to be done in
+        :param tags: Optional: Tags to **cancel** the task by
+        :returns: The task object
+        """
+
+        if not successCallback:
+            successCallback = self.defaultSuccessCallback
+        if not errorCallback:
+            errorCallback = self.defaultErrorCallback
+
+        t = UpsertBatchTask(resource, items, params, batchSize,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
+
+        self.schedule(t)
+        return t
+
+    def prepare(self, request, resource, params={}):
+        """Build a request template, see Shopware.Request.Request.prepare and
+        **pushPrepared**
+
+        :returns: Shopware.Request.PreparedRequest
+        """
+
+        return PreparedRequest(request, resource, params)
+
+    def pushPrepared(self, prepared, id=None, data=None,
+        successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+        deadline=None, tags=None):
+        """Push a task running a call of a request template. Cheaper than
+        **push** for many calls of the same kind::
+
+            read = client.prepare('GET', 'articles')
+            for id in ids:
+                client.pushPrepared(read, id)
+
+        :param prepared: Shopware.Request.PreparedRequest, see **prepare**
+        :param id: Id (or number) of the object to read/delete/update
+        :param data: Data you want to send. None sends no body
+        :param successCallback: Function to be called if the request was process
+        successfully
+        :param errorCallback: Function to be called if an error occurred
+        :param dependsOn: Optional: List of tasks which need to be finished
+            before this task is processed
+        :param timeout: Optional: Timeout of every request of the task in
+            seconds or a tuple of connect and read timeout
+        :param deadline: Optional: Seconds the task needs to be done in
+        :param tags: Optional: Tags to **cancel** the task by
+        :returns: The task object
+        """
+
+        if not successCallback:
+            successCallback = self.defaultSuccessCallback
+        if not errorCallback:
+            errorCallback = self.defaultErrorCallback
+
+        t = PreparedTask(prepared, id, data,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
 
+        self.schedule(t)
+        return t
+
+    def schedule(self, task):
+        """Internal helper to queue a task or to hold it back until all of
+        its dependencies are finished"""
+
+        if self.deadline is not None and (task.deadline is None or self.deadline < task.deadline):
+            task.deadline = self.deadline
+
+        ready, failed = [], []
+        with self.lock:
+            if self.maxPending:
+                self.lock.wait_for(lambda: self.unfinished < self.maxPending)
+            self.unfinished += 1
+            for tag in task.tags:
+                self.tagged[tag].add(task)
+            for dependency in task.dependsOn:
+                if not dependency.finished:
+                    task.waitingFor += 1
+                    dependency.dependents.append(task)
+                elif dependency.error is not None:
+                    task.error = DependencyError(
+                        "Task depends on a failed task", dependency
+                    )
+
+            if task.error is not None:
+                failed.append(task)
+                self._finish(task, ready, failed)
+            elif task.waitingFor:
+                self.waiting.add(task)
+            else:
+                self._admit(task, ready)
+
+        self._dispatch(ready, failed)
@@ -0,0 +1,112 @@
+import socket
+import threading
+import time
+
+import httplib2
+
+
+class DnsCache(object):
+    """Caches the addresses of the shop's hosts for the connections of a
+    Shopware.Transport.Httplib2Transport
+
+    New connections are opened to the cached addresses (see **connect**)
+    until the *ttl* expired, so only the first connection to a host waits for
+    the resolver. The cache is only used by the transport owning it, the
+    resolution of other libraries is not affected.
+
+    :param ttl: Seconds to keep resolved addresses
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def lookup(self, host, port):
+        """Returns the addresses of a host as returned by socket.getaddrinfo,
+        resolved if not cached yet"""
+
+        key = (host, port)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self.lock:
+            ## Drop expired entries of hosts not connected to anymore
+            for other in [other for other, (expires, cached)
+                    in self.entries.items() if expires <= now]:
+                del self.entries[other]
+            self.entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def discard(self, host, port):
+        """Forget the addresses of a host, e.g. because none of them
+        accepted a connection"""
+
+        with self.lock:
+            self.entries.pop((host, port), None)
+
+    def connect(self, host, port, timeout=None):
+        """Returns a socket connected to one of the host's addresses
+
+        :raises socket.error: If no address accepted the connection
+        """
+
+        error = None
+        for family, socktype, proto, canonname, address in self.lookup(host, port):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if timeout is not None:
+                    sock.settimeout(timeout)
+                sock.connect(address)
+                return sock
+            except socket.error as e:
+                sock.close()
+                error = e
+
+        ## The host may have moved, resolve it again next time
+        self.discard(host, port)
+        raise error or socket.error("No address of {} found".format(host))
+
+
+def connectionTypes(dnsCache):
+    """Returns the httplib2 connection classes per scheme connecting to the
+    addresses cached by *dnsCache*. Connections through a proxy are left to
+    httplib2. Connections marked as *interrupted* do not connect again, so
+    httplib2 does not retry an interrupted request"""
+
+    def proxied(connection):
+        info = connection.proxy_info
+        return bool(info) and info.isgood() and info.applies_to(connection.host)
+
+    class CachedHTTPConnection(httplib2.HTTPConnectionWithTimeout):
+        interrupted = False
+
+        def connect(self):
+            if self.interrupted:
+                raise socket.error("Request was interrupted")
+            if proxied(self):
+                return httplib2.HTTPConnectionWithTimeout.connect(self)
+            self.sock = dnsCache.connect(self.host, self.port, self.timeout)
+
+    class CachedHTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+        interrupted = False
+
+        def connect(self):
+            if self.interrupted:
+                raise socket.error("Request was interrupted")
+            if proxied(self):
+                return httplib2.HTTPSConnectionWithTimeout.connect(self)
+            sock = dnsCache.connect(self.host, self.port, self.timeout)
+            try:
+                ## The certificate is checked against the host name
+                self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+            except Exception:
+                sock.close()
+                raise
+
+    return {'http': CachedHTTPConnection, 'https': CachedHTTPSConnection}
@@ -0,0 +1,124 @@
+import collections
+import gzip
+import os
+
+import simplejson
+
+from Shopware.Importer import Progress
+from Shopware.State import readJson, writeJson
+
+
+class Exporter(object):
+    """Streams all entities of a resource to a JSONL file
+
+    The pages of the resource are read concurrently by a ThreadedClient and
+    written in order, one JSON object per line. Only a bounded number of
+    pages is held in memory at any time. Files ending with '.gz' are gzip
+    compressed: every page is written as gzip member of its own, so the file
+    stays valid when the export is interrupted.
+
+    After every page the number of written entities and the file size are
+    saved to '<path>.offset'. With *resume*, an interrupted export continues
+    from there.
+
+    :param client: Shopware.Client.ThreadedClient
+    :param resource: API resource, e.g. 'articles'
+    :param params: Optional: Additional params of the list reads, e.g.
+        filters (see Shopware.Filter.filterParams). Sorted by id by default,
+        so the pages are stable
+    :param pageSize: Entities per request
+    :param window: Pages read at the same time, defaults to two per thread
+    :param progress: Optional: Progress reporting the throughput
+    :param sizer: Optional: Shopware.Paging.PageSizer choosing the page size
+        instead of *pageSize*
+    """
+
+    def __init__(self, client, resource, params=None, pageSize=500, window=None,
+        progress=None, sizer=None):
+        self.client = client
+        self.resource = resource
+        self.params = dict(params or {})
+        if not any(key.startswith('sort[') for key in self.params):
+            self.params['sort[0][property]'] = 'id'
+            self.params['sort[0][direction]'] = 'ASC'
+        self.pageSize = pageSize
+        self.sizer = sizer
+        self.window = window or client.numThreads * 2
+        self.progress = progress or Progress(
+            keys=('written',), rateKeys=('written',)
+        )
+
+    def readState(self, path):
+        statePath = path + '.offset'
+        if not os.path.exists(statePath):
+            return 0, 0
+        state = readJson(statePath)
+        return state['offset'], state['bytes']
+
+    def writeState(self, path, offset, size):
+        writeJson(path + '.offset', {'offset': offset, 'bytes': size})
+
+    def pushPage(self, start):
+        params = dict(self.params)
+        params['start'] = start
+        if self.sizer is not None:
+            params['limit'] = self.sizer.size(self.resource)
+        else:
+            params['limit'] = self.pageSize
+        return self.client.push(self.resource, 'GET', params=params)
+
+    def run(self, path, resume=False):
+        """Export the resource
+
+        :param path: Path of the JSONL file, gzip compressed if it ends with
+            '.gz'
+        :param resume: Continue an interrupted export of the same file
+        :returns: Number of entities in the file
+        """
+
+        offset, size = self.readState(path) if resume else (0, 0)
+        compress = path.endswith('.gz')
+
+        with open(path, 'ab' if resume else 'wb') as f:
+            ## Drop whatever was written after the last saved page
+            f.truncate(size)
+            f.seek(size)
+
+            first = self.pushPage(offset)
+            first.wait()
+            if first.error is not None:
+                raise first.error
+            total = first.result['total']
+
+            pages = collections.deque([first])
+            nextStart = offset + first.param['limit']
+            while pages:
+                while len(pages) < self.window and nextStart < total:
+                    page = self.pushPage(nextStart)
+                    pages.append(page)
+                    nextStart += page.param['limit']
+
+                page = pages.popleft()
+                page.wait()
+                if page.error is not None:
+                    raise page.error
+
+                entities = page.result['data']
+                if self.sizer is not None:
+                    self.sizer.observe(self.resource, page.param['limit'],
+                        len(entities), page.seconds, page.received)
+                if not entities:
+                    break
+                data = ''.join(simplejson.dumps(entity) + '\n' for entity in entities).encode('utf-8')
+                if compress:
+                    data = gzip.compress(data)
+                f.write(data)
+                f.flush()
+
+                offset += len(entities)
+                self.writeState(path, offset, f.tell())
+                self.progress.add('written', len(entities))
+                self.progress.report()
+
+        self.progress.report(force=True)
+        return offset
@@ -0,0 +1,52 @@
+import re
+
+## Expressions understood by parseCondition, longest first. The condition is
+## split at the first operator in the text, so values may contain operators
+operators = ('>=', '<=', '!=', '>', '<', '~', '=')
+_condition = re.compile(r'^(.+?)({})(.*)$'.format('|'.join(map(re.escape, operators))), re.S)
+
+
+def parseCondition(text):
+    """Parse a condition like 'name=My article', 'changed>=2013-01-01' or
+    'name~%shirt%' (LIKE)
+
+    :returns: Tuple of property, expression and value. The expression is None
+        for plain equality
+    """
+
+    match = _condition.match(text)
+    if match is None:
+        raise ValueError("Invalid condition {}".format(text))
+
+    property, operator, value = match.groups()
+    if operator == '=':
+        return property, None, value
+    if operator == '~':
+        return property, 'LIKE', value
+    return property, operator, value
+
+
+def filterParams(conditions, params=None):
+    """Build the filter params of a list read, as in::
+
+        {'filter[0][property]': 'name', 'filter[0][value]': 'My first article'}
+
+    :param conditions: List of (property, expression, value) tuples, see
+        **parseCondition**
+    :param params: Optional: Params to add the filter to. Existing filters
+        are kept
+    :returns: The params
+    """
+
+    params = dict(params or {})
+    index = 0
+    while 'filter[{}][property]'.format(index) in params:
+        index += 1
+
+    for property, expression, value in conditions:
+        params['filter[{}][property]'.format(index)] = property
+        params['filter[{}][value]'.format(index)] = value
+        if expression:
+            params['filter[{}][expression]'.format(index)] = expression
+        index += 1
+    return params
@@ -0,0 +1,214 @@
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class Attempt(object):
+    """State of a hedged request, shared by the calling thread sending the
+    primary request and the thread sending the hedge"""
+
+    def __init__(self, send, interrupt=None):
+        self.send = send
+        self.interrupt = interrupt
+        self.lock = threading.Lock()
+        self.primaryDone = False
+        self.hedged = False
+        ## The hedge succeeded before the primary request finished
+        self.won = False
+        self.succeeded = False
+        self.result = None
+        self.finished = threading.Event()
+
+
+class HedgingPolicy(object):
+    """Sends a second GET request, if the first one is slow
+
+    If a GET has no response after *percentile* of the recent latencies, the
+    same request is sent again (to the next endpoint, if the client balances
+    across several) and the first response wins. Only GET requests are
+    hedged, as they are idempotent.
+
+    The *budget* caps the extra load: every GET earns *budget* hedges, so
+    0.05 allows at most 5% additional requests, bursts included.
+
+    The primary request is sent by the calling thread, on its own
+    connection. A single timer thread starts the hedges of the slow requests
+    on a pool of *maxHedges* threads, so only the hedges pay for a thread
+    switch. If the hedge wins, the primary request is interrupted, provided
+    the transport supports it (see Shopware.Transport.Transport.interruptible),
+    otherwise the caller gets the hedge's result once the primary request
+    finished. A policy can be shared by several clients and threads.
+
+    :param percentile: Percentile of the recent latencies to wait before
+        hedging
+    :param minDelay: Seconds to wait at least
+    :param maxDelay: Seconds to wait at most, also used until *minSamples*
+        latencies are known
+    :param budget: Hedges per GET at most
+    :param window: Number of recent latencies the percentile is computed of
+    :param minSamples: Number of latencies needed for the percentile
+    :param maxHedges: Number of threads sending the hedges
+    """
+
+    def __init__(self, percentile=95, minDelay=0.01, maxDelay=1.0, budget=0.05,
+        window=500, minSamples=20, maxHedges=4):
+        self.percentile = percentile
+        self.minDelay = minDelay
+        self.maxDelay = maxDelay
+        self.budget = budget
+        self.minSamples = minSamples
+
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=window)
+        ## Hedges available, a few can be saved up for bursts
+        self.tokens = 0.0
+        self.maxTokens = max(1.0, budget * 100)
+        self.stats = collections.Counter()
+        self.executor = concurrent.futures.ThreadPoolExecutor(maxHedges)
+
+        ## Attempts by the time they are hedged at, see **runTimer**
+        self.pending = threading.Condition()
+        self.due = []
+        self.order = itertools.count()
+        self.timer = None
+        self.closed = False
+
+    def delay(self):
+        """Returns the seconds to wait before hedging"""
+
+        with self.lock:
+            if len(self.latencies) < self.minSamples:
+                return self.maxDelay
+            latencies = sorted(self.latencies)
+
+        index = min(int(len(latencies) * self.percentile / 100.0), len(latencies) - 1)
+        return min(max(latencies[index], self.minDelay), self.maxDelay)
+
+    def acquire(self):
+        """Take a hedge from the budget, returns False if it is used up"""
+
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.stats['hedged'] += 1
+            return True
+
+    def timed(self, send):
+        start = time.time()
+        result = send()
+        with self.lock:
+            self.latencies.append(time.time() - start)
+        return result
+
+    def run(self, send, interrupt=None):
+        """Run *send*, hedged if it is slow
+
+        :param send: Callable sending the request, e.g. Request.send
+        :param interrupt: Optional: Callable aborting the request *send*
+            runs on the calling thread, called from another thread once
+            the hedge won
+        :returns: The result of the attempt which finished first. If all
+            attempts fail, the error of the primary request is raised
+        """
+
+        with self.lock:
+            self.tokens = min(self.tokens + self.budget, self.maxTokens)
+            self.stats['requests'] += 1
+
+        attempt = Attempt(send, interrupt)
+        self.schedule(attempt, time.time() + self.delay())
+
+        error = None
+        try:
+            result = self.timed(send)
+        except Exception as e:
+            error = e
+        finally:
+            with attempt.lock:
+                attempt.primaryDone = True
+                hedged = attempt.hedged
+
+        if not attempt.won:
+            if error is None:
+                return result
+            if not hedged:
+                raise error
+            ## The primary request failed, the hedge may still succeed
+            attempt.finished.wait()
+            if not attempt.succeeded:
+                raise error
+
+        with self.lock:
+            self.stats['won'] += 1
+        return attempt.result
+
+    def schedule(self, attempt, due):
+        """Internal helper: hedge the attempt at *due*, if it is not done by
+        then"""
+
+        with self.pending:
+            if self.closed:
+                return
+            heapq.heappush(self.due, (due, next(self.order), attempt))
+            if self.timer is None:
+                self.timer = threading.Thread(target=self.runTimer, daemon=True)
+                self.timer.start()
+            self.pending.notify()
+
+    def runTimer(self):
+        """Internal helper: loop of the timer thread starting the hedges"""
+
+        while True:
+            with self.pending:
+                while not self.closed and (not self.due or self.due[0][0] > time.time()):
+                    self.pending.wait(self.due[0][0] - time.time() if self.due else None)
+                if self.closed:
+                    return
+                due, order, attempt = heapq.heappop(self.due)
+            self.hedge(attempt)
+
+    def hedge(self, attempt):
+        """Internal helper starting the hedge of a slow attempt"""
+
+        with attempt.lock:
+            if attempt.primaryDone or not self.acquire():
+                return
+            attempt.hedged = True
+        try:
+            self.executor.submit(self.runHedge, attempt)
+        except RuntimeError:
+            ## Closed meanwhile
+            attempt.finished.set()
+
+    def runHedge(self, attempt):
+        """Internal helper sending the hedge on a thread of the pool"""
+
+        interrupt = None
+        try:
+            result = self.timed(attempt.send)
+            with attempt.lock:
+                attempt.result = result
+                attempt.succeeded = True
+                attempt.won = not attempt.primaryDone
+                if attempt.won:
+                    interrupt = attempt.interrupt
+        except Exception as e:
+            logging.debug("Hedged request failed: {}".format(e))
+        finally:
+            attempt.finished.set()
+
+        if interrupt is not None:
+            interrupt()
+
+    def close(self):
+        """Stop the threads"""
+
+        with self.pending:
+            self.closed = True
+            self.pending.notify()
+        self.executor.shutdown(wait=False)
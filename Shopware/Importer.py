@@ -0,0 +1,344 @@
+import collections
+import concurrent.futures
+import csv
+import gzip
+import io
+import itertools
+import logging
+import sys
+import threading
+import time
+
+import simplejson
+
+from Shopware.Index import IdIndex
+
+
+## Converters available in field mappings, e.g. 'price=mainDetail.prices.0.price:float'
+converters = {
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': lambda value: value.strip().lower() in ('1', 'true', 'yes', 'y'),
+    'json': simplejson.loads,
+}
+
+
+def parseMapping(specs):
+    """Parse field mappings like 'number=mainDetail.number' or
+    'price=mainDetail.prices.0.price:float'
+
+    :param specs: List of mapping strings 'column=path[:converter]'
+    :returns: List of (column, path, converter) tuples
+    """
+
+    mapping = []
+    for spec in specs:
+        column, sep, target = spec.partition('=')
+        if not sep:
+            ## 'active:bool' maps the column to the same path
+            target = column
+            column = column.partition(':')[0]
+        target, sep, converter = target.partition(':')
+        if converter and converter not in converters:
+            raise ValueError("Unknown converter {} in mapping {}".format(converter, spec))
+        path = tuple(int(key) if key.isdigit() else key for key in target.split('.'))
+        mapping.append((column, path, converter or None))
+    return mapping
+
+
+def setPath(data, path, value):
+    """Set a value in nested dicts/lists, creating them on the way. Integer
+    keys address list items"""
+
+    target = data
+    for key, next in zip(path, path[1:]):
+        empty = [] if isinstance(next, int) else {}
+        if isinstance(key, int):
+            while len(target) <= key:
+                target.append(None)
+            if target[key] is None:
+                target[key] = empty
+        elif key not in target:
+            target[key] = empty
+        target = target[key]
+
+    key = path[-1]
+    if isinstance(key, int):
+        while len(target) <= key:
+            target.append(None)
+    target[key] = value
+
+
+def mapRecord(record, mapping):
+    """Build the API data of a record using the field mapping. Without
+    mapping, the record is used as is"""
+
+    if not mapping:
+        return record
+
+    data = {}
+    for column, path, converter in mapping:
+        value = record.get(column)
+        if value is None or value == '':
+            continue
+        if converter:
+            value = converters[converter](value)
+        setPath(data, path, value)
+    return data
+
+
+def transformChunk(job):
+    """Parse and map a chunk of raw records. Runs in the worker processes,
+    so it needs to be a module level function
+
+    :param job: Tuple of format ('jsonl' or 'csv'), the csv header, the
+        mapping and the list of raw records (lines or csv rows)
+    :returns: List of (record number, data or None, error or None) tuples
+    """
+
+    format, header, mapping, start, raw = job
+    results = []
+    for number, item in enumerate(raw, start):
+        try:
+            if format == 'jsonl':
+                record = simplejson.loads(item)
+            else:
+                record = dict(zip(header, item))
+            results.append((number, mapRecord(record, mapping), None))
+        except Exception as e:
+            results.append((number, None, "{}: {}".format(type(e).__name__, e)))
+    return results
+
+
+def openFile(path, mode='rt'):
+    """Open a plain or gzip compressed file, '-' for stdin/stdout"""
+
+    if path == '-':
+        if 'r' in mode:
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8', newline='' if 'r' in mode else None)
+
+
+class Progress(object):
+    """Thread safe counters with a periodic throughput report
+
+    :param interval: Seconds between two reports
+    :param out: Stream to write the reports to
+    :param keys: Counters to report
+    :param rateKeys: Counters summed up for the records/second
+    """
+
+    def __init__(self, interval=5, out=None, keys=('read', 'succeeded', 'failed'),
+        rateKeys=('succeeded', 'failed')):
+        self.interval = interval
+        self.out = out or sys.stderr
+        self.keys = keys
+        self.rateKeys = rateKeys
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.start = self.last = time.time()
+
+    def add(self, key, count=1):
+        with self.lock:
+            self.counts[key] += count
+
+    def report(self, force=False):
+        """Write a report, if the interval passed since the last one"""
+
+        now = time.time()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+
+        with self.lock:
+            counts = dict(self.counts)
+        seconds = max(now - self.start, 0.001)
+        done = sum(counts.get(key, 0) for key in self.rateKeys)
+        self.out.write("{} in {}s, {} records/second\n".format(
+            ", ".join("{} {}".format(counts.get(key, 0), key) for key in self.keys),
+            round(seconds, 1),
+            round(done / seconds, 1)
+        ))
+        self.out.flush()
+
+
+class Importer(object):
+    """Streams records from a JSONL or CSV file into the API
+
+    The file is read chunk by chunk, the records are parsed and mapped in
+    *processes* worker processes and pushed to a ThreadedClient. The client
+    should be created with *maxPending*, so reading pauses while the threads
+    are busy: the file is never loaded as a whole.
+
+    :param client: Shopware.Client.ThreadedClient
+    :param resource: API resource, e.g. 'articles'
+    :param mode: 'upsert' (update or create by number) or 'create'
+    :param mapping: Optional: Field mapping, see **parseMapping**. Without
+        mapping the records are sent as they are
+    :param numberField: Path of the number in the mapped data, defaults to
+        the number of the resource (e.g. 'mainDetail.number' for articles)
+    :param batchSize: Records per request in upsert mode, using the batch
+        mode of the API. 1 sends a single upsert per record
+    :param processes: Number of processes parsing and mapping the records,
+        0 to do it in the current process
+    :param chunkSize: Records handed to a process at once
+    :param progress: Optional: Progress reporting the throughput
+    """
+
+    def __init__(self, client, resource, mode='upsert', mapping=None,
+        numberField=None, batchSize=100, processes=0, chunkSize=500,
+        progress=None):
+        if mode not in ('upsert', 'create'):
+            raise ValueError("Unknown mode {}".format(mode))
+
+        self.client = client
+        self.resource = resource
+        self.mode = mode
+        self.mapping = mapping
+        if numberField:
+            self.numberPath = tuple(numberField.split('.'))
+        else:
+            self.numberPath = IdIndex.numberPaths.get(resource, ('number',))
+        self.batchSize = max(batchSize, 1)
+        self.processes = processes
+        self.chunkSize = chunkSize
+        self.progress = progress or Progress()
+
+    def readChunks(self, path, format, delimiter=','):
+        """Yields (format, header, mapping, start, raw records) jobs"""
+
+        with openFile(path) as f:
+            if format == 'csv':
+                reader = csv.reader(f, delimiter=delimiter)
+                header = next(reader)
+                records = reader
+            else:
+                header = None
+                records = (line for line in f if line.strip())
+
+            start = 1
+            while True:
+                raw = list(itertools.islice(records, self.chunkSize))
+                if not raw:
+                    return
+                self.progress.add('read', len(raw))
+                yield (format, header, self.mapping, start, raw)
+                start += len(raw)
+
+    def transform(self, jobs):
+        """Yields the transformed chunks in order. With processes, a bounded
+        number of chunks is transformed in parallel"""
+
+        if not self.processes:
+            for job in jobs:
+                yield transformChunk(job)
+            return
+
+        window = self.processes * 2
+        with concurrent.futures.ProcessPoolExecutor(self.processes) as pool:
+            pending = collections.deque()
+            for job in jobs:
+                pending.append(pool.submit(transformChunk, job))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def run(self, path, format=None, delimiter=','):
+        """Import a file
+
+        :param path: Path of the file, may be gzip compressed ('.gz'). '-'
+            reads from stdin
+        :param format: 'jsonl' or 'csv', guessed from the file name if not set
+        :param delimiter: Delimiter of csv files
+        :returns: Dict with the number of 'read', 'succeeded' and 'failed'
+            records
+        """
+
+        if format is None:
+            format = 'csv' if '.csv' in path else 'jsonl'
+
+        batch = []
+        for chunk in self.transform(self.readChunks(path, format, delimiter)):
+            for number, data, error in chunk:
+                if error is not None:
+                    self.failed(number, error)
+                    continue
+
+                if self.mode == 'create':
+                    self.pushCreate(number, data)
+                    continue
+
+                batch.append((number, data))
+                if len(batch) >= self.batchSize:
+                    self.pushUpsert(batch)
+                    batch = []
+            self.progress.report()
+
+        if batch:
+            self.pushUpsert(batch)
+
+        while not self.client.join(self.progress.interval):
+            self.progress.report()
+        self.progress.report(force=True)
+        return dict(self.progress.counts)
+
+    def numberOf(self, data):
+        value = data
+        for key in self.numberPath:
+            value = value[key]
+        return value
+
+    def failed(self, number, error):
+        logging.warning("Record {}: {}".format(number, error))
+        self.progress.add('failed')
+
+    def pushCreate(self, number, data):
+        def success(task):
+            self.progress.add('succeeded')
+
+        def error(exception, task):
+            self.failed(number, exception)
+
+        self.client.push(self.resource, 'POST', data=data,
+            successCallback=success, errorCallback=error)
+
+    def pushUpsert(self, batch):
+        items = []
+        numbers = []
+        for number, data in batch:
+            try:
+                items.append((self.numberOf(data), data))
+                numbers.append(number)
+            except (KeyError, IndexError, TypeError):
+                self.failed(number, "No number at {}".format('.'.join(self.numberPath)))
+
+        if not items:
+            return
+
+        def error(exception, task):
+            for number in numbers:
+                self.failed(number, exception)
+
+        if self.batchSize == 1:
+            def success(task):
+                self.progress.add('succeeded')
+
+            itemNumber, data = items[0]
+            self.client.upsert(self.resource, itemNumber, data,
+                successCallback=success, errorCallback=error)
+            return
+
+        def batchSuccess(task):
+            for number, outcome in zip(numbers, task.result):
+                if outcome.get('success'):
+                    self.progress.add('succeeded')
+                else:
+                    self.failed(number, outcome.get('message'))
+
+        self.client.upsertBatch(self.resource, items, batchSize=self.batchSize,
+            successCallback=batchSuccess, errorCallback=error)
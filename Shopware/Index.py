@@ -0,0 +1,152 @@
+import os
+import threading
+
+from Shopware.State import readJson, writeJson
+
+
+class IdIndex(object):
+    """Client side index of Shopware ids by number
+
+    Calls using the 'useNumberAsId' param (e.g. SimpleClient.updateByNumber)
+    need the shop to look up the object by its number. If the index knows the
+    id for a number, the call is sent to the id-based url instead. The index
+    learns from the responses of the API: created objects, objects read by id
+    or number and the items of list reads.
+
+    The index is thread safe, so it can be shared by all workers of a
+    ThreadedClient.
+
+    :param path: Optional: JSON file to load the index from and to **save** it
+        to
+    """
+
+    ## Where to find the number of an object of a given resource
+    numberPaths = {
+        'articles': ('mainDetail', 'number'),
+        'variants': ('number',),
+        'customers': ('number',),
+        'orders': ('number',),
+        'order': ('number',),
+    }
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.numbers = {}
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def get(self, resource, number):
+        """Returns the id of the given number or None if it is unknown"""
+
+        with self.lock:
+            return self.ids.get(resource, {}).get(str(number))
+
+    def set(self, resource, number, id):
+        """Remember the id of a number"""
+
+        number = str(number)
+        with self.lock:
+            self.ids.setdefault(resource, {})[number] = id
+            self.numbers.setdefault(resource, {})[str(id)] = number
+
+    def discard(self, resource, number=None, id=None):
+        """Forget a number, e.g. because the object was deleted"""
+
+        with self.lock:
+            ids = self.ids.get(resource, {})
+            numbers = self.numbers.get(resource, {})
+            if number is None and id is not None:
+                number = numbers.get(str(id))
+            if number is None:
+                return
+            id = ids.pop(str(number), None)
+            if id is not None:
+                numbers.pop(str(id), None)
+
+    @classmethod
+    def numberOf(cls, resource, data):
+        """Returns the number of an object of the given resource or None"""
+
+        value = data
+        for key in cls.numberPaths.get(resource, ('number',)):
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+        return value
+
+    @classmethod
+    def withNumber(cls, resource, number, data):
+        """Returns a copy of data with the number of the object set"""
+
+        path = cls.numberPaths.get(resource, ('number',))
+        data = dict(data or {})
+        target = data
+        for key in path[:-1]:
+            target[key] = dict(target.get(key) or {})
+            target = target[key]
+        target[path[-1]] = number
+        return data
+
+    def learn(self, request, resource, id, payload, params, result):
+        """Update the index from a successful API response
+
+        Called by Shopware.Request.Request for every response.
+        """
+
+        data = result.get('data')
+        request = request.upper()
+        byNumber = bool(params) and bool(params.get('useNumberAsId'))
+
+        if request == 'DELETE':
+            if byNumber:
+                self.discard(resource, number=id)
+            else:
+                self.discard(resource, id=id)
+            return
+
+        if isinstance(data, list):
+            ## List reads
+            for item in data:
+                self.learnObject(resource, item)
+            return
+
+        if not isinstance(data, dict) or 'id' not in data:
+            return
+
+        if byNumber and id is not None:
+            self.set(resource, id, data['id'])
+        elif isinstance(payload, dict) and self.numberOf(resource, payload) is not None:
+            self.set(resource, self.numberOf(resource, payload), data['id'])
+        else:
+            self.learnObject(resource, data)
+
+    def learnObject(self, resource, item):
+        """Remember id and number of an object as returned by the API"""
+
+        if not isinstance(item, dict) or 'id' not in item:
+            return
+        number = self.numberOf(resource, item)
+        if number is not None:
+            self.set(resource, number, item['id'])
+
+    def load(self, path=None):
+        """Load the index from a JSON file"""
+
+        ids = readJson(path or self.path)
+
+        with self.lock:
+            for resource, numbers in ids.items():
+                self.ids.setdefault(resource, {}).update(numbers)
+                reverse = self.numbers.setdefault(resource, {})
+                for number, id in numbers.items():
+                    reverse[str(id)] = number
+
+    def save(self, path=None):
+        """Write the index to a JSON file"""
+
+        with self.lock:
+            ids = dict((resource, dict(numbers)) for resource, numbers in self.ids.items())
+        writeJson(path or self.path, ids)
@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import mimetypes
+import mmap
+import threading
+
+import simplejson
+
+
+## Placeholder for the file content in the encoded JSON body
+_MARKER = "@@shopware-media-file@@"
+
+
+class MediaSource(object):
+    """Zero copy view on the content of a media file
+
+    Files are memory mapped, so the content is paged in by the OS while it is
+    hashed and encoded instead of being read into memory as a whole.
+
+    :param source: Path of a file or any object supporting the buffer
+        protocol (bytes, bytearray, memoryview, mmap)
+    :param mimeType: Optional: Mime type of the file. Guessed from the file
+        name if not set
+    """
+
+    def __init__(self, source, mimeType=None):
+        self.file = None
+        self.map = None
+
+        if isinstance(source, str):
+            self.file = open(source, 'rb')
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                ## Empty files cannot be mapped
+                self.map = b''
+            self.view = memoryview(self.map)
+            if not mimeType:
+                mimeType = mimetypes.guess_type(source)[0]
+        else:
+            self.view = memoryview(source).cast('B')
+
+        self.mimeType = mimeType or 'application/octet-stream'
+
+    def hash(self):
+        """Returns the sha1 hex digest of the content"""
+
+        return hashlib.sha1(self.view).hexdigest()
+
+    def close(self):
+        self.view.release()
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        if self.file:
+            self.file.close()
+
+
+class MediaBody(object):
+    """File-like JSON body for the media resource
+
+    The Shopware API expects the file as base64 encoded data URI inside of the
+    JSON payload. Instead of building this string in memory, the body is
+    encoded chunk by chunk while the request is sent.
+
+    :param source: MediaSource of the file to upload
+    :param data: Additional fields of the media object, e.g. 'album'
+    :param field: Name of the field holding the file
+    """
+
+    ## Raw bytes encoded at once, needs to be a multiple of 3
+    chunkSize = 3 * 16384
+
+    def __init__(self, source, data=None, field='file'):
+        payload = dict(data or {})
+        payload[field] = _MARKER
+        prefix, suffix = simplejson.dumps(payload).split(_MARKER)
+
+        self.view = source.view
+        self.prefix = (prefix + 'data:{};base64,'.format(source.mimeType)).encode('utf-8')
+        self.suffix = suffix.encode('utf-8')
+        self.rewind()
+
+    def __len__(self):
+        return len(self.prefix) + 4 * ((len(self.view) + 2) // 3) + len(self.suffix)
+
+    def rewind(self):
+        """Start over from the beginning of the body"""
+
+        self.parts = self._parts()
+        self.buffer = b''
+
+    def _parts(self):
+        yield self.prefix
+        for offset in range(0, len(self.view), self.chunkSize):
+            yield base64.b64encode(self.view[offset:offset + self.chunkSize])
+        yield self.suffix
+
+    def __iter__(self):
+        ## Every iteration starts over, so the body can be sent again
+        self.rewind()
+        return self._parts()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            part = next(self.parts, None)
+            if part is None:
+                break
+            self.buffer += part
+
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+
+        ## httplib2 sends the same body again after an auth challenge
+        if not chunk:
+            self.rewind()
+        return chunk
+
+
+class MediaCache(object):
+    """Remembers uploaded files by their content hash
+
+    Uploading a file with the same content, fields and params again returns
+    the result of the first upload instead of sending it once more. The same
+    content with other fields (e.g. another album or description) is
+    uploaded as a media object of its own. Thread safe, so one cache
+    can be shared by all workers of a ThreadedClient: while a file is uploaded
+    by one worker, workers uploading the same content wait for its result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+        self.pending = {}
+
+    def upload(self, requester, source, data=None, params={}, mimeType=None):
+        """Upload a file to the media resource unless it was uploaded before
+
+        :param requester: Shopware.Request.Request object to use
+        :param source: Path of a file or any object supporting the buffer
+            protocol
+        :param data: Additional fields of the media object, e.g. 'album'
+        :param params: Additional params to append to the request *URL*
+        :param mimeType: Optional: Mime type of the file
+        :returns: An array with the decoded response of the API.
+        """
+
+        media = MediaSource(source, mimeType)
+        try:
+            digest = self.key(media, data, params)
+            while True:
+                with self.lock:
+                    if digest in self.results:
+                        return self.results[digest]
+                    event = self.pending.get(digest)
+                    if event is None:
+                        self.pending[digest] = threading.Event()
+                        break
+                ## Another thread uploads the same content right now
+                event.wait()
+
+            try:
+                result = requester.request(
+                    'post', 'media', None, MediaBody(media, data), params
+                )
+                with self.lock:
+                    self.results[digest] = result
+            finally:
+                with self.lock:
+                    self.pending.pop(digest).set()
+            return result
+        finally:
+            media.close()
+
+    def key(self, media, data, params):
+        """Internal helper returning the key of an upload: the content hash
+        plus everything else sent with the file"""
+
+        return (media.hash(), media.mimeType,
+            simplejson.dumps(data, sort_keys=True),
+            simplejson.dumps(params, sort_keys=True))
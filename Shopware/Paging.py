@@ -0,0 +1,168 @@
+import os
+import threading
+
+from Shopware.State import readJson, writeJson
+
+
+class PageSizer(object):
+    """Picks the page size (limit) of list reads per resource
+
+    Small pages take many round trips, large pages make the shop slow and
+    the responses big. The sizer measures the entities per second of full
+    pages and climbs towards the best page size: after *samples* pages of a
+    size, the next size is *step* times larger (or smaller), as long as the
+    throughput improves; otherwise it turns around. Pages slower than
+    *maxSeconds* or larger than *maxBytes* lower the ceiling of the resource.
+
+    The best size found per resource is remembered (see **save**), so the
+    next run starts there::
+
+        sizer = PageSizer('pagesizes.json')
+        for page in client.readPages('articles', sizer=sizer):
+            ...
+        sizer.save()
+
+    :param path: Optional: JSON file to load the sizes from and to **save**
+        them to
+    :param minSize: Smallest page size
+    :param maxSize: Largest page size
+    :param initialSize: Page size of resources without a remembered size
+    :param maxSeconds: Optional: Seconds a page may take at most
+    :param maxBytes: Optional: Bytes a response may have at most
+    :param samples: Pages measured before the size is changed
+    :param step: Factor between two sizes tried
+    """
+
+    def __init__(self, path=None, minSize=50, maxSize=5000, initialSize=500,
+        maxSeconds=10.0, maxBytes=None, samples=3, step=1.5):
+        self.path = path
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.initialSize = initialSize
+        self.maxSeconds = maxSeconds
+        self.maxBytes = maxBytes
+        self.samples = max(samples, 1)
+        self.step = step
+
+        self.lock = threading.Lock()
+        ## Best size found per resource and the state of the climb
+        self.sizes = {}
+        self.states = {}
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def clamp(self, size, ceiling=None):
+        return int(max(self.minSize, min(size, ceiling or self.maxSize)))
+
+    def state(self, resource):
+        """Internal helper returning the state of a resource. Needs to be
+        called with the lock held"""
+
+        state = self.states.get(resource)
+        if state is None:
+            state = self.states[resource] = {
+                'size': self.clamp(self.sizes.get(resource, self.initialSize)),
+                'direction': 1,
+                'ceiling': self.maxSize,
+                'measured': [],
+                'previous': None,
+                'rates': {},
+            }
+        return state
+
+    def size(self, resource):
+        """Returns the page size to read the next page of the resource with"""
+
+        with self.lock:
+            return self.state(resource)['size']
+
+    def observe(self, resource, size, count, seconds, received=None):
+        """Report a page read
+
+        :param resource: API resource of the page
+        :param size: Page size (limit) the page was read with
+        :param count: Number of entities returned
+        :param seconds: Seconds the request took
+        :param received: Optional: Bytes of the response
+        """
+
+        if seconds is None or seconds <= 0:
+            return
+
+        with self.lock:
+            state = self.state(resource)
+            if size != state['size']:
+                ## Read before the last change of the size
+                return
+
+            tooSlow = self.maxSeconds is not None and seconds > self.maxSeconds
+            tooLarge = self.maxBytes is not None and received is not None \
+                and received > self.maxBytes
+            if tooSlow or tooLarge:
+                state['ceiling'] = self.clamp(size / self.step)
+                state['previous'] = None
+                self.move(state, -1)
+                self.remember(resource, state)
+                return
+
+            ## The last page of a resource says nothing about the size
+            if count < size:
+                return
+
+            state['measured'].append(count / seconds)
+            if len(state['measured']) < self.samples:
+                return
+
+            measured = sorted(state['measured'])
+            rate = measured[len(measured) // 2]
+            state['rates'][size] = rate
+            self.remember(resource, state)
+
+            previous = state['previous']
+            state['previous'] = rate
+            direction = state['direction']
+            if previous is not None and rate < previous:
+                direction = -direction
+            self.move(state, direction)
+
+    def remember(self, resource, state):
+        """Internal helper updating the best size of a resource"""
+
+        ## Sizes above the ceiling were measured under other conditions
+        for size in [size for size in state['rates'] if size > state['ceiling']]:
+            del state['rates'][size]
+        if state['rates']:
+            self.sizes[resource] = max(state['rates'], key=state['rates'].get)
+        elif resource in self.sizes:
+            self.sizes[resource] = min(self.sizes[resource], state['ceiling'])
+
+    def move(self, state, direction):
+        """Internal helper changing the size of a resource"""
+
+        size = state['size']
+        if direction > 0:
+            next = self.clamp(size * self.step, state['ceiling'])
+        else:
+            next = self.clamp(size / self.step, state['ceiling'])
+        if next == size:
+            ## Hit a bound, turn around
+            direction = -direction
+        state['size'] = next
+        state['direction'] = direction
+        state['measured'] = []
+
+    def load(self, path=None):
+        """Load the remembered sizes from a JSON file"""
+
+        sizes = readJson(path or self.path)
+
+        with self.lock:
+            self.sizes.update(sizes)
+
+    def save(self, path=None):
+        """Write the best size found per resource to a JSON file"""
+
+        with self.lock:
+            sizes = dict(self.sizes)
+        writeJson(path or self.path, sizes)
@@ -0,0 +1,288 @@
+import threading
+
+from Shopware.Index import IdIndex
+from Shopware.Tasks import ResultOf
+
+
+class ProductWrite(object):
+    """Consolidated outcome of writing a product aggregate, see
+    ProductWriter.write
+
+    Once all requests of the product are done, *done* is set and the
+    callback is called with this object. *errors* lists (part, number,
+    error) tuples, e.g. ('translation', 'sw-4711.1', 'Shop not found').
+
+    :param number: Number of the article
+    :param callback: Optional: Function called with this object when done
+    """
+
+    def __init__(self, number, callback=None):
+        self.number = number
+        self.callback = callback
+        self.id = None
+        self.operation = None
+        self.tasks = []
+        self.errors = []
+        self.counts = {}
+
+        self.lock = threading.Lock()
+        ## Unfinished tasks, plus one until all tasks were pushed
+        self.remaining = 1
+        self.done = threading.Event()
+
+    @property
+    def success(self):
+        return not self.errors
+
+    def push(self, push, *args, **kwargs):
+        """Push a task of the product with the client method *push*. The task
+        counts as unfinished before it is pushed, as its callbacks may run
+        before *push* returns, e.g. if a task it depends on failed already
+
+        :returns: The task
+        """
+
+        with self.lock:
+            self.remaining += 1
+        try:
+            task = push(*args, **kwargs)
+        except BaseException:
+            with self.lock:
+                self.remaining -= 1
+            raise
+        with self.lock:
+            self.tasks.append(task)
+        return task
+
+    def count(self, part, number=1):
+        with self.lock:
+            self.counts[part] = self.counts.get(part, 0) + number
+
+    def error(self, part, number, error):
+        with self.lock:
+            self.errors.append((part, number, error))
+
+    def finish(self):
+        """Internal helper called once per task and once all tasks were
+        pushed"""
+
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining:
+                return
+        self.done.set()
+        if self.callback:
+            self.callback(self)
+
+    def wait(self, timeout=None):
+        """Block until all requests of the product are done
+
+        :returns: True if done, False if the timeout was hit
+        """
+
+        return self.done.wait(timeout)
+
+    def result(self):
+        """Returns the outcome as dict"""
+
+        with self.lock:
+            return {
+                'number': self.number,
+                'id': self.id,
+                'operation': self.operation,
+                'success': not self.errors,
+                'counts': dict(self.counts),
+                'errors': list(self.errors),
+            }
+
+
+class ProductWriter(object):
+    """Writes product aggregates (article, variants, translations, images)
+    with as few requests as possible
+
+    Per product:
+
+        * the images are uploaded concurrently (see
+          Shopware.Client.ThreadedClient.pushMedia)
+        * the article is upserted by its number with the variants embedded
+          and the images referenced, as soon as the uploads are done
+        * all translations (of the article and its variants, in all
+          languages) are sent with one batch request once the article exists
+
+    The requests of different products run concurrently::
+
+        writer = ProductWriter(client)
+        for product in products:
+            writer.write(product['article'], variants=product['variants'],
+                translations={2: {'name': 'My article'}},
+                variantTranslations={'sw-4711.1': {2: {'additionalText': 'Red'}}},
+                images=['/path/to/image.png'])
+        client.join()
+
+    :param client: Shopware.Client.ThreadedClient (or a ShopClient)
+    :param embedVariants: If True, the variants are sent with the article.
+        Otherwise they are upserted with one batch request to the variants
+        resource once the article exists
+    :param mediaData: Data of the uploaded images, e.g. the album
+    :param batchSize: Translations or variants per request
+    """
+
+    def __init__(self, client, embedVariants=True, mediaData=None, batchSize=500):
+        self.client = client
+        self.embedVariants = embedVariants
+        self.mediaData = mediaData or {'album': -1}
+        self.batchSize = batchSize
+
+    def write(self, article, variants=None, translations=None,
+        variantTranslations=None, images=None, callback=None, deadline=None,
+        tags=None):
+        """Push the requests of a product aggregate
+
+        :param article: Article data, including mainDetail.number
+        :param variants: Optional: List of variant data, each with a number
+        :param translations: Optional: Dict shop id => translated article
+            fields
+        :param variantTranslations: Optional: Dict variant number => dict
+            shop id => translated variant fields
+        :param images: Optional: Paths (or (path, data) tuples) of images to
+            upload and assign to the article. The article waits for the
+            uploads: if one of them fails, the article and so the whole
+            product fails with a Shopware.Request.DependencyError
+        :param callback: Optional: Function called with the ProductWrite once
+            all requests are done
+        :param deadline: Optional: Seconds the product needs to be written in
+        :param tags: Optional: Tags of the product's tasks, see
+            ThreadedClient.cancel
+        :returns: Shopware.Products.ProductWrite
+        :raises ValueError: If the article or a variant has no number. Nothing
+            is pushed then
+        """
+
+        number = IdIndex.numberOf('articles', article)
+        if number is None:
+            raise ValueError("The article has no mainDetail.number")
+        ## Checked before anything is pushed, so a product is written as a
+        ## whole or not at all
+        if variants and not self.embedVariants:
+            for variant in variants:
+                if not isinstance(variant, dict) or variant.get('number') is None:
+                    raise ValueError("A variant of {} has no number".format(number))
+        images = [image if isinstance(image, (tuple, list)) else (image, self.mediaData)
+            for image in images or []]
+        for image in images:
+            if len(image) != 2:
+                raise ValueError("Images are paths or (path, data) tuples")
+
+        translationItems = []
+        for shopId, fields in (translations or {}).items():
+            translationItems.append({'type': 'article', 'key': number, 'shopId': shopId, 'data': fields})
+        for variantNumber, languages in (variantTranslations or {}).items():
+            for shopId, fields in languages.items():
+                translationItems.append({'type': 'variant', 'key': variantNumber, 'shopId': shopId, 'data': fields})
+
+        write = ProductWrite(number, callback)
+        options = {'deadline': deadline, 'tags': tags}
+        data = dict(article)
+
+        def articleDone(task):
+            write.id = task.result.get('data', {}).get('id')
+            write.operation = task.result.get('operation')
+            write.count('article')
+            if variants and self.embedVariants:
+                write.count('variants', len(variants))
+            write.finish()
+
+        def articleFailed(error, task):
+            write.error('article', number, error)
+            write.finish()
+
+        try:
+            if images:
+                mediaTasks = [self.pushImage(write, image, options) for image in images]
+                data['images'] = list(data.get('images') or []) + [
+                    {'mediaId': ResultOf(task)} for task in mediaTasks
+                ]
+
+            if variants and self.embedVariants:
+                data['variants'] = list(data.get('variants') or []) + list(variants)
+
+            articleTask = write.push(self.client.upsert, 'articles', number, data,
+                successCallback=articleDone, errorCallback=articleFailed, **options)
+
+            waitFor = [articleTask]
+            if variants and not self.embedVariants:
+                items = [
+                    (variant['number'], dict(variant, articleId=ResultOf(articleTask)))
+                    for variant in variants
+                ]
+                for start in range(0, len(items), self.batchSize):
+                    waitFor.append(self.pushVariants(
+                        write, items[start:start + self.batchSize], options
+                    ))
+
+            for start in range(0, len(translationItems), self.batchSize):
+                self.pushTranslations(write,
+                    translationItems[start:start + self.batchSize], waitFor, options)
+        except Exception as e:
+            ## The tasks pushed so far still finish the write
+            write.error('product', number, e)
+            raise
+        finally:
+            write.finish()
+        return write
+
+    def pushImage(self, write, image, options):
+        path, data = image
+
+        def done(task):
+            write.count('images')
+            write.finish()
+
+        def failed(error, task):
+            write.error('image', path, error)
+            write.finish()
+
+        return write.push(self.client.pushMedia, path, data=data,
+            successCallback=done, errorCallback=failed, **options)
+
+    def pushVariants(self, write, items, options):
+        def done(task):
+            self.outcomes(write, 'variants', [number for number, data in items], task.result)
+            write.finish()
+
+        def failed(error, task):
+            for number, data in items:
+                write.error('variant', number, error)
+            write.finish()
+
+        return write.push(self.client.upsertBatch, 'variants', items,
+            batchSize=self.batchSize, successCallback=done, errorCallback=failed,
+            **options)
+
+    def pushTranslations(self, write, items, dependsOn, options):
+        def done(task):
+            self.outcomes(write, 'translations', [item['key'] for item in items],
+                task.result['data'])
+            write.finish()
+
+        def failed(error, task):
+            for item in items:
+                write.error('translation', item['key'], error)
+            write.finish()
+
+        ## Translations are keyed by number, so they only need the article
+        ## (and its variants) to exist
+        return write.push(self.client.push, 'translations', 'PUT', data=items,
+            params={'useNumberAsId': True}, successCallback=done,
+            errorCallback=failed, dependsOn=dependsOn, **options)
+
+    def outcomes(self, write, part, numbers, outcomes):
+        """Internal helper counting the per-item outcomes of a batch"""
+
+        succeeded = 0
+        for number, outcome in zip(numbers, outcomes):
+            if outcome.get('success'):
+                succeeded += 1
+            else:
+                write.error(part.rstrip('s'), number, outcome.get('message'))
+        write.count(part, succeeded)
@@ -0,0 +1,195 @@
+import atexit
+import collections
+import re
+import sys
+import threading
+import time
+
+
+## Phases a sample is attributed to, by the modules and functions on the
+## thread's stack. The first phase found wins
+phases = (
+    ('encode', lambda module, name: module.startswith('simplejson.encoder')
+        or (module == 'simplejson' and name == 'dumps')),
+    ('decode', lambda module, name: module.startswith('simplejson.decoder')
+        or (module == 'simplejson' and name == 'loads')),
+    ('network', lambda module, name: module in ('Shopware.Transport',
+        'Shopware.Replay', 'Shopware.Hedging') or module.startswith(('httplib2',
+        'http.client', 'socket', 'ssl', 'httpx', 'httpcore', 'h2'))),
+    ('queue', lambda module, name: name == 'get' and module in ('queue',
+        'Shopware.WorkQueue')),
+    ('wait', lambda module, name: module == 'threading' and name in ('wait',
+        'wait_for', 'join', '_wait_for_tstate_lock')),
+    ('client', lambda module, name: module.startswith('Shopware')),
+)
+
+## Modules running user callbacks and the modules they wait in
+callbackModules = ('Shopware.Callbacks',)
+idleModules = ('Shopware.Callbacks', 'queue', 'threading')
+
+
+class SamplingProfiler(object):
+    """Samples the stacks of all threads to find out where the time goes
+
+    A background thread looks at the stacks of all threads every *interval*
+    seconds. Every sample is attributed to a phase:
+
+        * callback: running a success or error callback
+        * encode / decode: JSON encoding of payloads, decoding of responses
+        * network: sending requests and waiting for responses
+        * queue: threads waiting for tasks
+        * wait: threads waiting otherwise, e.g. in ThreadedClient.join
+        * client: everything else inside of the client
+        * user: code outside of the client, e.g. producing the tasks
+
+    On **stop** the stacks are written in the collapsed format understood by
+    flamegraph.pl or speedscope (one line per stack: phase, thread and the
+    frames separated by ';', followed by the number of samples) and a
+    summary of the phases is written to *out*.
+
+    :param path: Optional: File to write the collapsed stacks to
+    :param interval: Seconds between two samples
+    :param out: Stream to write the summary to, defaults to stderr
+    """
+
+    def __init__(self, path=None, interval=0.01, out=None):
+        self.path = path
+        self.interval = interval
+        self.out = out or sys.stderr
+
+        self.stacks = collections.Counter()
+        self.labels = {}
+        self.stopped = threading.Event()
+        self.thread = None
+        self.startTime = None
+        self.seconds = 0
+
+    def start(self):
+        """Start the sampling thread"""
+
+        if self.thread is not None:
+            return
+        self.startTime = time.time()
+        self.thread = threading.Thread(target=self.run, name='SamplingProfiler')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and write the report. Called at exit as well"""
+
+        if self.thread is None or self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.seconds = time.time() - self.startTime
+        if self.path:
+            self.write(self.path)
+        self.summary()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Record the current stack of every thread"""
+
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.thread.ident:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(frame)
+                frame = frame.f_back
+            stack.reverse()
+
+            self.stacks[(
+                self.phaseOf(stack),
+                self.threadName(threads.get(ident)),
+                tuple(self.label(frame) for frame in stack)
+            )] += 1
+
+    def phaseOf(self, stack):
+        """Returns the phase of a stack (outermost frame first)"""
+
+        modules = [frame.f_globals.get('__name__', '') for frame in stack]
+
+        ## Callbacks count as such, whatever they do
+        for i, module in enumerate(modules[:-1]):
+            if module in callbackModules and modules[i + 1] not in idleModules:
+                return 'callback'
+
+        found = set()
+        for module, frame in zip(modules, stack):
+            for phase, matches in phases:
+                if matches(module, frame.f_code.co_name):
+                    found.add(phase)
+        for phase, matches in phases:
+            if phase in found:
+                return phase
+        return 'user'
+
+    def threadName(self, thread):
+        """Threads of the same kind share a name, e.g. all worker threads"""
+
+        if thread is None:
+            return 'unknown'
+        if type(thread) is not threading.Thread and not isinstance(thread, threading._MainThread):
+            return type(thread).__name__
+        return re.sub(r'[-_]?\d+', '', thread.name.split(' ')[0])
+
+    def label(self, frame):
+        code = frame.f_code
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = "{}:{}".format(
+                frame.f_globals.get('__name__', '?'), code.co_name
+            ).replace(';', ',').replace(' ', '_')
+        return label
+
+    def write(self, path):
+        """Write the collapsed stacks"""
+
+        with open(path, 'w') as f:
+            for (phase, thread, frames), count in sorted(self.stacks.items()):
+                f.write("{};{};{} {}\n".format(phase, thread, ';'.join(frames), count))
+
+    def phaseTimes(self):
+        """Returns a dict thread name => phase => seconds"""
+
+        times = collections.defaultdict(collections.Counter)
+        for (phase, thread, frames), count in self.stacks.items():
+            times[thread][phase] += count * self.interval
+        return times
+
+    def summary(self):
+        """Write the time per thread kind and phase"""
+
+        self.out.write("Profile of {}s, {} samples\n".format(
+            round(self.seconds, 1), sum(self.stacks.values())
+        ))
+        for thread, times in sorted(self.phaseTimes().items()):
+            total = sum(times.values()) or 1
+            self.out.write("  {}: {}\n".format(thread, ", ".join(
+                "{} {}%".format(phase, round(100.0 * seconds / total, 1))
+                for phase, seconds in times.most_common()
+            )))
+        self.out.flush()
+
+
+def startProfiler(profile):
+    """Start the profiler of a client
+
+    :param profile: None, a path to write the collapsed stacks to or a
+        SamplingProfiler
+    :returns: The running SamplingProfiler or None
+    """
+
+    if not profile:
+        return None
+    if not isinstance(profile, SamplingProfiler):
+        profile = SamplingProfiler(profile if isinstance(profile, str) else None)
+    profile.start()
+    atexit.register(profile.stop)
+    return profile
@@ -0,0 +1,220 @@
+import base64
+import collections
+import gzip
+import hashlib
+import http.server
+import threading
+import time
+from urllib.parse import urlsplit
+
+import simplejson
+
+from Shopware.Transport import Transport
+
+
+def requestKey(method, url, body):
+    """Key a request is matched by on replay: method, path and query of the
+    url (so recordings can be replayed against any host) and a hash of the
+    body. Streamed bodies are not hashed"""
+
+    parts = urlsplit(url)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(body).hexdigest() if isinstance(body, bytes) else None
+    return method.upper(), path, digest
+
+
+def openRecording(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class RecordingTransport(Transport):
+    """Records the requests and responses of another transport
+
+    Every request is written as one JSON line with its key (see
+    **requestKey**), the point in time relative to the start of the
+    recording, the latency and the response (or the error). Files ending
+    with '.gz' are gzip compressed. Call **close** to finish the file.
+
+    :param transport: Shopware.Transport.Transport sending the requests
+    :param path: File to write the recording to
+    """
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.file = openRecording(path, 'w')
+        self.lock = threading.Lock()
+        self.start = time.time()
+
+    def request(self, method, url, body, headers, credentials, timeout=None):
+        start = time.time()
+        record = {}
+        try:
+            status, content = self.transport.request(
+                method, url, body, headers, credentials, timeout=timeout
+            )
+        except Exception as e:
+            record['error'] = "{}: {}".format(type(e).__name__, e)
+            raise
+        else:
+            record['status'] = status
+            try:
+                record['content'] = content.decode('utf-8')
+            except UnicodeDecodeError:
+                record['base64'] = base64.b64encode(content).decode('ascii')
+            return status, content
+        finally:
+            record['method'], record['path'], record['body'] = requestKey(method, url, body)
+            record['at'] = round(start - self.start, 6)
+            record['seconds'] = round(time.time() - start, 6)
+            line = simplejson.dumps(record) + '\n'
+            with self.lock:
+                self.file.write(line)
+
+    def interruptible(self, credentials):
+        return self.transport.interruptible(credentials)
+
+    def resolve(self, url):
+        self.transport.resolve(url)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        self.transport.close()
+
+
+class Recording(object):
+    """The responses of a recording by request key
+
+    Requests recorded several times are answered with the recorded responses
+    in turn.
+
+    :param path: File written by a RecordingTransport
+    """
+
+    def __init__(self, path):
+        self.responses = collections.defaultdict(list)
+        self.lock = threading.Lock()
+        self.next = collections.Counter()
+        ## Keys by method and url, for requests matched without the body
+        self.keys = {}
+
+        with openRecording(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = simplejson.loads(line)
+                    key = (record['method'], record['path'], record['body'])
+                    self.responses[key].append(record)
+                    self.keys.setdefault(key[:2], key)
+
+    def find(self, method, url, body):
+        """Returns the record answering the request. If the body was not
+        recorded, the request is matched by method and url only. None if
+        there is no record at all"""
+
+        key = requestKey(method, url, body)
+        records = self.responses.get(key)
+        if records is None:
+            key = self.keys.get(key[:2])
+            if key is None:
+                return None
+            records = self.responses[key]
+
+        with self.lock:
+            index = self.next[key]
+            self.next[key] += 1
+        return records[index % len(records)]
+
+
+class ReplayTransport(Transport):
+    """Answers the requests with the responses of a recording, without
+    contacting the shop
+
+    The recorded latency is simulated, divided by *speed*: 10 replays a
+    workload at ten times the speed. Unknown requests are answered with 404.
+
+    :param path: File written by a RecordingTransport
+    :param speed: Factor to divide the recorded latencies by, None to answer
+        right away
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.recording = Recording(path)
+        self.speed = speed
+
+    def request(self, method, url, body, headers, credentials, timeout=None):
+        record = self.recording.find(method, url, body)
+        if record is None:
+            return 404, simplejson.dumps({
+                'success': False,
+                'message': "No recorded response for {} {}".format(method.upper(), url)
+            }).encode('utf-8')
+
+        if self.speed:
+            delay = record['seconds'] / self.speed
+            if timeout is not None and delay > timeout[1]:
+                time.sleep(timeout[1])
+                raise IOError("timed out")
+            time.sleep(delay)
+
+        if 'error' in record:
+            raise IOError(record['error'])
+        if 'base64' in record:
+            return record['status'], base64.b64decode(record['base64'])
+        return record['status'], record['content'].encode('utf-8')
+
+
+class ReplayServer(http.server.ThreadingHTTPServer):
+    """HTTP server answering with the responses of a recording, e.g. to load
+    test other tools or clients. Authentication is not checked::
+
+        server = ReplayServer('recording.jsonl.gz', port=8080, speed=10)
+        server.serve_forever()
+
+    :param path: File written by a RecordingTransport
+    :param host: Address to listen on
+    :param port: Port to listen on, 0 for any free port
+    :param speed: See ReplayTransport
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, host='127.0.0.1', port=0, speed=1.0):
+        self.transport = ReplayTransport(path, speed)
+        http.server.ThreadingHTTPServer.__init__(self, (host, port), ReplayHandler)
+
+
+class ReplayHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        try:
+            http.server.BaseHTTPRequestHandler.handle(self)
+        except ConnectionError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            status, content = self.server.transport.request(
+                self.command, self.path, body, dict(self.headers), None
+            )
+        except IOError:
+            self.close_connection = True
+            return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = reply
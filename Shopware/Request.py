@@ -1,14 +1,20 @@
+import contextlib
 import logging
+from collections.abc import MutableMapping
 
 import threading
+import time
 from time import sleep
 
 
-import httplib2
 from urllib.parse import urlencode
 import simplejson
 
 from Shopware.Tasks import ExitTask
+from Shopware.Index import IdIndex
+from Shopware.Callbacks import InlineExecutor
+from Shopware.Balancer import EndpointPool
+from Shopware.Transport import Httplib2Transport
 
 class Error(Exception):
     """Base error class for the API"""
@@ -26,12 +32,189 @@ class SuccessError(Error):
         self.message = message
         self.response = response
 
+class NotFoundError(SuccessError):
+    """This error is raised, when the requested object does not exist"""
+
 class ConnectionError(Error):
     """This error is raised, when httplib request fails"""
     def __init__(self, message, error):
         Exception.__init__(self, message)
         self.error = error
 
+class CircuitOpenError(Error):
+    """This error is raised, when the circuit breaker does not let a request
+    pass, as the shop is considered unhealthy"""
+    def __init__(self, message, retryAfter):
+        Exception.__init__(self, message)
+        self.retryAfter = retryAfter
+
+class DependencyError(Error):
+    """This error is raised for tasks of the ThreadedClient, when a task they
+    depend on failed"""
+    def __init__(self, message, task):
+        Exception.__init__(self, message)
+        self.task = task
+
+class DeadlineError(Error):
+    """This error is raised, when the deadline of a request or task passed"""
+
+class CancelledError(Error):
+    """This error is raised for cancelled tasks of the ThreadedClient"""
+
+
+class PreparedRequest(object):
+    """A request template built once and sent many times, with only the id
+    and the payload varying. See **Request.prepare**
+
+    The url prefix (per endpoint), the encoded query string and the headers
+    are computed once instead of for every call. The template does not
+    belong to a connection, so it can be shared across threads and clients.
+
+    :param request: Type of the request, e.g. GET
+    :param resource: Targeted API resource
+    :param params: Additional params of every request
+    """
+
+    def __init__(self, request, resource, params={}):
+        self.request = request.upper()
+        self.resource = resource
+        self.params = dict(params or {})
+        self.path = "/" + resource + "/"
+        self.query = "?" + urlencode(self.params)
+        ## Shared by all calls, must not be changed
+        self.headers = {'Content-type': 'application/json'}
+        ## Url prefix per endpoint
+        self.prefixes = {}
+
+        ## Template to send calls by number to, once the id is known
+        self.byId = None
+        if self.params.get('useNumberAsId'):
+            byId = dict(self.params)
+            del byId['useNumberAsId']
+            self.byId = PreparedRequest(request, resource, byId)
+
+    def url(self, endpoint, id=None):
+        """Returns the url of a call with the given id"""
+
+        prefix = self.prefixes.get(endpoint)
+        if prefix is None:
+            prefix = self.prefixes[endpoint] = endpoint + self.path
+        if id:
+            return prefix + str(id) + "/" + self.query
+        return prefix + self.query
+
+
+class LazyResponse(MutableMapping):
+    """A response of the API, decoded on first access. See the *lazy* param
+    of Request
+
+    Writes are mostly answered with {"success":true,"data":{"id":...}} and
+    the callers only need to know whether they succeeded. **success** and
+    **id** are read from the raw body without decoding it, as long as the
+    body starts as expected. Any other access decodes the whole body once,
+    so the object can be used like the dict returned otherwise::
+
+        result = client.update('articles', 4711, data)
+        result.success       # no decoding
+        result.id            # no decoding
+        result['data']       # decodes the body
+
+    Keys set (e.g. 'operation' by **upsert**) are kept aside and do not
+    decode the body either.
+
+    :param content: Body of the response, bytes or any other buffer
+    :param status: HTTP status of the response
+    """
+
+    successPrefix = b'{"success":true'
+    idPrefix = b'{"success":true,"data":{"id":'
+
+    def __init__(self, content, status=200):
+        self.content = content
+        self.status = status
+        self.decoded = None
+        self.assigned = {}
+
+    @property
+    def raw(self):
+        """The body as memoryview, without copying it"""
+
+        return memoryview(self.content)
+
+    @property
+    def success(self):
+        view = self.raw
+        size = len(self.successPrefix)
+        if view[:size] == self.successPrefix and view[size:size + 1] in (b',', b'}'):
+            return True
+        return bool(self.decode().get('success'))
+
+    @property
+    def id(self):
+        """data.id of the response or None"""
+
+        view = self.raw
+        start = end = len(self.idPrefix)
+        if view[:start] == self.idPrefix:
+            while end < len(view) and 48 <= view[end] <= 57:
+                end += 1
+            if end > start and view[end:end + 1] in (b',', b'}'):
+                return int(view[start:end].tobytes())
+        return self.path('data', 'id')
+
+    @property
+    def operation(self):
+        """'update' or 'create', if set by upsert"""
+
+        return self.assigned.get('operation')
+
+    def decode(self):
+        """Returns the decoded body, decoding it on first call"""
+
+        if self.decoded is None:
+            try:
+                self.decoded = simplejson.loads(str(self.content, 'utf-8'))
+            except simplejson.decoder.JSONDecodeError as e:
+                raise JsonError("Error decoding JSON: {}".format(self.content), e, self.content)
+        return self.decoded
+
+    def path(self, *keys, default=None):
+        """Returns the value at the given path, e.g. path('data', 'id'), or
+        *default* if there is none"""
+
+        value = self
+        for key in keys:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                return default
+        return value
+
+    def __getitem__(self, key):
+        if key in self.assigned:
+            return self.assigned[key]
+        return self.decode()[key]
+
+    def __setitem__(self, key, value):
+        self.assigned[key] = value
+
+    def __delitem__(self, key):
+        if key in self.assigned:
+            del self.assigned[key]
+            if key not in self.decode():
+                return
+        del self.decode()[key]
+
+    def __iter__(self):
+        keys = list(self.decode())
+        return iter(keys + [key for key in self.assigned if key not in self.decode()])
+
+    def __len__(self):
+        return len(set(self.decode()) | set(self.assigned))
+
+    def __repr__(self):
+        return "LazyResponse({!r})".format(dict(self))
+
 
 
 class Request(object):
@@ -39,12 +222,50 @@ class Request(object):
 
     Usually there is **no need** to have an instance of this class other than
     Shopware.Client().
+
+    :param endpoint: Endpoint of the API, a list of endpoints or a
+        Shopware.Balancer.EndpointPool to balance the requests across
+    :param index: Optional: Shopware.Index.IdIndex used to send calls by number
+        to the id-based url
+    :param circuitBreaker: Optional: Shopware.CircuitBreaker.CircuitBreaker
+        failing requests fast while the shop is unhealthy
+    :param transport: Optional: Shopware.Transport.Transport sending the
+        requests. Defaults to a Shopware.Transport.Httplib2Transport
+    :param hedging: Optional: Shopware.Hedging.HedgingPolicy sending a second
+        GET if the first one is slow
+    :param timeout: Optional: Default timeout of every request in seconds or
+        a tuple of connect and read timeout
+    :param lazy: If True, responses are returned as
+        Shopware.Request.LazyResponse, decoded only when read
+    :param rateLimiter: Optional: Shopware.Shops.RateLimiter every request
+        waits for
     """
 
-    def __init__(self, endpoint, user, key):
-        self.endpoint = endpoint.rstrip("/").rstrip("\\")
+    def __init__(self, endpoint, user, key, index=None, circuitBreaker=None,
+        transport=None, hedging=None, timeout=None, lazy=False, rateLimiter=None):
+        if isinstance(endpoint, (list, tuple)):
+            endpoint = EndpointPool(endpoint)
+        self.transport = transport or Httplib2Transport()
+        if isinstance(endpoint, EndpointPool):
+            self.endpoints = endpoint
+            self.endpoints.startHealthChecks(user, key, transport=self.transport)
+            endpoint = self.endpoints.endpoints[0]
+        else:
+            self.endpoints = None
+
+        ## Workers of a Shopware.Shops.ShopManager have no endpoint of their own
+        self.endpoint = endpoint.rstrip("/").rstrip("\\") if endpoint else None
         self.user = user
         self.key = key
+        self.index = index
+        self.circuitBreaker = circuitBreaker
+
+        self.hedging = hedging
+        self.timeout = timeout
+        self.lazy = lazy
+        self.rateLimiter = rateLimiter
+        ## Limits of the current thread, see withLimits
+        self.local = threading.local()
 
         self.noSuccessErrors = True
 
@@ -54,7 +275,39 @@ class Request(object):
 
         self.nonSuccessErrors = value
 
-    def request(self, request, resource, id=None, payload='', params=''):
+    @contextlib.contextmanager
+    def withLimits(self, timeout=None, deadline=None, cancelled=None):
+        """Limit all requests sent by the current thread inside the block,
+        including retries::
+
+            with client.withLimits(timeout=(3, 10), deadline=time.time() + 30):
+                client.upsert('articles', 'sw-4711', data)
+
+        Blocks can be nested, the earlier deadline wins.
+
+        :param timeout: Optional: Timeout of every request in seconds or a
+            tuple of connect and read timeout
+        :param deadline: Optional: Point in time (as of time.time()) after
+            which no request is sent anymore. Running requests time out then
+        :param cancelled: Optional: threading.Event. Once set, no request is
+            sent anymore
+        """
+
+        outer = getattr(self.local, 'limits', None)
+        if outer is not None:
+            timeout = timeout if timeout is not None else outer[0]
+            if deadline is None or (outer[1] is not None and outer[1] < deadline):
+                deadline = outer[1]
+            cancelled = cancelled or outer[2]
+
+        self.local.limits = (timeout, deadline, cancelled)
+        try:
+            yield
+        finally:
+            self.local.limits = outer
+
+    def request(self, request, resource, id=None, payload='', params='',
+        timeout=None):
         """Runs a request on the API.
 
         :param request: Type of the request. One of:
@@ -80,50 +333,354 @@ class Request(object):
 
         :param id: Optional: Id of the targeted object
         :param payload: For PUT and POST-Requests: Nested array of data
-            you want to set
+            you want to set or a file-like object with the encoded body
         :param params: Additional params to set. E.g. 'useNumberById' or
             additional filter params. Will be appended to the url.
+        :param timeout: Optional: Timeout in seconds or a tuple of connect
+            and read timeout. See also **withLimits**
         :returns: An array with the decoded response of the API.
         """
 
-        url = self.constructUrl(resource, id, params)
-        body = simplejson.dumps(payload)
+        ## Skip the lookup by number, if the id is known already
+        if self.index is not None and id is not None and params \
+                and params.get('useNumberAsId'):
+            knownId = self.index.get(resource, id)
+            if knownId is not None:
+                byId = dict(params)
+                del byId['useNumberAsId']
+                try:
+                    return self.request(request, resource, knownId, payload, byId,
+                        timeout)
+                except NotFoundError:
+                    ## Outdated index entry, ask the shop
+                    self.index.discard(resource, number=id)
+
         headers = {'Content-type': 'application/json'}
+        if hasattr(payload, 'read'):
+            ## Streamed body, e.g. Shopware.Media.MediaBody
+            body = payload
+            headers['Content-Length'] = str(len(payload))
+        elif payload == '' and request.upper() in ('GET', 'DELETE'):
+            ## Nothing to send
+            body = None
+        else:
+            body = simplejson.dumps(payload)
+
+        return self.transmit(request, resource, id, payload, body, headers,
+            params, timeout)
+
+    def prepare(self, request, resource, params={}):
+        """Build a request template to send many calls of the same kind, e.g.
+        reads or updates of single articles::
+
+            update = client.prepare('PUT', 'articles', {'useNumberAsId': True})
+            for number, data in changes:
+                client.execute(update, number, data)
+
+        :param request: Type of the request, e.g. GET
+        :param resource: Targeted API resource
+        :param params: Additional params of every call
+        :returns: Shopware.Request.PreparedRequest
+        """
+
+        return PreparedRequest(request, resource, params)
+
+    def execute(self, prepared, id=None, payload=None, timeout=None):
+        """Runs a call of a request template on the API
+
+        :param prepared: Shopware.Request.PreparedRequest, see **prepare**
+        :param id: Optional: Id (or number) of the targeted object
+        :param payload: Optional: Nested array of data or a file-like object
+            with the encoded body. None sends no body
+        :param timeout: Optional: Timeout in seconds or a tuple of connect
+            and read timeout
+        :returns: An array with the decoded response of the API.
+        """
+
+        resource = prepared.resource
+        if prepared.byId is not None and self.index is not None and id is not None:
+            knownId = self.index.get(resource, id)
+            if knownId is not None:
+                try:
+                    return self.execute(prepared.byId, knownId, payload, timeout)
+                except NotFoundError:
+                    ## Outdated index entry, ask the shop
+                    self.index.discard(resource, number=id)
+
+        headers = prepared.headers
+        if payload is None:
+            body = None
+        elif hasattr(payload, 'read'):
+            body = payload
+            headers = dict(headers)
+            headers['Content-Length'] = str(len(payload))
+        else:
+            body = simplejson.dumps(payload)
+
+        return self.transmit(prepared.request, resource, id, payload, body,
+            headers, prepared.params, timeout, prepared)
+
+    def transmit(self, request, resource, id, payload, body, headers, params,
+        timeout=None, prepared=None):
+        """Internal helper sending the encoded request within the limits of
+        the current thread and decoding the response"""
+
+        limits = getattr(self.local, 'limits', None) or (None, None, None)
+        if timeout is None:
+            timeout = limits[0] if limits[0] is not None else self.timeout
+        deadline, cancelled = limits[1], limits[2]
+
+        interrupted = None
+        if self.hedging is not None and request.upper() == 'GET':
+            interrupted = threading.Event()
+
+        def send():
+            return self.send(request, resource, id, body, headers, params,
+                timeout, deadline, cancelled, prepared, interrupted)
+
+        if interrupted is not None:
+            with self.transport.interruptible((self.user, self.key)) as abort:
+                interrupt = None
+                if abort is not None:
+                    def interrupt():
+                        interrupted.set()
+                        abort()
+                status, content = self.hedging.run(send, interrupt)
+        else:
+            status, content = send()
+        ## Size of the last response of the thread, see Shopware.Paging
+        self.local.received = len(content)
+
+        if self.lazy:
+            result = LazyResponse(content, status)
+            success = result.success
+        else:
+            try:
+                result = simplejson.loads(content.decode("utf-8"))
+            except simplejson.decoder.JSONDecodeError as e:
+                raise JsonError("Error decoding JSON: {}".format(content), e, content)
+            success = result['success']
+
+        if not success and self.noSuccessErrors:
+            if status == 404:
+                raise NotFoundError(result['message'], result)
+            raise SuccessError(result['message'], result)
+        if self.index is not None and success:
+            learned = result
+            if self.lazy and request.upper() != 'GET' and result.id is not None:
+                ## Write responses only carry the id, no need to decode them
+                learned = {'success': True, 'data': {'id': result.id}}
+            self.index.learn(request, resource, id, payload, params, learned)
+        return result
+
+    def send(self, request, resource, id, body, headers, params, timeout=None,
+        deadline=None, cancelled=None, prepared=None, interrupted=None):
+        """Internal helper sending the encoded request to an endpoint
+
+        :param interrupted: Optional: threading.Event set when the request
+            is interrupted, because its hedge won (see Shopware.Hedging)
+
+        :returns: Tuple of the status code and the content of the response
+        """
+
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError("Request was cancelled")
+
+        if self.rateLimiter is not None:
+            wait = self.rateLimiter.reserve()
+            if wait > 0:
+                if deadline is not None and time.time() + wait >= deadline:
+                    raise DeadlineError("Deadline exceeded waiting for the rate limit")
+                if cancelled is not None:
+                    if cancelled.wait(wait):
+                        raise CancelledError("Request was cancelled")
+                else:
+                    sleep(wait)
+
+        ## Both timeouts are cut to the time left until the deadline
+        if timeout is not None and not isinstance(timeout, (tuple, list)):
+            timeout = (timeout, timeout)
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise DeadlineError("Deadline exceeded before the request")
+            if timeout is None:
+                timeout = (remaining, remaining)
+            else:
+                timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+
+        if self.endpoints is not None:
+            endpoint = self.endpoints.acquire()
+        else:
+            endpoint = self.endpoint
+        if prepared is not None:
+            url = prepared.url(endpoint, id)
+        else:
+            url = self.constructUrl(resource, id, params, endpoint)
 
 
         logging.debug("Request on url: {}".format(url))
         logging.debug("Headers: {}".format(headers))
 
-        h = httplib2.Http(".cache")
-        h.add_credentials(self.user, self.key)
+        breaker = self.circuitBreaker
+        if breaker is not None:
+            circuit = breaker.key(endpoint, resource)
+            retryAfter = breaker.acquire(circuit)
+            if retryAfter:
+                if self.endpoints is not None:
+                    self.endpoints.release(endpoint, None)
+                raise CircuitOpenError("Circuit {} is open".format(circuit), retryAfter)
+
+        start = time.time()
         try:
-            response, content = h.request(
-                url,
+            status, content = self.transport.request(
                 request,
+                url,
                 body,
-                headers
+                headers,
+                (self.user, self.key),
+                timeout=timeout
             )
         except Exception as e:
+            if interrupted is not None and interrupted.is_set():
+                ## Slower than the hedge, but not failed
+                self.recordOutcome(endpoint, circuit if breaker else None, True, start)
+                raise CancelledError("Request was interrupted, its hedge won")
+            self.recordOutcome(endpoint, circuit if breaker else None, False, start)
+            if deadline is not None and time.time() >= deadline:
+                raise DeadlineError("Deadline exceeded during the request")
             raise ConnectionError("An error occured during the request", e)
 
-        status = response['status']
+        self.recordOutcome(endpoint, circuit if breaker else None,
+            status < 500, start)
+        return status, content
 
+    def recordOutcome(self, endpoint, circuit, success, start):
+        """Internal helper reporting the outcome of a request to the circuit
+        breaker and the endpoint pool"""
 
-        try:
-            result =  simplejson.loads(content.decode("utf-8"))
-            if not result['success'] and self.noSuccessErrors:
-                raise SuccessError(result['message'], result)
-            return result
-        except simplejson.decoder.JSONDecodeError as e:
-            raise JsonError("Error decoding JSON: {}".format(content), e, content)
+        seconds = time.time() - start
+        if circuit is not None:
+            self.circuitBreaker.record(circuit, success, seconds)
+        if self.endpoints is not None:
+            self.endpoints.release(endpoint, success, seconds)
 
+    def warmUp(self, resource='version'):
+        """Prepare the connection before the actual requests
 
-    def constructUrl(self, resource, id=None, params={}):
+        Lets the transport resolve the host of the endpoint(s) (the default
+        transport caches the addresses for all following connections, see
+        Shopware.Connection.DnsCache), opens the connection(s) of the current
+        thread and authenticates them by reading a cheap resource.
+
+        :param resource: Resource to read for the authentication
+        :returns: Seconds it took to get connected
+        """
+
+        start = time.time()
+
+        if self.endpoints is not None:
+            endpoints = self.endpoints.endpoints
+        else:
+            endpoints = [self.endpoint]
+
+        for endpoint in endpoints:
+            try:
+                self.transport.resolve(endpoint)
+            except Exception as e:
+                raise ConnectionError("Could not resolve {}".format(endpoint), e)
+
+        ## Open a connection to every endpoint
+        for i in range(len(endpoints)):
+            self.request('get', resource)
+        return time.time() - start
+
+    def upsert(self, resource, number, data, params={}):
+        """Update the object with the given number or create it, if it does
+        not exist yet
+
+        The update is tried first (sent to the id-based url, if the id is
+        known to the index) and only if the shop does not know the number,
+        the object is created. So existing objects take one request, new
+        objects two.
+
+        :param resource: Targeted API resource, e.g. 'articles'
+        :param number: Number of the object, e.g. the article number
+        :param data: Nested array of data you want to set
+        :param params: Additional params to append to the request *URL*
+        :returns: An array with the decoded response of the API, 'operation'
+            is set to 'update' or 'create'
+        """
+
+        byNumber = dict(params)
+        byNumber['useNumberAsId'] = True
+        try:
+            result = self.request('put', resource, number, data, byNumber)
+            result['operation'] = 'update'
+        except NotFoundError:
+            data = IdIndex.withNumber(resource, number, data)
+            result = self.request('post', resource, None, data, params)
+            result['operation'] = 'create'
+        return result
+
+    def upsertBatch(self, resource, items, params={}, batchSize=100):
+        """Update or create many objects using the batch mode of the API
+
+        The items are sent as list to the resource, the shop updates existing
+        objects and creates the others. Ids known to the index are added to
+        the items.
+
+        :param resource: Targeted API resource, e.g. 'articles'
+        :param items: List of (number, data) tuples or a dict number => data
+        :param params: Additional params to append to the request *URL*
+        :param batchSize: Number of items to send with one request
+        :returns: List with one result per item, in the order of the items.
+            Each result has the keys 'success', 'operation' ('update' or
+            'create') and 'data' or 'message'
+        """
+
+        if isinstance(items, dict):
+            items = items.items()
+
+        results = []
+        batch = []
+        for number, data in items:
+            item = IdIndex.withNumber(resource, number, data)
+            if self.index is not None and 'id' not in item:
+                knownId = self.index.get(resource, number)
+                if knownId is not None:
+                    item['id'] = knownId
+            batch.append((number, item))
+
+            if len(batch) >= batchSize:
+                results.extend(self.sendBatch(resource, batch, params))
+                batch = []
+
+        if batch:
+            results.extend(self.sendBatch(resource, batch, params))
+        return results
+
+    def sendBatch(self, resource, batch, params={}):
+        """Internal helper sending one batch of **upsertBatch**"""
+
+        result = self.request(
+            'put', resource, None, [item for number, item in batch], params
+        )
+
+        outcomes = result['data']
+        if self.index is not None:
+            for (number, item), outcome in zip(batch, outcomes):
+                if outcome.get('success') and isinstance(outcome.get('data'), dict):
+                    self.index.set(resource, number, outcome['data']['id'])
+        return outcomes
+
+    def constructUrl(self, resource, id=None, params={}, endpoint=None):
         """Constructs a url from the known endpoint, the given resource and
         the given params
 
         :param resource: The api resource
         :param params: List of additional HTTP params
+        :param endpoint: Optional: Endpoint to use instead of the known one
         :returns: The desired url as string
         """
 
@@ -131,20 +688,47 @@ class Request(object):
             idString = "/{}/".format(id)
         else:
             idString = '/'
-        return self.endpoint + "/" + resource + idString +"?" + urlencode(params)
+        return (endpoint or self.endpoint) + "/" + resource + idString +"?" + urlencode(params)
 
 class ThreadedRequest(threading.Thread, Request):
 
-    def __init__(self, id, queue, endpoint, user, key):
+    def __init__(self, id, queue, endpoint, user, key, onTaskDone=None,
+        index=None, callbackExecutor=None, circuitBreaker=None,
+        pauseOnOpenCircuit=False, transport=None, hedging=None, timeout=None,
+        shops=None, lazy=False, onTaskStart=None):
         threading.Thread.__init__(self)
 
-        Request.__init__(self, endpoint, user, key)
+        Request.__init__(self, endpoint, user, key, index=index,
+            circuitBreaker=circuitBreaker, transport=transport, hedging=hedging,
+            timeout=timeout, lazy=lazy)
 
 
         logging.debug("Init thread: {}".format(id))
         self.id = id
         self.queue = queue
-
+        self.onTaskDone = onTaskDone
+        self.onTaskStart = onTaskStart
+        self.callbackExecutor = callbackExecutor or InlineExecutor()
+        self.pauseOnOpenCircuit = pauseOnOpenCircuit
+        ## Shops of a Shopware.Shops.ShopManager by name and the requests
+        ## of this thread to them
+        self.shops = shops
+        self.requesters = {}
+
+    def requesterFor(self, task):
+        """Returns the Request to run the task with: the thread itself or,
+        for tasks of a shop, the thread's Request to that shop"""
+
+        if task.shop is None:
+            return self
+        requester = self.requesters.get(task.shop)
+        if requester is None:
+            if not self.shops or task.shop not in self.shops:
+                raise Error("Unknown shop {}".format(task.shop))
+            requester = self.requesters[task.shop] = self.shops[task.shop].requester(
+                self.transport, self.hedging, self.timeout, self.lazy
+            )
+        return requester
 
     def run(self):
         while True:
@@ -155,26 +739,50 @@ class ThreadedRequest(threading.Thread, Request):
             if isinstance(task, ExitTask):
                 logging.debug("Recieved exit task")
                 return
-
-            try:
-                self.request(
-                    request=task.request,
-                    resource=task.resource,
-                    id=task.id,
-                    payload=task.data,
-                    params=task.param
-                )
-            except Exception as e:
+            if self.onTaskStart:
+                self.onTaskStart(task)
+
+            start = time.time()
+            requester = self
+            self.local.received = None
+            while True:
+                try:
+                    if task.cancelled.is_set():
+                        raise CancelledError("Task was cancelled")
+                    if task.deadline is not None and time.time() >= task.deadline:
+                        raise DeadlineError("Deadline exceeded before the task ran")
+                    requester = self.requesterFor(task)
+                    requester.local.received = None
+                    task.resolve()
+                    with requester.withLimits(task.timeout, task.deadline, task.cancelled):
+                        task.result = task.execute(requester)
+                except CircuitOpenError as e:
+                    if self.pauseOnOpenCircuit:
+                        ## Wait for the shop to recover and try again, unless
+                        ## the task is cancelled or its deadline passes
+                        pause = e.retryAfter
+                        if task.deadline is not None:
+                            pause = max(min(pause, task.deadline - time.time()), 0)
+                        logging.debug("{}: Pausing for {} seconds".format(self.id, pause))
+                        task.cancelled.wait(pause)
+                        continue
+                    task.error = e
+                except Exception as e:
+                    task.error = e
+                break
+            task.seconds = time.time() - start
+            task.received = requester.local.received
+
+            if task.error is not None:
                 if task.errorCallback:
-                    task.errorCallback(e, task)
+                    self.callbackExecutor.dispatch(task.errorCallback, task.error, task)
                 else:
-                    print(e)
-
-            self.queue.task_done()
+                    print(task.error)
+            elif task.successCallback:
+                self.callbackExecutor.dispatch(task.successCallback, task)
 
-            if task.successCallback:
-                task.successCallback(task)
+            ## Let the client schedule tasks depending on this one
+            if self.onTaskDone:
+                self.onTaskDone(task)
 
-
-
-        # successCallback=None, errorCallback=
+            self.queue.task_done()
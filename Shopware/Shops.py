@@ -0,0 +1,293 @@
+import collections
+import threading
+import time
+
+from Shopware.Request import Request
+from Shopware.Client import ThreadedClient
+from Shopware.Media import MediaCache
+from Shopware.Balancer import EndpointPool
+
+
+class RateLimiter(object):
+    """Token bucket limiting the requests per second, shared by all threads
+    sending requests to a shop
+
+    :param rate: Requests per second
+    :param burst: Optional: Requests sent at once after an idle period,
+        defaults to one second worth of requests
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = max(1.0, burst or self.rate)
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    def reserve(self):
+        """Take the permission to send a request
+
+        :returns: Seconds to wait before the request may be sent, 0 to send
+            it right away
+        """
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            ## Tokens can be owed, so waiting threads are served in order
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class Shop(object):
+    """Endpoint, credentials and settings of a shop served by a ShopManager
+
+    :param name: Name of the shop, e.g. the market
+    :param endpoint: Endpoint of the API, a list of endpoints or a
+        Shopware.Balancer.EndpointPool
+    :param user: API user
+    :param key: API key
+    :param index: Optional: Shopware.Index.IdIndex of the shop
+    :param circuitBreaker: Optional: Shopware.CircuitBreaker.CircuitBreaker of
+        the shop, so a failing shop does not affect the others
+    :param hedging: Optional: Shopware.Hedging.HedgingPolicy of the shop,
+        defaults to the one of the manager
+    :param timeout: Optional: Timeout of the shop's requests, defaults to the
+        one of the manager
+    :param maxConcurrent: Optional: Number of tasks of the shop processed at
+        the same time at most
+    :param maxRate: Optional: Number of requests per second sent to the shop
+        at most, across all threads. Threads wait for the limit with the task
+        they process, so set *maxConcurrent* as well to keep the threads
+        available for the other shops
+    """
+
+    def __init__(self, name, endpoint, user, key, index=None,
+        circuitBreaker=None, hedging=None, timeout=None, maxConcurrent=None,
+        maxRate=None):
+        if isinstance(endpoint, (list, tuple)):
+            endpoint = EndpointPool(endpoint)
+        self.name = name
+        self.endpoint = endpoint
+        self.user = user
+        self.key = key
+        self.index = index
+        self.circuitBreaker = circuitBreaker
+        self.hedging = hedging
+        self.timeout = timeout
+        self.maxConcurrent = maxConcurrent
+        self.rateLimiter = RateLimiter(maxRate) if maxRate else None
+
+    def requester(self, transport, hedging=None, timeout=None, lazy=False):
+        """Returns a new Request to the shop. Every worker thread of the
+        manager creates one per shop, all of them share the transport"""
+
+        return Request(self.endpoint, self.user, self.key, index=self.index,
+            circuitBreaker=self.circuitBreaker, transport=transport,
+            hedging=self.hedging or hedging,
+            timeout=self.timeout if self.timeout is not None else timeout,
+            lazy=lazy, rateLimiter=self.rateLimiter)
+
+
+class ShopManager(ThreadedClient):
+    """Serves many shops with one pool of worker threads
+
+    Instead of a ThreadedClient per shop, each with threads and connections
+    of its own, all shops share the threads, the transport (and so the
+    connections), the callback executor, the queue and its limits. Every
+    shop gets a ShopClient to push its tasks with; a worker sends a task
+    to the shop it belongs to::
+
+        manager = ShopManager(numThreads=16, maxPending=1000)
+        de = manager.addShop('de', 'https://shop.de/api', 'api', 'key1', maxConcurrent=8)
+        at = manager.addShop('at', 'https://shop.at/api', 'api', 'key2', maxConcurrent=4)
+
+        de.upsert('articles', 'sw-4711', data)
+        at.upsert('articles', 'sw-4711', otherData)
+        manager.join()
+        print(manager.stats())
+        manager.exit()
+
+    A shop's *maxConcurrent* caps the threads busy with it, so a slow shop
+    cannot occupy the whole pool, its *maxRate* caps the requests per second
+    sent to it. The other params are the ones of the ThreadedClient.
+    """
+
+    def __init__(self, numThreads=8, maxMediaUploads=2, callbackExecutor=None,
+        pauseOnOpenCircuit=False, transport=None, maxPending=0, hedging=None,
+        timeout=None, deadline=None, sharded=False, spillAfter=0,
+        spillDirectory=None, profile=None, sink=None, lazy=False):
+        self.shops = {}
+        self.clients = {}
+        ## Unfinished and running tasks and outcomes per shop. Guarded by
+        ## the lock of the client, like the other scheduler state
+        self.pending = collections.Counter()
+        self.active = collections.Counter()
+        self.inProgress = set()
+        self.counts = collections.defaultdict(collections.Counter)
+        self.seconds = collections.Counter()
+
+        ThreadedClient.__init__(self, None, None, None, numThreads=numThreads,
+            maxMediaUploads=maxMediaUploads, callbackExecutor=callbackExecutor,
+            pauseOnOpenCircuit=pauseOnOpenCircuit, transport=transport,
+            maxPending=maxPending, hedging=hedging, timeout=timeout,
+            deadline=deadline, sharded=sharded, spillAfter=spillAfter,
+            spillDirectory=spillDirectory, profile=profile, sink=sink, lazy=lazy)
+
+    def addShop(self, name, endpoint, user, key, **kwargs):
+        """Add a shop, see Shop for the params
+
+        :returns: The ShopClient of the shop
+        """
+
+        shop = Shop(name, endpoint, user, key, **kwargs)
+        with self.lock:
+            if name in self.shops:
+                raise ValueError("Shop {} exists already".format(name))
+            self.shops[name] = shop
+            if shop.maxConcurrent:
+                self.groupLimits[('shop', name)] = shop.maxConcurrent
+            client = self.clients[name] = ShopClient(self, shop)
+        return client
+
+    def shop(self, name):
+        """Returns the ShopClient of a shop"""
+
+        return self.clients[name]
+
+    def groupsOf(self, task):
+        groups = ThreadedClient.groupsOf(self, task)
+        if ('shop', task.shop) in self.groupLimits:
+            groups.append(('shop', task.shop))
+        return groups
+
+    def schedule(self, task):
+        if task.shop not in self.shops:
+            raise ValueError("Push the tasks to a shop, see addShop")
+        with self.lock:
+            self.pending[task.shop] += 1
+        ThreadedClient.schedule(self, task)
+
+    def taskStarted(self, task):
+        with self.lock:
+            self.inProgress.add(task)
+            self.active[task.shop] += 1
+
+    def _finish(self, task, ready, failed):
+        ## Called with the lock held
+        ThreadedClient._finish(self, task, ready, failed)
+        if task in self.inProgress:
+            self.inProgress.discard(task)
+            self.active[task.shop] -= 1
+        if task.shop is not None:
+            self.pending[task.shop] -= 1
+            self.counts[task.shop]['failed' if task.error is not None else 'succeeded'] += 1
+            if task.seconds is not None:
+                self.seconds[task.shop] += task.seconds
+
+    def exit(self):
+        ThreadedClient.exit(self)
+        with self.lock:
+            self.pending.clear()
+            self.active.clear()
+            self.inProgress.clear()
+
+    def cancel(self, task=None, tag=None, shop=None):
+        """Cancel a task or all unfinished tasks with the given tag, see
+        ThreadedClient.cancel
+
+        :param shop: Optional: Only cancel the tasks of this shop
+        """
+
+        if tag is None or shop is None:
+            return ThreadedClient.cancel(self, task, tag)
+
+        with self.lock:
+            tasks = [task for task in self.tagged.get(tag, ()) if task.shop == shop]
+        return sum(ThreadedClient.cancel(self, task) for task in tasks)
+
+    def stats(self):
+        """Returns a dict shop name => dict of the 'pending', 'running',
+        'succeeded' and 'failed' tasks and the 'seconds' spent on the shop"""
+
+        with self.lock:
+            return dict((name, {
+                'pending': self.pending[name],
+                'running': self.active[name],
+                'succeeded': self.counts[name]['succeeded'],
+                'failed': self.counts[name]['failed'],
+                'seconds': round(self.seconds[name], 3),
+            }) for name in self.shops)
+
+
+class ShopClient(ThreadedClient):
+    """A shop's view of a ShopManager, with the methods of a ThreadedClient
+    (**push**, **upsert**, **upsertBatch**, **pushMedia**, **pushPrepared**,
+    **join**, **warmUp**, **setDeadline**, ...)
+
+    Tasks are processed by the manager's threads. **join** waits for the
+    tasks of this shop only, **warmUp** connects the threads to this shop.
+    The threads, the transport, the sink and the profiler belong to the
+    manager: **exit** does nothing, call ShopManager.exit instead.
+    """
+
+    def __init__(self, manager, shop):
+        self.manager = manager
+        self.shop = shop
+        self.index = shop.index
+
+        ## Shared with the manager
+        self.lock = manager.lock
+        self.callbackExecutor = manager.callbackExecutor
+        ## Threads which can be busy with the shop at the same time
+        self.numThreads = min(manager.numThreads, shop.maxConcurrent or manager.numThreads)
+
+        self.deadline = None
+        self.defaultSuccessCallback = None
+        self.defaultErrorCallback = None
+        self.mediaCache = MediaCache()
+
+    ## Settings of the shop, falling back to the ones of the manager
+    endpoint = property(lambda self: self.shop.endpoint)
+    user = property(lambda self: self.shop.user)
+    key = property(lambda self: self.shop.key)
+    circuitBreaker = property(lambda self: self.shop.circuitBreaker)
+    hedging = property(lambda self: self.shop.hedging or self.manager.hedging)
+    timeout = property(lambda self: self.shop.timeout
+        if self.shop.timeout is not None else self.manager.timeout)
+
+    ## Owned by the manager
+    transport = property(lambda self: self.manager.transport)
+    sink = property(lambda self: self.manager.sink)
+    profiler = property(lambda self: self.manager.profiler)
+    lazy = property(lambda self: self.manager.lazy)
+    pauseOnOpenCircuit = property(lambda self: self.manager.pauseOnOpenCircuit)
+    maxPending = property(lambda self: self.manager.maxPending)
+
+    def taskStarted(self, task):
+        self.manager.taskStarted(task)
+
+    def taskDone(self, task):
+        self.manager.taskDone(task)
+
+    @property
+    def unfinished(self):
+        return self.manager.pending[self.shop.name]
+
+    def schedule(self, task):
+        task.shop = self.shop.name
+        if self.deadline is not None and (task.deadline is None or self.deadline < task.deadline):
+            task.deadline = self.deadline
+        self.manager.schedule(task)
+
+    def cancel(self, task=None, tag=None):
+        """Cancel a task or all unfinished tasks of this shop with the given
+        tag, see ThreadedClient.cancel"""
+
+        return self.manager.cancel(task, tag, self.shop.name)
+
+    def exit(self):
+        pass
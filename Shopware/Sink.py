@@ -0,0 +1,293 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from Shopware.Request import CancelledError, LazyResponse
+from Shopware.Tasks import UpsertBatchTask, WarmUpTask
+
+
+class SqliteSink(object):
+    """Writes the outcome of every task of a ThreadedClient to a SQLite file
+
+    The workers only hand the finished tasks over; a dedicated thread turns
+    them into rows and writes them in batched transactions. So the outcomes
+    can be checked afterwards, e.g. to reconcile an import or to retry the
+    failed tasks::
+
+        sink = SqliteSink('results.db')
+        client = ThreadedClient(endpoint, user, key, sink=sink)
+        ...
+        client.join()
+        client.exit()
+        for row in sink.failed('articles'):
+            print(row['target'], row['error'])
+
+    Every row has the columns:
+
+        * run: Id of the run, see *runId*
+        * finished: Point in time the task finished (as of time.time())
+        * resource, request: Resource and type of the request
+        * target: Id or number the task was pushed with
+        * status: 'success', 'failed' or 'cancelled'
+        * id: Id returned by the shop, e.g. of a created object
+        * operation: 'update' or 'create' for upserts
+        * error: Type and message of the error
+        * seconds: Time the task took to process, including retries
+        * tags: Tags of the task, comma separated
+
+    Batch upserts are written as one row per item.
+
+    :param path: SQLite file, created if it does not exist
+    :param runId: Optional: Id of the run, to tell the runs written to the
+        same file apart. Defaults to the start time
+    :param batchSize: Number of rows to write with one transaction at most
+    :param flushInterval: Seconds to wait for further rows before a batch is
+        written
+    :param maxRetries: Number of attempts to write a batch. Rows of a batch
+        failing that often are written one by one, the rows which still
+        cannot be written are logged and counted in *dropped*
+    """
+
+    columns = ('run', 'finished', 'resource', 'request', 'target', 'status',
+        'id', 'operation', 'error', 'seconds', 'tags')
+
+    def __init__(self, path, runId=None, batchSize=1000, flushInterval=0.5,
+        maxRetries=3):
+        self.path = path
+        self.maxRetries = maxRetries
+        self.runId = runId or time.strftime('%Y-%m-%d %H:%M:%S')
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+
+        connection = self.connect()
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS results ({})".format(
+                ', '.join(self.columns)
+            ))
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_status ON results (run, status, resource)"
+            )
+        connection.close()
+
+        self.queue = queue.Queue()
+        self.closed = False
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name='SqliteSink')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        ## Readers do not block the writer
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, task):
+        """Hand a finished task over to the writer. Called by the
+        ThreadedClient, cheap enough to be called with its lock held"""
+
+        if self.closed or isinstance(task, WarmUpTask):
+            return
+        self.queue.put((task, time.time()))
+
+    def run(self):
+        connection = self.connect()
+        ## Rows not written yet and the number of queue items they belong to
+        pending, items = [], 0
+        failures = 0
+        stop = False
+        while not stop or pending:
+            batch = []
+            if not stop:
+                try:
+                    ## Retry the pending rows even if no further task finishes
+                    batch.append(self.queue.get(timeout=self.flushInterval if pending else None))
+                except queue.Empty:
+                    pass
+            deadline = time.time() + self.flushInterval
+            while batch and len(batch) < self.batchSize and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            for item in batch:
+                items += 1
+                if item is None:
+                    stop = True
+                    continue
+                try:
+                    pending.extend(self.rows(*item))
+                except Exception:
+                    logging.exception("Could not record task {}".format(item[0]))
+                    with self.lock:
+                        self.dropped += 1
+
+            try:
+                self.write(connection, pending)
+            except sqlite3.Error:
+                failures += 1
+                logging.exception("Writing {} results failed".format(len(pending)))
+                if failures < self.maxRetries:
+                    if stop:
+                        time.sleep(self.flushInterval)
+                    continue
+                ## Keep what can be written, e.g. all rows but a broken one
+                self.writeEach(connection, pending)
+
+            failures = 0
+            pending = []
+            for i in range(items):
+                self.queue.task_done()
+            items = 0
+        connection.close()
+
+    def write(self, connection, rows):
+        """Internal helper writing rows in one transaction"""
+
+        if not rows:
+            return
+        with connection:
+            connection.executemany(
+                "INSERT INTO results VALUES ({})".format(', '.join('?' * len(self.columns))),
+                rows
+            )
+
+    def writeEach(self, connection, rows):
+        """Internal helper writing the rows one by one, the rows which
+        cannot be written are counted as *dropped*"""
+
+        for row in rows:
+            try:
+                self.write(connection, [row])
+            except sqlite3.Error:
+                logging.exception("Dropped result {}".format(row))
+                with self.lock:
+                    self.dropped += 1
+
+    def rows(self, task, finished):
+        """Internal helper turning a finished task into rows"""
+
+        base = (self.runId, finished, task.resource, str(task.request).upper())
+        seconds = getattr(task, 'seconds', None)
+        tags = ','.join(sorted(task.tags)) or None
+
+        if isinstance(task, UpsertBatchTask):
+            items = task.data.items() if isinstance(task.data, dict) else task.data
+            numbers = [number for number, data in items or []]
+            if isinstance(task.result, list) and task.error is None:
+                outcomes = task.result
+            else:
+                outcomes = [None] * len(numbers)
+            for number, outcome in zip(numbers, outcomes):
+                if outcome is None:
+                    status, id, operation, error = self.outcome(task.error, None)
+                elif outcome.get('success'):
+                    status, id, operation, error = self.outcome(None, outcome)
+                else:
+                    status, id, operation = 'failed', None, outcome.get('operation')
+                    error = outcome.get('message')
+                yield base + (self.target(number), status, id, operation, error,
+                    seconds, tags)
+            return
+
+        status, id, operation, error = self.outcome(task.error, task.result)
+        yield base + (self.target(task.id), status, id, operation, error,
+            seconds, tags)
+
+    def outcome(self, error, result):
+        """Internal helper returning status, id, operation and error"""
+
+        if error is not None:
+            status = 'cancelled' if isinstance(error, CancelledError) else 'failed'
+            message = getattr(error, 'message', None) or error
+            return status, None, None, "{}: {}".format(type(error).__name__, message)
+
+        if isinstance(result, LazyResponse):
+            ## Without decoding the response
+            return 'success', result.id, result.operation, None
+
+        id = operation = None
+        if isinstance(result, dict):
+            operation = result.get('operation')
+            data = result.get('data')
+            if isinstance(data, dict):
+                id = data.get('id')
+        return 'success', id, operation, None
+
+    def target(self, id):
+        return str(id) if id is not None else None
+
+    def flush(self):
+        """Block until all tasks handed over were written"""
+
+        self.queue.join()
+
+    def close(self):
+        """Write the remaining rows and stop the writer. Tasks finishing
+        afterwards are not recorded"""
+
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def select(self, status=None, resource=None, run=None):
+        """Returns the recorded rows as dicts, oldest first
+
+        :param status: Optional: Only rows with this status
+        :param resource: Optional: Only rows of this resource
+        :param run: Optional: Only rows of this run, e.g. *runId*
+        """
+
+        if not self.closed:
+            self.flush()
+
+        conditions, values = [], []
+        for column, value in (('status', status), ('resource', resource), ('run', run)):
+            if value is not None:
+                conditions.append("{} = ?".format(column))
+                values.append(value)
+        sql = "SELECT * FROM results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY finished"
+
+        connection = self.connect()
+        try:
+            cursor = connection.execute(sql, values)
+            return [dict(zip(self.columns, row)) for row in cursor]
+        finally:
+            connection.close()
+
+    def failed(self, resource=None, run=None):
+        """Returns the rows of the failed tasks, see **select**"""
+
+        return self.select('failed', resource, run)
+
+    def counts(self, run=None):
+        """Returns a dict status => number of rows
+
+        :param run: Optional: Only rows of this run
+        """
+
+        if not self.closed:
+            self.flush()
+
+        sql = "SELECT status, COUNT(*) FROM results"
+        values = []
+        if run is not None:
+            sql += " WHERE run = ?"
+            values.append(run)
+        sql += " GROUP BY status"
+
+        connection = self.connect()
+        try:
+            return dict(connection.execute(sql, values).fetchall())
+        finally:
+            connection.close()
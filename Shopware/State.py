@@ -0,0 +1,45 @@
+import contextlib
+import os
+
+import simplejson
+
+
+@contextlib.contextmanager
+def replacing(path, mode='w'):
+    """Open a temporary file which replaces *path* once the block is left
+    without error. The file is replaced atomically, so a crash does not
+    leave a corrupt or half written file behind::
+
+        with replacing('snapshot.bin', 'wb') as f:
+            f.write(content)
+
+    :param path: File to replace
+    :param mode: Mode to open the temporary file with, 'w' or 'wb'
+    """
+
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, mode) as f:
+            yield f
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.replace(tmp, path)
+
+
+def readJson(path):
+    """Returns the decoded content of a JSON file"""
+
+    with open(path) as f:
+        return simplejson.load(f)
+
+
+def writeJson(path, value):
+    """Write *value* to a JSON file, replacing it atomically"""
+
+    content = simplejson.dumps(value)
+    with replacing(path) as f:
+        f.write(content)
@@ -0,0 +1,337 @@
+import array
+import collections
+import csv
+import logging
+import math
+import os
+import struct
+import threading
+
+import simplejson
+
+from Shopware.Importer import Progress, openFile
+from Shopware.Request import NotFoundError
+from Shopware.State import replacing
+
+
+class Snapshot(object):
+    """Last stock and price sent per number
+
+    The values are kept in two arrays (8 bytes per value) indexed by a dict
+    number => slot, so half a million variants take a few dozen megabytes.
+    The file written by **save** is a local cache in the byte order of the
+    machine.
+
+    :param path: Optional: File to load the snapshot from and to **save** it
+        to
+    """
+
+    ## Marks a stock or price which was never sent
+    noStock = -2 ** 63
+    noPrice = float('nan')
+
+    header = struct.Struct('<Q')
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.numbers = []
+        self.stocks = array.array('q')
+        self.prices = array.array('d')
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def get(self, number):
+        """Returns the stock and price of a number, None if not known"""
+
+        with self.lock:
+            slot = self.slots.get(number)
+            if slot is None:
+                return None, None
+            stock, price = self.stocks[slot], self.prices[slot]
+        return (None if stock == self.noStock else stock,
+            None if math.isnan(price) else price)
+
+    def diff(self, number, stock=None, price=None):
+        """Returns the stock and price which differ from the snapshot, None
+        for the unchanged (or not given) ones"""
+
+        with self.lock:
+            slot = self.slots.get(number)
+            if slot is None:
+                return stock, price
+            if stock is not None and stock == self.stocks[slot]:
+                stock = None
+            if price is not None and price == self.prices[slot]:
+                price = None
+        return stock, price
+
+    def set(self, number, stock=None, price=None):
+        """Remember the values sent. None keeps the current value"""
+
+        with self.lock:
+            slot = self.slots.get(number)
+            if slot is None:
+                slot = self.slots[number] = len(self.numbers)
+                self.numbers.append(number)
+                self.stocks.append(self.noStock)
+                self.prices.append(self.noPrice)
+            if stock is not None:
+                self.stocks[slot] = stock
+            if price is not None:
+                self.prices[slot] = price
+
+    def discard(self, number):
+        """Forget the values of a number, so they are sent again. The slot is
+        kept"""
+
+        with self.lock:
+            slot = self.slots.get(number)
+            if slot is not None:
+                self.stocks[slot] = self.noStock
+                self.prices[slot] = self.noPrice
+
+    def load(self, path=None):
+        """Load the snapshot from a file"""
+
+        with open(path or self.path, 'rb') as f:
+            count, = self.header.unpack(f.read(self.header.size))
+            stocks = array.array('q')
+            prices = array.array('d')
+            stocks.fromfile(f, count)
+            prices.fromfile(f, count)
+            numbers = f.read().decode('utf-8').split('\n') if count else []
+
+        with self.lock:
+            self.numbers = numbers
+            self.slots = dict((number, slot) for slot, number in enumerate(numbers))
+            self.stocks = stocks
+            self.prices = prices
+
+    def save(self, path=None):
+        """Write the snapshot to a file"""
+
+        with self.lock:
+            with replacing(path or self.path, 'wb') as f:
+                f.write(self.header.pack(len(self.numbers)))
+                self.stocks.tofile(f)
+                self.prices.tofile(f)
+                f.write('\n'.join(self.numbers).encode('utf-8'))
+
+
+InvalidRow = collections.namedtuple('InvalidRow', ('number', 'error'))
+InvalidRow.__doc__ = """A row of the feed which could not be read, see readRows"""
+
+
+class StockSync(object):
+    """Sends stock and price changes, skipping the values which did not
+    change since the last run
+
+    Every (number, stock, price) row is compared with the snapshot. Only the
+    changed values are sent, with a minimal payload. The snapshot is updated
+    for the items the shop accepted, failed items are sent again by the next
+    run. The first run sends everything::
+
+        sync = StockSync(client, 'variants', Snapshot('stock.snapshot'))
+        sync.run(rows)
+
+    Only existing objects are updated, unknown numbers are counted as
+    failed. Numbers whose id is known to the client's index
+    (Shopware.Index.IdIndex) are updated by id using the batch mode of the
+    API; the others are updated one by one by number, which teaches the
+    index their ids. So pass a client with an index, saved between the runs,
+    to send the changes in batches.
+
+    Prices are only sent with *replacePrices*: the API replaces all prices of
+    a variant with the ones sent, so the variant is left with the single
+    price of *customerGroup*, the prices of other customer groups and
+    graduated prices are removed. Only enable it if the feed carries the
+    complete price of every variant.
+
+    :param client: Shopware.Client.ThreadedClient
+    :param resource: 'variants' or 'articles' (updates the main variant)
+    :param snapshot: Shopware.Stock.Snapshot, saved after the run if it has a
+        path
+    :param customerGroup: Customer group of the prices
+    :param batchSize: Items per request
+    :param progress: Optional: Progress reporting the throughput
+    :param replacePrices: Send the prices, replacing all prices of the
+        variants. Otherwise the prices of the rows are ignored
+    """
+
+    def __init__(self, client, resource, snapshot, customerGroup='EK',
+        batchSize=500, progress=None, replacePrices=False):
+        if resource not in ('variants', 'articles'):
+            raise ValueError("Cannot sync stock of {}".format(resource))
+
+        self.client = client
+        self.resource = resource
+        self.snapshot = snapshot
+        self.customerGroup = customerGroup
+        self.batchSize = max(batchSize, 1)
+        self.replacePrices = replacePrices
+        self.progress = progress or Progress(
+            keys=('read', 'unchanged', 'updated', 'failed'),
+            rateKeys=('unchanged', 'updated', 'failed')
+        )
+
+    def payload(self, stock, price):
+        """Returns the data setting the given stock and price"""
+
+        data = {}
+        if stock is not None:
+            data['inStock'] = stock
+        if price is not None:
+            ## Replaces the whole price collection of the variant
+            data['prices'] = [{'customerGroupKey': self.customerGroup, 'price': price}]
+        if self.resource == 'articles':
+            return {'mainDetail': data}
+        return data
+
+    def run(self, rows):
+        """Sync the rows
+
+        :param rows: Iterable of (number, stock, price) tuples. None as stock
+            or price leaves the value alone. InvalidRow items are counted as
+            failed
+        :returns: Dict with the number of 'read', 'unchanged', 'updated' and
+            'failed' rows
+        """
+
+        batch = []
+        try:
+            for row in rows:
+                self.progress.add('read')
+                if isinstance(row, InvalidRow):
+                    self.failed(row.number, row.error)
+                    continue
+                number, stock, price = row
+                if not self.replacePrices:
+                    price = None
+                stock, price = self.snapshot.diff(str(number), stock, price)
+                if stock is None and price is None:
+                    self.progress.add('unchanged')
+                    continue
+
+                batch.append((str(number), stock, price))
+                if len(batch) >= self.batchSize:
+                    self.push(batch)
+                    batch = []
+                    self.progress.report()
+
+            if batch:
+                self.push(batch)
+        finally:
+            ## Even if the feed broke off, the changes sent are remembered
+            while not self.client.join(self.progress.interval):
+                self.progress.report()
+            self.progress.report(force=True)
+
+            if self.snapshot.path:
+                self.snapshot.save()
+        return dict(self.progress.counts)
+
+    def push(self, batch):
+        index = self.client.index
+        known, unknown = [], []
+        for number, stock, price in batch:
+            id = index.get(self.resource, number) if index is not None else None
+            if id is not None:
+                known.append((number, stock, price, id))
+            else:
+                unknown.append((number, stock, price))
+
+        if known:
+            self.pushKnown(known)
+        for number, stock, price in unknown:
+            self.pushByNumber(number, stock, price)
+
+    def pushKnown(self, batch):
+        """Internal helper updating objects by id with one batch request. The
+        id makes the shop update the object, it never creates one"""
+
+        items = [(number, dict(self.payload(stock, price), id=id))
+            for number, stock, price, id in batch]
+
+        def success(task):
+            for (number, stock, price, id), outcome in zip(batch, task.result):
+                if outcome.get('success'):
+                    self.snapshot.set(number, stock, price)
+                    self.progress.add('updated')
+                else:
+                    ## Maybe deleted, look it up by number next time
+                    self.client.index.discard(self.resource, number=number)
+                    self.failed(number, outcome.get('message'))
+
+        def error(exception, task):
+            for number, stock, price, id in batch:
+                self.failed(number, exception)
+
+        self.client.upsertBatch(self.resource, items, batchSize=self.batchSize,
+            successCallback=success, errorCallback=error)
+
+    def pushByNumber(self, number, stock, price):
+        """Internal helper updating an object by number"""
+
+        def success(task):
+            self.snapshot.set(number, stock, price)
+            self.progress.add('updated')
+
+        def error(exception, task):
+            if isinstance(exception, NotFoundError):
+                exception = "Unknown number"
+            self.failed(number, exception)
+
+        self.client.push(self.resource, 'PUT', id=number,
+            data=self.payload(stock, price), params={'useNumberAsId': True},
+            successCallback=success, errorCallback=error)
+
+    def failed(self, number, error):
+        logging.warning("Number {}: {}".format(number, error))
+        self.progress.add('failed')
+
+
+def readRows(path, format=None, delimiter=',', numberField='number',
+    stockField='stock', priceField='price'):
+    """Yields (number, stock, price) rows of a CSV or JSONL file. Missing or
+    empty stock and price fields are None. Rows without number or with a
+    stock or price which is not a number are yielded as InvalidRow
+
+    :param path: Path of the file, may be gzip compressed. '-' reads from
+        stdin
+    :param format: 'jsonl' or 'csv', guessed from the file name if not set
+    """
+
+    if format is None:
+        format = 'csv' if '.csv' in path else 'jsonl'
+
+    with openFile(path) as f:
+        if format == 'csv':
+            records = csv.DictReader(f, delimiter=delimiter)
+        else:
+            records = (line for line in f if line.strip())
+
+        for position, record in enumerate(records, 1):
+            try:
+                if format != 'csv':
+                    record = simplejson.loads(record)
+                number = record.get(numberField)
+                stock = record.get(stockField)
+                price = record.get(priceField)
+                row = (
+                    number,
+                    int(stock) if stock not in (None, '') else None,
+                    float(price) if price not in (None, '') else None
+                )
+            except (TypeError, ValueError, AttributeError) as e:
+                yield InvalidRow("Row {}".format(position), "{}: {}".format(type(e).__name__, e))
+                continue
+            if number in (None, ''):
+                yield InvalidRow("Row {}".format(position), "No {}".format(numberField))
+                continue
+            yield row
@@ -0,0 +1,209 @@
+import datetime
+import os
+import re
+import threading
+import time
+
+from Shopware.Filter import filterParams
+from Shopware.State import readJson, writeJson
+
+
+## Format of timestamps in the filter params
+timestampFormat = '%Y-%m-%d %H:%M:%S'
+
+
+def parseTimestamp(value):
+    """Parse a timestamp of the API like '2013-04-18T14:45:12+0200'
+
+    The timezone is dropped: the shop returns and filters its timestamps in
+    its own local time, so the wall clock time is what needs to be compared.
+    """
+
+    value = re.sub(r'(Z|[+-]\d\d:?\d\d)$', '', value.strip()).replace('T', ' ')
+    if len(value) == 10:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    return datetime.datetime.strptime(value[:19], timestampFormat)
+
+
+class Watermarks(object):
+    """High-water marks of the incremental reads, per resource
+
+    Besides the newest timestamp seen, the ids and timestamps of the entities
+    inside the overlap window are kept, so they are not yielded twice.
+
+    :param path: Optional: JSON file to load the watermarks from and to
+        **save** them to
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.marks = {}
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def get(self, resource):
+        """Returns the watermark (datetime) and a dict of the seen ids and
+        timestamps of the resource. The watermark is None if the resource was
+        never read"""
+
+        with self.lock:
+            mark = self.marks.get(resource)
+            if mark is None:
+                return None, {}
+            return parseTimestamp(mark['watermark']), dict(mark['seen'])
+
+    def set(self, resource, watermark, seen):
+        with self.lock:
+            self.marks[resource] = {
+                'watermark': watermark.strftime(timestampFormat),
+                'seen': dict(seen),
+            }
+
+    def reset(self, resource):
+        """Forget the watermark, the next read fetches everything"""
+
+        with self.lock:
+            self.marks.pop(resource, None)
+
+    def load(self, path=None):
+        """Load the watermarks from a JSON file"""
+
+        marks = readJson(path or self.path)
+
+        with self.lock:
+            self.marks.update(marks)
+
+    def save(self, path=None):
+        """Write the watermarks to a JSON file"""
+
+        with self.lock:
+            marks = dict(self.marks)
+        writeJson(path or self.path, marks)
+
+
+class IncrementalReader(object):
+    """Reads the entities of a resource created or changed since the last read
+
+    Only entities with a timestamp at or after the watermark of the resource
+    are requested, sorted by timestamp. To cope with clock skew between the
+    app servers and with transactions committed after a newer entity was
+    already read, the filter starts *overlap* seconds before the watermark;
+    entities of the overlap window which were already yielded with the same
+    timestamp are skipped. Polling a resource without changes costs a single
+    request.
+
+    Example::
+
+        reader = IncrementalReader(client, 'orders', Watermarks('marks.json'))
+        for order in reader.read():
+            process(order)
+
+    :param client: Shopware.Client.SimpleClient
+    :param resource: API resource, e.g. 'orders'
+    :param watermarks: Shopware.Sync.Watermarks, saved after every page if it
+        has a path
+    :param field: Timestamp property to filter on, defaults to the one of the
+        resource (e.g. 'changed' for articles, 'orderTime' for orders)
+    :param overlap: Seconds read again before the watermark
+    :param pageSize: Entities per request
+    :param params: Optional: Additional params of the list reads, e.g.
+        filters (see Shopware.Filter.filterParams)
+    :param sizer: Optional: Shopware.Paging.PageSizer choosing the page size
+        instead of *pageSize*
+    """
+
+    ## Timestamp property of the resources
+    fields = {
+        'articles': 'changed',
+        'orders': 'orderTime',
+        'order': 'orderTime',
+    }
+
+    def __init__(self, client, resource, watermarks, field=None, overlap=300,
+        pageSize=500, params=None, sizer=None):
+        self.client = client
+        self.resource = resource
+        self.watermarks = watermarks
+        self.field = field or self.fields.get(resource)
+        if self.field is None:
+            raise ValueError("No timestamp field known for {}".format(resource))
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.pageSize = pageSize
+        self.params = params or {}
+        self.sizer = sizer
+
+    def readPage(self, since, start, limit):
+        params = dict(self.params)
+        if since is not None:
+            params = filterParams(
+                [(self.field, '>=', since.strftime(timestampFormat))], params
+            )
+        params['sort[0][property]'] = self.field
+        params['sort[0][direction]'] = 'ASC'
+        params['sort[1][property]'] = 'id'
+        params['sort[1][direction]'] = 'ASC'
+        params['start'] = start
+        params['limit'] = limit
+
+        began = time.time()
+        entities = self.client.read(self.resource, params=params)['data']
+        if self.sizer is not None:
+            self.sizer.observe(self.resource, limit, len(entities),
+                time.time() - began, getattr(self.client.local, 'received', None))
+        return entities
+
+    def read(self):
+        """Yields the new and changed entities, oldest first
+
+        The watermark advances page by page, after the entities of a page were
+        handled by the caller.
+        """
+
+        watermark, seen = self.watermarks.get(self.resource)
+        since = watermark - self.overlap if watermark is not None else None
+        start = 0
+
+        while True:
+            limit = self.sizer.size(self.resource) if self.sizer else self.pageSize
+            entities = self.readPage(since, start, limit)
+
+            for entity in entities:
+                value = entity.get(self.field)
+                if not value:
+                    continue
+                key = str(entity['id'])
+                if seen.get(key) == value:
+                    continue
+                yield entity
+
+                seen[key] = value
+                timestamp = parseTimestamp(value)
+                if watermark is None or timestamp > watermark:
+                    watermark = timestamp
+
+            if watermark is not None:
+                ## Only the overlap window needs to be remembered
+                horizon = watermark - self.overlap
+                seen = {
+                    key: value for key, value in seen.items()
+                    if parseTimestamp(value) >= horizon
+                }
+                self.watermarks.set(self.resource, watermark, seen)
+                if self.watermarks.path:
+                    self.watermarks.save()
+
+            if len(entities) < limit:
+                return
+
+            ## Continue after the newest timestamp of the page. Already seen
+            ## entities are skipped, a page full of the same timestamp is
+            ## skipped by offset
+            last = entities[-1].get(self.field)
+            last = parseTimestamp(last) if last else None
+            if last is None or last == since:
+                start += len(entities)
+            else:
+                since = last
+                start = 0
@@ -1,10 +1,17 @@
+import threading
+import time
+
 class BaseTask(object):
     pass
 
 class APITask(BaseTask):
 
+    ## Tasks which may be written to disk by a Shopware.WorkQueue.SpillQueue
+    spillable = True
+
     def __init__(self, resource, request="GET", id=None, data=None, param={},
-    successCallback=None, errorCallback=None):
+    successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+    deadline=None, tags=None):
 
         self.resource = resource
         self.request = request
@@ -15,9 +22,292 @@ class APITask(BaseTask):
         self.successCallback = successCallback
         self.errorCallback = errorCallback
 
+        ## Result of the request (or the exception raised) once processed
+        self.result = None
+        self.error = None
+        ## Seconds it took to process the task, including retries, and the
+        ## bytes of the last response
+        self.seconds = None
+        self.received = None
+
+        ## Tasks which need to be finished before this one may run. Tasks
+        ## referenced by a ResultOf placeholder are added automatically
+        self.dependsOn = list(dependsOn or [])
+        placeholders = self.placeholders()
+        self.hasPlaceholders = bool(placeholders)
+        for placeholder in placeholders:
+            if placeholder.task not in self.dependsOn:
+                self.dependsOn.append(placeholder.task)
+
+        ## Tasks of a group are subject to the group's concurrency limit
+        self.group = None
+        ## Name of the shop to send the task to, see Shopware.Shops
+        self.shop = None
+
+        ## Timeout of every request of the task, point in time the task
+        ## needs to be done by and tags to cancel tasks by
+        self.timeout = timeout
+        self.deadline = time.time() + deadline if deadline is not None else None
+        self.tags = set(tags or ())
+        self.cancelled = threading.Event()
+
+        ## Tasks with the same key are processed in order by a
+        ## Shopware.WorkQueue.ShardedQueue
+        if id is not None and not isinstance(id, ResultOf):
+            self.key = (resource, str(id))
+        else:
+            self.key = None
+
+        ## Bookkeeping of the ThreadedClient's scheduler
+        self.slots = []
+        self.dependents = []
+        self.waitingFor = 0
+        self.finished = False
+        self.done = threading.Event()
+
+    def placeholders(self):
+        """Returns all ResultOf placeholders used in id, data and params"""
+
+        found = []
+        for value in (self.id, self.data, self.param):
+            _collect(value, found)
+        return found
+
+    def resolve(self):
+        """Replace all ResultOf placeholders with the actual results of the
+        tasks they refer to. Called by the worker right before the request"""
+
+        if not self.hasPlaceholders:
+            return
+        self.id = _resolve(self.id)
+        self.data = _resolve(self.data)
+        self.param = _resolve(self.param)
+
+    def execute(self, requester):
+        """Run the task's request
+
+        :param requester: The Shopware.Request.Request object to use
+        :returns: An array with the decoded response of the API.
+        """
+
+        return requester.request(
+            request=self.request,
+            resource=self.resource,
+            id=self.id,
+            payload=self.data,
+            params=self.param
+        )
+
+    def wait(self, timeout=None):
+        """Block until the task was processed (successfully or not)
+
+        :param timeout: Optional: Seconds to wait at most
+        :returns: True if the task is done, False if the timeout was hit
+        """
+
+        return self.done.wait(timeout)
+
+    def __getstate__(self):
+        """State of the task to pickle, see Shopware.WorkQueue.SpillQueue.
+        Callbacks, dependencies and events are left out"""
+
+        state = dict(self.__dict__)
+        for name in ('successCallback', 'errorCallback', 'dependsOn',
+                'dependents', 'done', 'cancelled'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.successCallback = None
+        self.errorCallback = None
+        self.dependsOn = []
+        self.dependents = []
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
 
     def nase():
         print("nase")
 
 
+class MediaTask(APITask):
+    """Uploads a file to the media resource
+
+    The file is streamed from disk by the worker, see Shopware.Media.
+
+    :param source: Path of a file or any object supporting the buffer protocol
+    :param cache: Shopware.Media.MediaCache used to skip duplicate files
+    :param mimeType: Optional: Mime type of the file
+    """
+
+    ## The source may be a buffer or mmap
+    spillable = False
+
+    def __init__(self, source, cache, data=None, param={}, mimeType=None,
+    successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+    deadline=None, tags=None):
+
+        APITask.__init__(self, 'media', 'POST', None, data, param,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
+
+        self.source = source
+        self.cache = cache
+        self.mimeType = mimeType
+        self.group = 'media'
+
+    def execute(self, requester):
+        return self.cache.upload(
+            requester, self.source, self.data, self.param, self.mimeType
+        )
+
+
+class UpsertTask(APITask):
+    """Updates the object with the given number or creates it, see
+    Shopware.Request.Request.upsert. The number is stored as id"""
+
+    def __init__(self, resource, number, data=None, param={},
+    successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+    deadline=None, tags=None):
+
+        APITask.__init__(self, resource, 'PUT', number, data, param,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
+
+    def execute(self, requester):
+        return requester.upsert(self.resource, self.id, self.data, self.param)
+
+
+class UpsertBatchTask(APITask):
+    """Updates or creates many objects at once, see
+    Shopware.Request.Request.upsertBatch. The result is the list of per-item
+    results"""
+
+    def __init__(self, resource, items, param={}, batchSize=100,
+    successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+    deadline=None, tags=None):
+
+        APITask.__init__(self, resource, 'PUT', None, items, param,
+            successCallback=successCallback, errorCallback=errorCallback,
+            dependsOn=dependsOn, timeout=timeout, deadline=deadline, tags=tags
+        )
+
+        self.batchSize = batchSize
+
+    def execute(self, requester):
+        return requester.upsertBatch(
+            self.resource, self.data, self.param, self.batchSize
+        )
+
+
+class PreparedTask(APITask):
+    """Runs a call of a request template, see
+    Shopware.Request.Request.prepare
+
+    :param prepared: Shopware.Request.PreparedRequest
+    """
+
+    def __init__(self, prepared, id=None, data=None,
+    successCallback=None, errorCallback=None, dependsOn=None, timeout=None,
+    deadline=None, tags=None):
+
+        APITask.__init__(self, prepared.resource, prepared.request, id, data,
+            prepared.params, successCallback=successCallback,
+            errorCallback=errorCallback, dependsOn=dependsOn, timeout=timeout,
+            deadline=deadline, tags=tags
+        )
+
+        self.prepared = prepared
+
+    def execute(self, requester):
+        return requester.execute(self.prepared, self.id, self.data)
+
+
+class WarmUpTask(APITask):
+    """Warms up the connection of the worker processing it, see
+    Shopware.Request.Request.warmUp. The result are the seconds it took
+
+    All warm-up tasks share a barrier, so a worker which is done waits for
+    the others instead of taking another warm-up task from the queue.
+
+    :param barrier: threading.Barrier for the number of workers
+    :param barrierTimeout: Optional: Seconds to wait for the other workers at
+        most
+    :param timeout: Optional: Timeout of the warm-up requests
+    """
+
+    spillable = False
+
+    def __init__(self, barrier, barrierTimeout=None, resource='version', timeout=None):
+        ## Errors are reported by ThreadedClient.warmUp
+        APITask.__init__(self, resource, errorCallback=lambda error, task: None,
+            timeout=timeout)
+
+        self.barrier = barrier
+        self.barrierTimeout = barrierTimeout
+
+    def execute(self, requester):
+        try:
+            return requester.warmUp(self.resource)
+        finally:
+            try:
+                self.barrier.wait(self.barrierTimeout)
+            except threading.BrokenBarrierError:
+                pass
+
+
+class ResultOf(object):
+    """Placeholder for a value of another task's result
+
+    Can be used as id, inside of the data or as param value of a task. The
+    task will not run before the referenced task finished; the placeholder is
+    replaced by the actual value then. By default the id of a created object
+    is used::
+
+        category = client.push('categories', 'POST', data={...})
+        client.push('articles', 'POST', data={
+            'categories': [{'id': ResultOf(category)}], ...
+        })
+
+    :param task: The task whose result is referenced
+    :param path: Keys to follow in the result, defaults to 'data', 'id'
+    """
+
+    def __init__(self, task, *path):
+        self.task = task
+        self.path = path or ('data', 'id')
+
+    def resolve(self):
+        value = self.task.result
+        for key in self.path:
+            value = value[key]
+        return value
+
+
 class ExitTask(BaseTask): pass
+
+
+def _collect(value, found):
+    """Recursively collect ResultOf placeholders from nested dicts/lists"""
+
+    if isinstance(value, ResultOf):
+        found.append(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect(item, found)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _collect(item, found)
+
+def _resolve(value):
+    """Recursively replace ResultOf placeholders in nested dicts/lists"""
+
+    if isinstance(value, ResultOf):
+        return value.resolve()
+    if isinstance(value, dict):
+        return {key: _resolve(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_resolve(item) for item in value]
+    return value
@@ -0,0 +1,232 @@
+import contextlib
+import socket
+import threading
+from urllib.parse import urlsplit
+
+import httplib2
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from Shopware.Connection import DnsCache, connectionTypes
+
+
+class Transport(object):
+    """Sends the HTTP requests of a Shopware.Request.Request
+
+    Transports are thread safe, so a single transport can be shared by all
+    threads of a ThreadedClient and by several clients.
+    """
+
+    def request(self, method, url, body, headers, credentials, timeout=None):
+        """Send a request
+
+        :param method: HTTP method, e.g. 'GET'
+        :param url: Absolute url
+        :param body: Encoded body, bytes, str or a file-like object
+        :param headers: Dict of request headers
+        :param credentials: Tuple of API user and key
+        :param timeout: Optional: Tuple of connect and read timeout in
+            seconds, overriding the transport's timeout
+        :returns: Tuple of the status code (int) and the content (bytes)
+        """
+
+        raise NotImplementedError()
+
+    @contextlib.contextmanager
+    def interruptible(self, credentials):
+        """Block in which the requests of the calling thread can be aborted
+        by other threads, by calling the function it yields. Used to drop a
+        request once its hedge won, see Shopware.Hedging. An aborted request
+        raises an error. Transports which cannot abort requests yield None"""
+
+        yield None
+
+    def resolve(self, url):
+        """Look up the host of the url ahead of the first connection, see
+        Shopware.Request.Request.warmUp. Transports which do not open the
+        connections themselves do nothing"""
+
+    def close(self):
+        """Close all connections"""
+
+
+class Httplib2Transport(Transport):
+    """Default transport based on httplib2
+
+    Every thread has its own connection per host, as a connection can only
+    handle one request at a time. Connections are kept alive between the
+    requests and the authentication is remembered, so following requests
+    skip the connection setup and the digest auth challenge. The addresses
+    of the hosts are cached (see Shopware.Connection.DnsCache), so new
+    connections do not wait for the resolver.
+
+    :param cache: Directory of the httplib2 cache
+    :param timeout: Optional: Socket timeout in seconds
+    :param dnsCache: Optional: Shopware.Connection.DnsCache, e.g. to share
+        it with other transports or to set its ttl
+    """
+
+    def __init__(self, cache=".cache", timeout=None, dnsCache=None):
+        self.cache = cache
+        self.timeout = timeout
+        self.local = threading.local()
+        self.dnsCache = dnsCache or DnsCache()
+        self.connectionTypes = connectionTypes(self.dnsCache)
+
+    def getHttp(self, credentials):
+        """Returns the Http object of the current thread"""
+
+        https = getattr(self.local, 'https', None)
+        if https is None:
+            https = self.local.https = {}
+
+        h = https.get(credentials)
+        if h is None:
+            h = https[credentials] = httplib2.Http(self.cache, timeout=self.timeout)
+            h.add_credentials(*credentials)
+        return h
+
+    def setTimeout(self, h, timeout):
+        """Apply the timeout to the Http object and its open connections.
+        httplib2 uses a single socket timeout for connecting and reading, so
+        the larger one is used"""
+
+        seconds = self.timeout if timeout is None else max(timeout)
+        if h.timeout == seconds:
+            return
+        h.timeout = seconds
+        for connection in h.connections.values():
+            connection.timeout = seconds
+            if connection.sock is not None:
+                connection.sock.settimeout(seconds)
+
+    def request(self, method, url, body, headers, credentials, timeout=None):
+        h = self.getHttp(credentials)
+        self.setTimeout(h, timeout)
+        response, content = h.request(
+            url,
+            method.upper(),
+            body,
+            headers,
+            connection_type=self.connectionTypes.get(urlsplit(url).scheme)
+        )
+        return response.status, content
+
+    @contextlib.contextmanager
+    def interruptible(self, credentials):
+        h = self.getHttp(credentials)
+        lock = threading.Lock()
+        state = {'active': True, 'interrupted': False}
+
+        def interrupt():
+            with lock:
+                if not state['active']:
+                    return
+                state['interrupted'] = True
+                for connection in list(h.connections.values()):
+                    ## No reconnect, see Shopware.Connection.connectionTypes
+                    connection.interrupted = True
+                    if connection.sock is not None:
+                        try:
+                            connection.sock.shutdown(socket.SHUT_RDWR)
+                        except (OSError, AttributeError):
+                            pass
+
+        try:
+            yield interrupt
+        finally:
+            with lock:
+                state['active'] = False
+                for connection in h.connections.values():
+                    connection.interrupted = False
+                    if state['interrupted']:
+                        ## The next request opens a new connection
+                        connection.close()
+
+    def resolve(self, url):
+        url = urlsplit(url)
+        self.dnsCache.lookup(url.hostname, url.port or (443 if url.scheme == 'https' else 80))
+
+    def close(self):
+        for h in getattr(self.local, 'https', {}).values():
+            h.close()
+
+
+class Http2Transport(Transport):
+    """Transport multiplexing the requests over a few HTTP/2 connections
+
+    With HTTP/1.1 every concurrent request needs a connection of its own.
+    HTTP/2 sends many concurrent requests as streams over one connection,
+    which saves connections and server side workers. Flow control is handled
+    by the HTTP/2 implementation. Needs the httpx package with HTTP/2
+    support::
+
+        pip install httpx[http2]
+
+    :param maxConnections: Number of connections to open at most
+    :param maxStreams: Number of concurrent requests at most, across all
+        connections
+    :param timeout: Optional: Timeout in seconds
+    :param auth: 'digest' or 'basic'
+    :param verify: Verify the certificate of the shop
+    """
+
+    def __init__(self, maxConnections=2, maxStreams=100, timeout=None,
+        auth='digest', verify=True):
+        if httpx is None:
+            raise ImportError(
+                "Http2Transport needs httpx with HTTP/2 support: pip install httpx[http2]"
+            )
+        if auth not in ('digest', 'basic'):
+            raise ValueError("Unknown auth {}".format(auth))
+
+        self.client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=maxConnections),
+            timeout=timeout,
+            verify=verify
+        )
+        self.auth = auth
+        self.auths = {}
+        self.lock = threading.Lock()
+        self.streams = threading.BoundedSemaphore(maxStreams)
+
+    def getAuth(self, credentials):
+        """Returns the auth of the credentials. Digest auth objects are kept,
+        so they can reuse the last challenge"""
+
+        with self.lock:
+            auth = self.auths.get(credentials)
+            if auth is None:
+                if self.auth == 'digest':
+                    auth = httpx.DigestAuth(*credentials)
+                else:
+                    auth = httpx.BasicAuth(*credentials)
+                self.auths[credentials] = auth
+            return auth
+
+    def request(self, method, url, body, headers, credentials, timeout=None):
+        if hasattr(body, 'read') and not hasattr(body, '__iter__'):
+            body = iter(lambda: body.read(65536), b'')
+
+        options = {}
+        if timeout is not None:
+            connect, read = timeout
+            options['timeout'] = httpx.Timeout(read, connect=connect)
+
+        with self.streams:
+            response = self.client.request(
+                method.upper(),
+                url,
+                content=body,
+                headers=headers,
+                auth=self.getAuth(credentials),
+                **options
+            )
+        return response.status_code, response.content
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,418 @@
+import collections
+import itertools
+import mmap
+import os
+import pickle
+import queue
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import weakref
+
+
+class Shard(object):
+    """A worker's deque of tasks with its own lock
+
+    :param id: Number of the shard
+    """
+
+    def __init__(self, id):
+        self.id = id
+        self.lock = threading.Condition()
+        self.tasks = collections.deque()
+        ## Incremented by every put, so a worker notices new tasks
+        self.puts = 0
+        ## Keys of this shard's tasks being processed
+        self.running = set()
+
+
+class ShardedQueue(object):
+    """Work queue of the ThreadedClient with a deque per worker
+
+    With a single queue.Queue all workers contend for one lock. Here every
+    worker takes its tasks from a shard of its own; idle workers steal from
+    the other shards, so the load stays balanced.
+
+    Tasks with an affinity key (resource and id, see
+    Shopware.Tasks.APITask.key) always go to the same shard and are taken in
+    order: a task is not handed out while another task with the same key is
+    processed. So updates to one entity are applied in the order they were
+    pushed, even if a worker steals them. Tasks without key are spread over
+    the shards round robin.
+
+    The queue.Queue methods (**put**, **get**, **task_done**) operate on the
+    queue as a whole, e.g. to drain it. Workers use the view returned by
+    **worker**.
+
+    :param numShards: Number of shards, usually one per worker
+    :param scanDepth: Number of tasks a worker looks at to find one whose key
+        is not in progress
+    :param idleWait: Seconds an idle worker sleeps before looking for work to
+        steal again
+    """
+
+    def __init__(self, numShards, scanDepth=8, idleWait=0.05):
+        self.shards = [Shard(id) for id in range(numShards)]
+        self.scanDepth = scanDepth
+        self.idleWait = idleWait
+        self.roundRobin = itertools.count()
+        ## Shards whose worker waits for work
+        self.idle = set()
+
+    def shardOf(self, task):
+        key = getattr(task, 'key', None)
+        if key is None:
+            return self.shards[next(self.roundRobin) % len(self.shards)]
+        return self.shards[hash(key) % len(self.shards)]
+
+    def put(self, task, block=True, timeout=None):
+        """Add a task to its shard and wake up a worker"""
+
+        shard = self.shardOf(task)
+        with shard.lock:
+            shard.tasks.append(task)
+            shard.puts += 1
+            shard.lock.notify()
+
+        ## The shard's worker is busy, let an idle one steal the task
+        if shard.id not in self.idle:
+            self.wakeIdle()
+
+    def wakeIdle(self):
+        for id in list(self.idle):
+            shard = self.shards[id]
+            with shard.lock:
+                shard.lock.notify()
+            return
+
+    def take(self, shard):
+        """Internal helper removing the first task of the shard which may run
+        now. Needs to be called with the shard's lock held"""
+
+        blocked = set()
+        for position, task in enumerate(shard.tasks):
+            if position >= self.scanDepth:
+                break
+            key = getattr(task, 'key', None)
+            if key is None:
+                del shard.tasks[position]
+                return task
+            if key in shard.running or key in blocked:
+                ## Keep the order of the tasks with this key
+                blocked.add(key)
+                continue
+            del shard.tasks[position]
+            shard.running.add(key)
+            return task
+        return None
+
+    def release(self, shard, task):
+        """Internal helper called once a task was processed"""
+
+        key = getattr(task, 'key', None)
+        if key is None:
+            return
+        with shard.lock:
+            shard.running.discard(key)
+            if shard.tasks:
+                shard.puts += 1
+                shard.lock.notify()
+        if shard.tasks:
+            self.wakeIdle()
+
+    def worker(self, id):
+        """Returns the queue view of worker *id*"""
+
+        return WorkerQueue(self, self.shards[id % len(self.shards)])
+
+    def get(self, block=True, timeout=None):
+        """Remove any task, regardless of its key. Used to drain the queue"""
+
+        for shard in self.shards:
+            with shard.lock:
+                if shard.tasks:
+                    return shard.tasks.popleft()
+        raise queue.Empty()
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        return sum(len(shard.tasks) for shard in self.shards)
+
+
+class WorkerQueue(object):
+    """A worker's view of a ShardedQueue: takes tasks from the worker's own
+    shard first, then steals from the others"""
+
+    def __init__(self, queue, shard):
+        self.queue = queue
+        self.shard = shard
+        ## The other shards, starting with the next one, so the thieves do
+        ## not all go for the same shard
+        shards = queue.shards
+        self.victims = shards[shard.id + 1:] + shards[:shard.id]
+        self.current = None
+
+    def get(self, block=True, timeout=None):
+        own = self.shard
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while True:
+            with own.lock:
+                task = self.queue.take(own)
+                puts = own.puts
+            if task is not None:
+                self.current = (own, task)
+                return task
+
+            for victim in self.victims:
+                if not victim.tasks:
+                    continue
+                with victim.lock:
+                    task = self.queue.take(victim)
+                if task is not None:
+                    self.current = (victim, task)
+                    return task
+
+            wait = self.queue.idleWait
+            if timeout is not None:
+                wait = min(wait, deadline - time.time())
+            if not block or wait <= 0:
+                raise queue.Empty()
+
+            ## Sleep until a task is put to the shard, a key of the shard is
+            ## released or it is time to look for work to steal again
+            self.queue.idle.add(own.id)
+            try:
+                with own.lock:
+                    if own.puts == puts:
+                        own.lock.wait(wait)
+            finally:
+                self.queue.idle.discard(own.id)
+
+    def task_done(self):
+        if self.current is not None:
+            self.queue.release(*self.current)
+            self.current = None
+
+
+class SpillQueue(object):
+    """Work queue of the ThreadedClient keeping only a window of tasks in
+    memory
+
+    Up to *maxInMemory* tasks are held in memory. Further tasks are pickled
+    and appended to segment files, so producers never block and the memory
+    stays bounded however large the backlog grows. The workers take the
+    tasks in the order they were put: once the window runs low, the oldest
+    spilled tasks are read back from the segments (memory mapped) and the
+    segments are deleted when consumed.
+
+    Callbacks cannot be pickled, they stay in memory while the task is on
+    disk. A spilled task which is still referenced (e.g. as dependency of
+    another task or by a caller waiting for it) keeps its identity: only its
+    data is dropped and restored when read back. Tasks which cannot be
+    pickled (e.g. media uploads) stay in memory, at their place in the
+    order.
+
+    :param maxInMemory: Number of tasks to keep in memory
+    :param directory: Optional: Directory of the segment files, a temporary
+        directory by default. It is removed by **close**
+    :param segmentSize: Bytes per segment file
+    """
+
+    ## Length prefix of the records in the segments
+    header = struct.Struct('<I')
+
+    def __init__(self, maxInMemory=10000, directory=None, segmentSize=64 * 1024 * 1024):
+        self.maxInMemory = max(maxInMemory, 1)
+        self.segmentSize = segmentSize
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='shopware-spill-')
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        self.lock = threading.Condition()
+        self.memory = collections.deque()
+        ## Number of tasks spilled and of those written to disk already
+        self.spilled = 0
+        self.onDisk = 0
+        ## Position of the next spilled task and of the next one to write,
+        ## so the records are written in the order the tasks were put
+        self.reserved = 0
+        self.writing = 0
+
+        self.segmentIds = itertools.count()
+        self.writer = None
+        self.writerPath = None
+        self.written = 0
+        self.sealed = collections.deque()
+        self.reader = None
+        self.readerPath = None
+        self.offset = 0
+
+        self.closed = False
+
+        self.spillIds = itertools.count()
+        ## Spilled tasks referenced elsewhere, their unpicklable
+        ## companions and their callbacks
+        self.alive = weakref.WeakValueDictionary()
+        self.held = {}
+        self.callbacks = {}
+
+    def put(self, task, block=True, timeout=None):
+        """Add a task, written to disk if the window is full"""
+
+        with self.lock:
+            if self.closed or (not self.spilled and len(self.memory) < self.maxInMemory):
+                self.memory.append(task)
+                self.lock.notify()
+                return
+            ## Take the place in the order, later tasks are spilled as well
+            position = self.reserved
+            self.reserved += 1
+            self.spilled += 1
+
+        ## Pickling is done without holding the lock
+        record = self.encode(task)
+        with self.lock:
+            self.lock.wait_for(lambda: self.writing == position)
+            self.writing += 1
+            if self.closed:
+                ## Closed meanwhile, the task is kept in memory
+                spillId, copy = pickle.loads(record)
+                if copy is not None:
+                    task.data = copy.data
+                self.memory.append(task)
+                self.spilled -= 1
+            else:
+                self.write(record)
+                self.onDisk += 1
+            self.lock.notify_all()
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the oldest task"""
+
+        with self.lock:
+            ## A spilled task may still be pickled, its successors wait
+            if not self.lock.wait_for(lambda: self.memory or self.onDisk,
+                    timeout if block else 0):
+                raise queue.Empty()
+            if len(self.memory) <= self.maxInMemory // 2 and self.onDisk:
+                self.refill()
+            return self.memory.popleft()
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        with self.lock:
+            return len(self.memory) + self.spilled
+
+    def encode(self, task):
+        """Internal helper pickling a task to a record"""
+
+        spillId = next(self.spillIds)
+        if getattr(task, 'spillable', False):
+            try:
+                data = pickle.dumps((spillId, task), pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                data = None
+            if data is not None:
+                self.callbacks[spillId] = (task.successCallback, task.errorCallback)
+                self.alive[spillId] = task
+                task.data = None
+                return data
+
+        self.held[spillId] = task
+        return pickle.dumps((spillId, None), pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, record):
+        """Internal helper restoring a task from a record"""
+
+        spillId, task = pickle.loads(record)
+        if task is None:
+            return self.held.pop(spillId)
+
+        successCallback, errorCallback = self.callbacks.pop(spillId)
+        original = self.alive.pop(spillId, None)
+        if original is not None:
+            original.data = task.data
+            return original
+        task.successCallback = successCallback
+        task.errorCallback = errorCallback
+        return task
+
+    def write(self, record):
+        """Internal helper appending a record to the current segment. Needs
+        to be called with the lock held"""
+
+        if self.writer is None:
+            self.writerPath = os.path.join(
+                self.directory, '{:08d}.segment'.format(next(self.segmentIds))
+            )
+            self.writer = open(self.writerPath, 'wb')
+            self.written = 0
+
+        self.writer.write(self.header.pack(len(record)))
+        self.writer.write(record)
+        self.written += self.header.size + len(record)
+        if self.written >= self.segmentSize:
+            self.seal()
+
+    def seal(self):
+        """Internal helper closing the current segment, so it can be read"""
+
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.sealed.append(self.writerPath)
+        self.writer = None
+
+    def refill(self):
+        """Internal helper reading spilled tasks back into the window. Needs
+        to be called with the lock held"""
+
+        while self.onDisk and len(self.memory) < self.maxInMemory:
+            if self.reader is None:
+                if not self.sealed:
+                    ## The reader caught up with the writer
+                    self.seal()
+                self.readerPath = self.sealed.popleft()
+                with open(self.readerPath, 'rb') as f:
+                    self.reader = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.offset = 0
+
+            length, = self.header.unpack_from(self.reader, self.offset)
+            start = self.offset + self.header.size
+            self.offset = start + length
+            self.memory.append(self.decode(self.reader[start:self.offset]))
+            self.spilled -= 1
+            self.onDisk -= 1
+
+            if self.offset >= len(self.reader):
+                self.reader.close()
+                self.reader = None
+                os.remove(self.readerPath)
+
+    def close(self):
+        """Remove the segment files. Tasks still on disk are dropped, tasks
+        put afterwards are kept in memory"""
+
+        with self.lock:
+            self.closed = True
+            self.spilled -= self.onDisk
+            self.onDisk = 0
+            self.held.clear()
+            self.callbacks.clear()
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+            shutil.rmtree(self.directory, ignore_errors=True)
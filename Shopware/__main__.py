@@ -0,0 +1,283 @@
+"""Command line interface
+
+    python -m Shopware import --endpoint http://shopware.dev/api --resource articles articles.jsonl
+    python -m Shopware export --endpoint http://shopware.dev/api articles articles.jsonl.gz
+    python -m Shopware stock --endpoint http://shopware.dev/api --snapshot stock.snapshot stock.csv
+    python -m Shopware replay --port 8080 --speed 10 recording.jsonl.gz
+
+Credentials are taken from --user/--key or the environment variables
+SHOPWARE_API_USER and SHOPWARE_API_KEY.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from Shopware.Client import ThreadedClient
+from Shopware.Importer import Importer, Progress, parseMapping
+from Shopware.Index import IdIndex
+from Shopware.Exporter import Exporter
+from Shopware.Filter import parseCondition, filterParams
+from Shopware.Transport import Httplib2Transport
+from Shopware.Replay import RecordingTransport, ReplayTransport, ReplayServer
+from Shopware.Sink import SqliteSink
+from Shopware.Stock import Snapshot, StockSync, readRows
+from Shopware.Paging import PageSizer
+
+
+def addConnectionArguments(parser):
+    parser.add_argument('--endpoint', action='append', required=True,
+        help="API endpoint, e.g. http://shopware.dev/api. Repeat to balance across several app servers")
+    parser.add_argument('--user', default=os.environ.get('SHOPWARE_API_USER'),
+        help="API user, defaults to $SHOPWARE_API_USER")
+    parser.add_argument('--key', default=os.environ.get('SHOPWARE_API_KEY'),
+        help="API key, defaults to $SHOPWARE_API_KEY")
+    parser.add_argument('--threads', type=int, default=4,
+        help="Number of request threads")
+    parser.add_argument('--report-interval', type=float, default=5,
+        help="Seconds between two progress reports")
+    parser.add_argument('--record',
+        help="Record all requests and responses to this file, see replay")
+    parser.add_argument('--replay',
+        help="Answer all requests from this recording instead of the shop")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+        help="Replay the recorded latencies this many times faster, 0 to answer right away")
+    parser.add_argument('--profile',
+        help="Profile all threads and write the stacks to this file (collapsed format for flame graphs)")
+    parser.add_argument('--results',
+        help="Write the outcome of every request to this SQLite file")
+
+
+def createClient(args, **kwargs):
+    if not args.user or not args.key:
+        raise SystemExit("API user and key are required")
+
+    if args.replay:
+        kwargs['transport'] = ReplayTransport(args.replay, args.replay_speed or None)
+    elif args.record:
+        kwargs['transport'] = RecordingTransport(Httplib2Transport(), args.record)
+    if args.results:
+        kwargs['sink'] = SqliteSink(args.results)
+
+    endpoint = args.endpoint if len(args.endpoint) > 1 else args.endpoint[0]
+    ## A replay does not connect to the shop
+    return ThreadedClient(endpoint, args.user, args.key,
+        numThreads=args.threads, warmUp=not args.replay, profile=args.profile,
+        **kwargs)
+
+
+def closeClient(client):
+    client.exit()
+    client.transport.close()
+
+
+def runImport(args):
+    client = createClient(args, maxPending=args.max_pending)
+    importer = Importer(
+        client,
+        args.resource,
+        mode=args.mode,
+        mapping=parseMapping(args.map) if args.map else None,
+        numberField=args.number_field,
+        batchSize=args.batch_size,
+        processes=args.processes,
+        chunkSize=args.chunk_size,
+        progress=Progress(args.report_interval)
+    )
+    try:
+        counts = importer.run(args.file, args.format, args.delimiter)
+    finally:
+        closeClient(client)
+    return 1 if counts.get('failed') else 0
+
+
+def parseParams(specs):
+    params = {}
+    for spec in specs or []:
+        key, sep, value = spec.partition('=')
+        if not sep:
+            raise SystemExit("Invalid param {}, expected key=value".format(spec))
+        params[key] = value
+    return params
+
+
+def runExport(args):
+    params = parseParams(args.param)
+    if args.filter:
+        params = filterParams([parseCondition(text) for text in args.filter], params)
+
+    sizer = None
+    if args.page_size == 'auto':
+        sizer = PageSizer(args.page_sizes)
+        pageSize = None
+    else:
+        try:
+            pageSize = int(args.page_size)
+        except ValueError:
+            raise SystemExit("Invalid page size {}".format(args.page_size))
+
+    client = createClient(args)
+    exporter = Exporter(
+        client,
+        args.resource,
+        params=params,
+        pageSize=pageSize,
+        window=args.window,
+        progress=Progress(args.report_interval, keys=('written',), rateKeys=('written',)),
+        sizer=sizer
+    )
+    try:
+        exporter.run(args.output, resume=args.resume)
+    finally:
+        closeClient(client)
+        if sizer is not None and sizer.path:
+            sizer.save()
+    return 0
+
+
+def runStock(args):
+    index = IdIndex(args.index) if args.index else None
+    client = createClient(args, maxPending=args.max_pending, index=index)
+    sync = StockSync(
+        client,
+        args.resource,
+        Snapshot(args.snapshot),
+        customerGroup=args.customer_group,
+        batchSize=args.batch_size,
+        progress=Progress(args.report_interval,
+            keys=('read', 'unchanged', 'updated', 'failed'),
+            rateKeys=('unchanged', 'updated', 'failed')),
+        replacePrices=args.replace_prices
+    )
+    rows = readRows(args.file, args.format, args.delimiter, args.number_field,
+        args.stock_field, args.price_field)
+    try:
+        counts = sync.run(rows)
+    finally:
+        closeClient(client)
+        if index is not None:
+            index.save()
+    return 1 if counts.get('failed') else 0
+
+
+def runReplay(args):
+    server = ReplayServer(args.recording, args.host, args.port,
+        args.speed or None)
+    host, port = server.server_address[:2]
+    sys.stderr.write("Replaying {} on http://{}:{}/\n".format(args.recording, host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m Shopware',
+        description="Command line tools for the Shopware REST API")
+    parser.add_argument('--log-level', default='WARNING',
+        help="Log level, e.g. INFO or DEBUG")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    importParser = commands.add_parser('import',
+        help="Stream records from a JSONL or CSV file into the API")
+    addConnectionArguments(importParser)
+    importParser.add_argument('file',
+        help="JSONL or CSV file, may be gzip compressed. '-' reads from stdin")
+    importParser.add_argument('--resource', required=True,
+        help="API resource, e.g. articles")
+    importParser.add_argument('--format', choices=('jsonl', 'csv'),
+        help="File format, guessed from the file name by default")
+    importParser.add_argument('--delimiter', default=',',
+        help="Delimiter of CSV files")
+    importParser.add_argument('--map', action='append',
+        help="Field mapping column=path[:converter], e.g. price=mainDetail.prices.0.price:float. Repeat for every field")
+    importParser.add_argument('--number-field',
+        help="Path of the number in the mapped record, e.g. mainDetail.number")
+    importParser.add_argument('--mode', choices=('upsert', 'create'), default='upsert',
+        help="Update or create records by number, or only create them")
+    importParser.add_argument('--batch-size', type=int, default=100,
+        help="Records per request in upsert mode")
+    importParser.add_argument('--processes', type=int, default=0,
+        help="Number of processes parsing and mapping the records")
+    importParser.add_argument('--chunk-size', type=int, default=500,
+        help="Records handed to a process at once")
+    importParser.add_argument('--max-pending', type=int, default=100,
+        help="Number of unfinished requests at most, reading pauses meanwhile")
+    importParser.set_defaults(func=runImport)
+
+    exportParser = commands.add_parser('export',
+        help="Stream all entities of a resource to a JSONL file")
+    addConnectionArguments(exportParser)
+    exportParser.add_argument('resource',
+        help="API resource, e.g. articles")
+    exportParser.add_argument('output',
+        help="JSONL file, gzip compressed if it ends with .gz")
+    exportParser.add_argument('--filter', action='append',
+        help="Filter condition, e.g. 'active=1', 'changed>=2013-01-01' or 'name~%%shirt%%'. Repeat for several conditions")
+    exportParser.add_argument('--param', action='append',
+        help="Additional param key=value of the list reads")
+    exportParser.add_argument('--page-size', default='500',
+        help="Entities per request, 'auto' to find the fastest page size")
+    exportParser.add_argument('--page-sizes',
+        help="With --page-size auto: Remember the best page size per resource in this JSON file")
+    exportParser.add_argument('--window', type=int,
+        help="Pages read at the same time, defaults to two per thread")
+    exportParser.add_argument('--resume', action='store_true',
+        help="Continue an interrupted export of the same file")
+    exportParser.set_defaults(func=runExport)
+
+    stockParser = commands.add_parser('stock',
+        help="Send the stock and price changes since the last run")
+    addConnectionArguments(stockParser)
+    stockParser.add_argument('file',
+        help="JSONL or CSV file with number, stock and price, may be gzip compressed. '-' reads from stdin")
+    stockParser.add_argument('--snapshot', required=True,
+        help="File keeping the values sent, created by the first run")
+    stockParser.add_argument('--resource', choices=('variants', 'articles'), default='variants',
+        help="API resource to update")
+    stockParser.add_argument('--format', choices=('jsonl', 'csv'),
+        help="File format, guessed from the file name by default")
+    stockParser.add_argument('--delimiter', default=',',
+        help="Delimiter of CSV files")
+    stockParser.add_argument('--number-field', default='number',
+        help="Column or field of the number")
+    stockParser.add_argument('--stock-field', default='stock',
+        help="Column or field of the stock")
+    stockParser.add_argument('--price-field', default='price',
+        help="Column or field of the price")
+    stockParser.add_argument('--replace-prices', action='store_true',
+        help="Send the prices. Replaces all prices of a variant, including other customer groups and graduated prices")
+    stockParser.add_argument('--customer-group', default='EK',
+        help="Customer group of the prices")
+    stockParser.add_argument('--index',
+        help="JSON file of the ids by number, updated after the run. Known numbers are updated in batches")
+    stockParser.add_argument('--batch-size', type=int, default=500,
+        help="Changes per request")
+    stockParser.add_argument('--max-pending', type=int, default=100,
+        help="Number of unfinished requests at most, reading pauses meanwhile")
+    stockParser.set_defaults(func=runStock)
+
+    replayParser = commands.add_parser('replay',
+        help="Serve a recording (see --record) as fake shop")
+    replayParser.add_argument('recording',
+        help="File written with --record")
+    replayParser.add_argument('--host', default='127.0.0.1',
+        help="Address to listen on")
+    replayParser.add_argument('--port', type=int, default=8080,
+        help="Port to listen on")
+    replayParser.add_argument('--speed', type=float, default=1.0,
+        help="Replay the recorded latencies this many times faster, 0 to answer right away")
+    replayParser.set_defaults(func=runReplay)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()))
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import threading
+from urllib.parse import urlsplit, parse_qsl
+
+import simplejson
+
+from Shopware.Transport import Transport
+
+
+def created(method, resource, id, params, data):
+    """Default handler: every request succeeds with data.id 1"""
+
+    return 200, {'success': True, 'data': {'id': id or 1}}
+
+
+class FakeTransport(Transport):
+    """Transport answering the requests with a handler instead of a shop
+
+    The handler is called with method, resource, id, params and the decoded
+    body and returns the status and the response to encode. Every request is
+    recorded as (method, resource, id, data) in *requests*.
+
+    :param handler: Optional: Function answering the requests
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler or created
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def request(self, method, url, body, headers, credentials, timeout=None):
+        url = urlsplit(url)
+        parts = [part for part in url.path.split('/') if part][1:]
+        resource = parts[0]
+        id = parts[1] if len(parts) > 1 else None
+
+        if hasattr(body, 'read'):
+            body = body.read()
+        data = simplejson.loads(body) if body else None
+
+        with self.lock:
+            self.requests.append((method.upper(), resource, id, data))
+        status, response = self.handler(method.upper(), resource, id,
+            dict(parse_qsl(url.query)), data)
+        return status, simplejson.dumps(response).encode('utf-8')
+
+    def sent(self, resource=None):
+        """Returns the recorded requests, optionally of one resource only"""
+
+        with self.lock:
+            return [request for request in self.requests
+                if resource is None or request[1] == resource]
+
+
+class Gate(object):
+    """Blocks the requests of a handler until opened, so tests can hold the
+    workers busy
+
+    :param handler: Optional: Function answering the requests once the gate
+        is open
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler or created
+        self.opened = threading.Event()
+        self.lock = threading.Condition()
+        self.blocked = 0
+
+    def __call__(self, *args):
+        with self.lock:
+            self.blocked += 1
+            self.lock.notify_all()
+        self.opened.wait(10)
+        return self.handler(*args)
+
+    def waitBlocked(self, count, timeout=5):
+        """Wait until *count* requests are held by the gate"""
+
+        with self.lock:
+            return self.lock.wait_for(lambda: self.blocked >= count, timeout)
+
+    def open(self):
+        self.opened.set()
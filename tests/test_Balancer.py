@@ -0,0 +1,31 @@
+import time
+import unittest
+
+from Shopware.Balancer import EndpointPool
+from Shopware.Request import Request
+
+from tests.fakes import FakeTransport
+
+
+class EndpointPoolTest(unittest.TestCase):
+
+    def testHealthChecksUseTheTransportOfTheClient(self):
+        transport = FakeTransport(lambda method, resource, id, params, data:
+            (200, {'success': True, 'data': {'version': '5.0.0'}}))
+        pool = EndpointPool(['http://a/api', 'http://b/api'], maxFailures=1,
+            ejectSeconds=3600, healthCheckInterval=0.01)
+        Request(pool, 'user', 'key', transport=transport)
+
+        pool.release(pool.acquire(), False)
+        self.assertEqual(sum(status['ejected'] for status in pool.status().values()), 1)
+
+        deadline = time.time() + 5
+        while any(status['ejected'] for status in pool.status().values()):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+        self.assertIn(('GET', 'version', None, None), transport.sent())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import threading
+import unittest
+
+from Shopware.Callbacks import BatchCallback, InlineExecutor, OrderedExecutor, ThreadedExecutor
+from Shopware.Client import ThreadedClient
+
+from tests.fakes import FakeTransport, Gate
+
+
+class ThreadedExecutorTest(unittest.TestCase):
+
+    def testShutdownRunsBufferedCallbacks(self):
+        executor = ThreadedExecutor(numThreads=2)
+        ran = []
+        for i in range(100):
+            executor.dispatch(ran.append, i)
+        executor.shutdown()
+
+        self.assertEqual(sorted(ran), list(range(100)))
+        self.assertTrue(all(not thread.is_alive() for thread in executor.threads))
+        self.assertTrue(executor.join(1))
+
+    def testDispatchRacingShutdown(self):
+        executor = ThreadedExecutor(numThreads=2)
+        start = threading.Barrier(5)
+
+        def produce():
+            start.wait()
+            for i in range(200):
+                executor.dispatch(lambda: None)
+        producers = [threading.Thread(target=produce) for i in range(4)]
+        for producer in producers:
+            producer.start()
+        start.wait()
+        executor.shutdown()
+        for producer in producers:
+            producer.join()
+
+        ## Nothing was queued behind the exit markers
+        self.assertTrue(executor.join(1))
+
+    def testNoInlineCallbacksAfterShutdown(self):
+        executor = OrderedExecutor()
+        executor.shutdown()
+        ran = []
+        executor.dispatch(ran.append, 1)
+        self.assertEqual(ran, [])
+
+    def testBatchCallbackGetsTheTasksOfABatch(self):
+        executor = OrderedExecutor(batchSize=10)
+        started, release = threading.Event(), threading.Event()
+        executor.dispatch(lambda: (started.set(), release.wait()))
+        self.assertTrue(started.wait(1))
+
+        batches = []
+        callback = BatchCallback(batches.append)
+        for i in range(25):
+            executor.dispatch(callback, 'task{}'.format(i))
+        ran = []
+        executor.dispatch(ran.append, 'single')
+        release.set()
+        executor.shutdown()
+
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertEqual(batches[0][0], 'task0')
+        self.assertEqual(ran, ['single'])
+
+    def testBatchCallbackOfErrors(self):
+        batches = []
+        callback = BatchCallback(batches.append)
+        InlineExecutor().dispatch(callback, ValueError(), 'task')
+        self.assertEqual(batches, [['task']])
+
+    def testExitDeliversCallbacksOfRunningTasks(self):
+        gate = Gate()
+        executor = OrderedExecutor()
+        client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=1, transport=FakeTransport(gate), callbackExecutor=executor)
+
+        threads = []
+        client.push('articles', 'GET', id=1,
+            successCallback=lambda task: threads.append(threading.current_thread()))
+        self.assertTrue(gate.waitBlocked(1))
+
+        exited = threading.Thread(target=client.exit)
+        exited.start()
+        gate.open()
+        exited.join(5)
+
+        self.assertFalse(exited.is_alive())
+        self.assertEqual(threads, executor.threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import time
+import unittest
+from unittest import mock
+
+from Shopware.CircuitBreaker import CircuitBreaker
+from Shopware.Client import ThreadedClient
+from Shopware.Request import CircuitOpenError, Request, SuccessError
+
+from tests.fakes import FakeTransport, created
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FailingShop(object):
+    """Handler failing with a server error until *recovered* is set"""
+
+    def __init__(self):
+        self.recovered = False
+
+    def __call__(self, method, resource, id, params, data):
+        if not self.recovered:
+            return 503, {'success': False, 'message': 'Service unavailable'}
+        return created(method, resource, id, params, data)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('Shopware.CircuitBreaker.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.breaker = CircuitBreaker(failureRate=0.5, windowSize=4, minCalls=4,
+            resetTimeout=10, probes=2)
+
+    def openCircuit(self):
+        for success in (True, True, False, False):
+            self.assertEqual(self.breaker.acquire('shop'), 0)
+            self.breaker.record('shop', success, 0.1)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.OPEN)
+
+    def testStaysClosedBelowTheFailureRate(self):
+        for success in (True, False, True, True, True, False):
+            self.breaker.acquire('shop')
+            self.breaker.record('shop', success, 0.1)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.CLOSED)
+
+    def testNeedsMinCalls(self):
+        for i in range(3):
+            self.breaker.acquire('shop')
+            self.breaker.record('shop', False, 0.1)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.CLOSED)
+
+    def testOpenCircuitRejectsUntilTheResetTimeout(self):
+        self.openCircuit()
+
+        self.assertEqual(self.breaker.acquire('shop'), 10)
+        self.clock.advance(4)
+        self.assertEqual(self.breaker.acquire('shop'), 6)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.OPEN)
+
+        ## Other circuits are not affected
+        self.assertEqual(self.breaker.acquire('other'), 0)
+
+    def testSuccessfulProbesCloseTheCircuit(self):
+        self.openCircuit()
+        self.clock.advance(10)
+
+        self.assertEqual(self.breaker.acquire('shop'), 0)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.acquire('shop'), 0)
+        ## Only *probes* requests at a time
+        self.assertEqual(self.breaker.acquire('shop'), 1)
+
+        self.breaker.record('shop', True, 0.1)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.HALF_OPEN)
+        self.breaker.record('shop', True, 0.1)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.CLOSED)
+
+        ## The window starts over
+        for i in range(3):
+            self.breaker.record('shop', False, 0.1)
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.CLOSED)
+
+    def testFailedProbeOpensTheCircuitAgain(self):
+        self.openCircuit()
+        self.clock.advance(10)
+
+        self.assertEqual(self.breaker.acquire('shop'), 0)
+        self.breaker.record('shop', False, 0.1)
+
+        self.assertEqual(self.breaker.state('shop'), CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.acquire('shop'), 10)
+
+    def testSlowCallsFail(self):
+        breaker = CircuitBreaker(slowCallSeconds=1, windowSize=2, minCalls=2)
+        for i in range(2):
+            breaker.acquire('shop')
+            breaker.record('shop', True, 2)
+        self.assertEqual(breaker.state('shop'), CircuitBreaker.OPEN)
+
+    def testServerErrorsOpenTheCircuit(self):
+        shop = FailingShop()
+        transport = FakeTransport(shop)
+        request = Request('http://shop.test/api', 'user', 'key',
+            circuitBreaker=self.breaker, transport=transport)
+
+        for i in range(4):
+            with self.assertRaises(SuccessError):
+                request.request('get', 'articles', 1)
+        with self.assertRaises(CircuitOpenError) as raised:
+            request.request('get', 'articles', 1)
+        self.assertEqual(raised.exception.retryAfter, 10)
+        self.assertEqual(len(transport.sent()), 4)
+
+        shop.recovered = True
+        self.clock.advance(10)
+        request.request('get', 'articles', 1)
+        request.request('get', 'articles', 1)
+        self.assertEqual(self.breaker.state('http://shop.test/api'), CircuitBreaker.CLOSED)
+
+
+class PauseOnOpenCircuitTest(unittest.TestCase):
+
+    def client(self, pauseOnOpenCircuit):
+        self.shop = FailingShop()
+        self.transport = FakeTransport(self.shop)
+        self.breaker = CircuitBreaker(windowSize=1, minCalls=1, resetTimeout=0.2,
+            probes=1)
+        client = ThreadedClient('http://shop.test/api', 'user', 'key', numThreads=1,
+            circuitBreaker=self.breaker, pauseOnOpenCircuit=pauseOnOpenCircuit,
+            transport=self.transport)
+        self.addCleanup(client.exit)
+        return client
+
+    def openCircuit(self, client):
+        failed = client.push('articles', 'GET', id=1,
+            errorCallback=lambda error, task: None)
+        self.assertTrue(client.join(5))
+        self.assertIsInstance(failed.error, SuccessError)
+        self.shop.recovered = True
+
+    def testWorkerPausesUntilTheShopRecovered(self):
+        client = self.client(True)
+        self.openCircuit(client)
+
+        start = time.time()
+        task = client.push('articles', 'GET', id=2)
+        self.assertTrue(client.join(5))
+
+        self.assertIsNone(task.error)
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertEqual(len(self.transport.sent()), 2)
+        self.assertEqual(self.breaker.state('http://shop.test/api'), CircuitBreaker.CLOSED)
+
+    def testPauseEndsAtTheDeadline(self):
+        client = self.client(True)
+        self.breaker.resetTimeout = 60
+        self.openCircuit(client)
+
+        task = client.push('articles', 'GET', id=2, deadline=0.2,
+            errorCallback=lambda error, task: None)
+        self.assertTrue(client.join(5))
+
+        self.assertIsNotNone(task.error)
+        self.assertEqual(len(self.transport.sent()), 1)
+
+    def testTasksFailWithoutPausing(self):
+        client = self.client(False)
+        self.openCircuit(client)
+
+        task = client.push('articles', 'GET', id=2,
+            errorCallback=lambda error, task: None)
+        self.assertTrue(client.join(5))
+
+        self.assertIsInstance(task.error, CircuitOpenError)
+        self.assertEqual(len(self.transport.sent()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import threading
+import time
+import unittest
+
+from Shopware.Client import ThreadedClient
+from Shopware.Request import CancelledError, DependencyError, NotFoundError
+from Shopware.Tasks import ResultOf
+
+from tests.fakes import FakeTransport, Gate, created
+
+
+def failingCategories(method, resource, id, params, data):
+    if resource == 'categories':
+        return 404, {'success': False, 'message': 'not found'}
+    return created(method, resource, id, params, data)
+
+
+class ThreadedClientTest(unittest.TestCase):
+
+    def client(self, handler=None, **kwargs):
+        self.transport = FakeTransport(handler)
+        client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            transport=self.transport, **kwargs)
+        self.addCleanup(client.exit)
+        return client
+
+    def push(self, client, *args, **kwargs):
+        """Push a task collecting its errors instead of printing them"""
+
+        kwargs.setdefault('errorCallback', lambda error, task: None)
+        return client.push(*args, **kwargs)
+
+    def testDependencyFailurePropagates(self):
+        client = self.client(failingCategories)
+
+        category = self.push(client, 'categories', 'POST', data={'name': 'c'})
+        article = self.push(client, 'articles', 'POST',
+            data={'categories': [{'id': ResultOf(category)}]})
+        variant = self.push(client, 'variants', 'POST', dependsOn=[article])
+        self.assertTrue(client.join(5))
+
+        self.assertIsInstance(category.error, NotFoundError)
+        self.assertIsInstance(article.error, DependencyError)
+        self.assertIs(article.error.task, category)
+        self.assertIsInstance(variant.error, DependencyError)
+        self.assertTrue(article.done.is_set() and variant.done.is_set())
+        self.assertEqual(self.transport.sent('articles'), [])
+        self.assertEqual(self.transport.sent('variants'), [])
+
+    def testDependencyFailedAlready(self):
+        client = self.client(failingCategories)
+        category = self.push(client, 'categories', 'POST')
+        self.assertTrue(client.join(5))
+
+        errors = []
+        article = client.push('articles', 'POST', dependsOn=[category],
+            errorCallback=lambda error, task: errors.append(error))
+
+        ## Failed right away, without being queued
+        self.assertTrue(article.finished)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], DependencyError)
+        self.assertTrue(client.join(5))
+        self.assertEqual(self.transport.sent('articles'), [])
+
+    def testResultOfIsResolved(self):
+        client = self.client(lambda method, resource, id, params, data:
+            (200, {'success': True, 'data': {'id': 42 if resource == 'categories' else 7}}))
+
+        category = self.push(client, 'categories', 'POST')
+        self.push(client, 'articles', 'PUT', id=ResultOf(category), data={'x': 1})
+        self.assertTrue(client.join(5))
+        self.assertEqual(self.transport.sent('articles'), [('PUT', 'articles', '42', {'x': 1})])
+
+    def testCancelByTag(self):
+        gate = Gate()
+        client = self.client(gate, numThreads=1)
+
+        first = self.push(client, 'articles', 'GET', id=1, tags=['job'])
+        self.assertTrue(gate.waitBlocked(1))
+        queued = [self.push(client, 'articles', 'GET', id=i, tags=['job']) for i in range(2, 5)]
+        dependent = self.push(client, 'articles', 'GET', id=9, dependsOn=[queued[0]])
+        other = self.push(client, 'articles', 'GET', id=10, tags=['other'])
+
+        self.assertEqual(client.cancel(tag='job'), 4)
+        gate.open()
+        self.assertTrue(client.join(5))
+
+        ## The running task finishes, the queued ones are not sent
+        self.assertIsNone(first.error)
+        for task in queued:
+            self.assertIsInstance(task.error, CancelledError)
+        self.assertIsInstance(dependent.error, DependencyError)
+        self.assertIsNone(other.error)
+        self.assertEqual(sorted(id for method, resource, id, data in self.transport.sent()),
+            ['1', '10'])
+        self.assertEqual(client.cancel(tag='job'), 0)
+
+    def testCancelWaitingTask(self):
+        gate = Gate()
+        client = self.client(gate, numThreads=1)
+
+        first = self.push(client, 'articles', 'GET', id=1)
+        waiting = self.push(client, 'articles', 'GET', id=2, dependsOn=[first])
+        self.assertEqual(client.cancel(waiting), 1)
+        self.assertIsInstance(waiting.error, CancelledError)
+        self.assertTrue(waiting.done.is_set())
+
+        gate.open()
+        self.assertTrue(client.join(5))
+        self.assertEqual([id for method, resource, id, data in self.transport.sent()], ['1'])
+
+    def testMaxPendingBlocksPush(self):
+        gate = Gate()
+        client = self.client(gate, numThreads=1, maxPending=2)
+
+        self.push(client, 'articles', 'GET', id=1)
+        self.push(client, 'articles', 'GET', id=2)
+        self.assertTrue(gate.waitBlocked(1))
+
+        pushed = threading.Event()
+        def produce():
+            self.push(client, 'articles', 'GET', id=3)
+            pushed.set()
+        producer = threading.Thread(target=produce)
+        producer.start()
+
+        ## No room until a task finished
+        self.assertFalse(pushed.wait(0.2))
+        self.assertEqual(client.unfinished, 2)
+
+        gate.open()
+        self.assertTrue(pushed.wait(5))
+        producer.join(5)
+        self.assertTrue(client.join(5))
+        self.assertEqual(len(self.transport.sent()), 3)
+
+    def testExitFailsTheTasksNotStarted(self):
+        gate = Gate()
+        client = self.client(gate, numThreads=1)
+        errors = []
+
+        def collect(error, task):
+            errors.append(task)
+        running = self.push(client, 'articles', 'GET', id=1)
+        self.assertTrue(gate.waitBlocked(1))
+        queued = self.push(client, 'articles', 'GET', id=2, errorCallback=collect)
+        waiting = self.push(client, 'articles', 'GET', id=3, dependsOn=[queued],
+            errorCallback=collect)
+
+        exited = threading.Thread(target=client.exit)
+        exited.start()
+        self.assertTrue(queued.wait(5))
+        self.assertTrue(waiting.wait(5))
+        gate.open()
+        exited.join(5)
+
+        self.assertFalse(exited.is_alive())
+        self.assertIsNone(running.error)
+        self.assertIsInstance(queued.error, CancelledError)
+        self.assertIsNotNone(waiting.error)
+        self.assertEqual(sorted(task.id for task in errors), [2, 3])
+        self.assertEqual(client.unfinished, 0)
+
+    def testJoinTimeout(self):
+        gate = Gate()
+        client = self.client(gate, numThreads=1)
+        self.push(client, 'articles', 'GET', id=1)
+
+        start = time.time()
+        self.assertFalse(client.join(0.1))
+        self.assertLess(time.time() - start, 2)
+        gate.open()
+        self.assertTrue(client.join(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import http.server
+import socket
+import threading
+import unittest
+from unittest import mock
+
+from Shopware.Client import SimpleClient, ThreadedClient
+from Shopware.Connection import DnsCache
+from Shopware.Tasks import WarmUpTask
+from Shopware.Transport import Httplib2Transport
+
+from tests.fakes import FakeTransport
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{"success": true, "data": []}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DnsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://localhost:{}/api'.format(self.server.server_address[1])
+
+    def testTransportResolvesOnce(self):
+        transport = Httplib2Transport(cache=None)
+        self.addCleanup(transport.close)
+        client = SimpleClient(self.url, 'user', 'key', transport=transport)
+        resolve = socket.getaddrinfo
+
+        with mock.patch('socket.getaddrinfo', side_effect=resolve) as lookups:
+            client.warmUp()
+            ## New connections use the cached addresses
+            transport.close()
+            client.read('articles')
+            self.assertEqual(len(lookups.call_args_list), 1)
+
+        ## Nothing else in the process is affected
+        self.assertIs(socket.getaddrinfo, resolve)
+
+    def testWarmUpThreads(self):
+        transport = Httplib2Transport(cache=None)
+        client = ThreadedClient(self.url, 'user', 'key', numThreads=3,
+            transport=transport, warmUp=True)
+        client.exit()
+        self.assertEqual(client.readiness['ready'], 3)
+
+    def testExpiredEntriesAreDropped(self):
+        cache = DnsCache(ttl=0)
+        cache.lookup('localhost', 80)
+        cache.lookup('localhost', 81)
+        self.assertEqual(list(cache.entries), [('localhost', 81)])
+
+    def testUnreachableAddressesAreForgotten(self):
+        cache = DnsCache()
+        ## Bound, but not accepting connections
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.addCleanup(closed.close)
+        port = closed.getsockname()[1]
+        self.assertRaises(socket.error, cache.connect, '127.0.0.1', port, 1)
+        self.assertEqual(cache.entries, {})
+
+
+class WarmUpTest(unittest.TestCase):
+
+    def testWarmUpUsesTheTransport(self):
+        ## A host only the transport knows how to reach
+        transport = FakeTransport()
+        client = ThreadedClient('http://shop.invalid/api', 'user', 'key',
+            numThreads=2, transport=transport, warmUp=True)
+        self.addCleanup(client.exit)
+
+        self.assertEqual(client.readiness['ready'], 2)
+        self.assertEqual(client.readiness['errors'], [])
+        self.assertEqual(len(transport.sent('version')), 2)
+
+    def testBarrierTimeoutIsNoRequestTimeout(self):
+        task = WarmUpTask(threading.Barrier(2), 30)
+        self.assertEqual(task.barrierTimeout, 30)
+        self.assertIsNone(task.timeout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+import simplejson
+
+from Shopware.Client import ThreadedClient
+from Shopware.Exporter import Exporter
+from Shopware.Importer import Progress
+from Shopware.State import readJson
+
+from tests.fakes import FakeTransport
+
+
+class Catalog(object):
+    """Handler of a FakeTransport serving the list reads of a resource. The
+    page starting at *failAt* fails with a server error"""
+
+    def __init__(self, size):
+        self.entities = [{'id': i, 'name': 'Article {}'.format(i)} for i in range(1, size + 1)]
+        self.failAt = None
+        self.starts = []
+
+    def __call__(self, method, resource, id, params, data):
+        start, limit = int(params['start']), int(params['limit'])
+        self.starts.append(start)
+        if start == self.failAt:
+            return 503, {'success': False, 'message': 'Service unavailable'}
+        return 200, {'success': True, 'total': len(self.entities),
+            'data': self.entities[start:start + limit]}
+
+
+class ExporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+        self.catalog = Catalog(10)
+        self.client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=2, transport=FakeTransport(self.catalog))
+        self.addCleanup(self.client.exit)
+
+    def exporter(self):
+        return Exporter(self.client, 'articles', pageSize=3,
+            progress=Progress(out=io.StringIO(), keys=('written',), rateKeys=('written',)))
+
+    def lines(self, path):
+        with (gzip.open if path.endswith('.gz') else open)(path, 'rt') as f:
+            return [simplejson.loads(line) for line in f]
+
+    def testExportWritesThePagesInOrder(self):
+        for name in ('articles.jsonl', 'articles.jsonl.gz'):
+            path = os.path.join(self.directory, name)
+
+            self.assertEqual(self.exporter().run(path), 10)
+
+            self.assertEqual([entity['id'] for entity in self.lines(path)], list(range(1, 11)))
+            self.assertEqual(readJson(path + '.offset'),
+                {'offset': 10, 'bytes': os.path.getsize(path)})
+
+    def testEveryPageIsAGzipMember(self):
+        path = os.path.join(self.directory, 'articles.jsonl.gz')
+        self.exporter().run(path)
+
+        with open(path, 'rb') as f:
+            content = f.read()
+        members = 0
+        while content:
+            decompressor = zlib.decompressobj(31)
+            decompressor.decompress(content)
+            content = decompressor.unused_data
+            members += 1
+        self.assertEqual(members, 4)
+
+    def testInterruptedExportIsResumed(self):
+        for name in ('articles.jsonl', 'articles.jsonl.gz'):
+            path = os.path.join(self.directory, name)
+            self.catalog.failAt = 6
+
+            with self.assertRaises(Exception):
+                self.exporter().run(path)
+            self.assertTrue(self.client.join(5))
+            self.assertEqual(readJson(path + '.offset')['offset'], 6)
+
+            ## Half a page written when the export was killed
+            with open(path, 'ab') as f:
+                f.write(b'{"id": 7, "na')
+
+            self.catalog.failAt = None
+            self.catalog.starts = []
+            self.assertEqual(self.exporter().run(path, resume=True), 10)
+
+            self.assertEqual(self.catalog.starts[0], 6)
+            self.assertEqual([entity['id'] for entity in self.lines(path)], list(range(1, 11)))
+            self.assertEqual(os.path.getsize(path), readJson(path + '.offset')['bytes'])
+
+    def testResumeWithoutStateStartsOver(self):
+        path = os.path.join(self.directory, 'articles.jsonl')
+
+        self.assertEqual(self.exporter().run(path, resume=True), 10)
+        self.assertEqual(len(self.lines(path)), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from Shopware.Filter import filterParams, parseCondition
+
+
+class ParseConditionTest(unittest.TestCase):
+
+    def testOperators(self):
+        self.assertEqual(parseCondition('name=My article'), ('name', None, 'My article'))
+        self.assertEqual(parseCondition('changed>=2013-01-01'), ('changed', '>=', '2013-01-01'))
+        self.assertEqual(parseCondition('stock<=5'), ('stock', '<=', '5'))
+        self.assertEqual(parseCondition('active!=1'), ('active', '!=', '1'))
+        self.assertEqual(parseCondition('stock>5'), ('stock', '>', '5'))
+        self.assertEqual(parseCondition('name~%shirt%'), ('name', 'LIKE', '%shirt%'))
+
+    def testSplitsAtTheFirstOperator(self):
+        self.assertEqual(parseCondition('name=a>b'), ('name', None, 'a>b'))
+        self.assertEqual(parseCondition('name~a=b'), ('name', 'LIKE', 'a=b'))
+        self.assertEqual(parseCondition('price>=10<=20'), ('price', '>=', '10<=20'))
+        self.assertEqual(parseCondition('name='), ('name', None, ''))
+
+    def testInvalid(self):
+        self.assertRaises(ValueError, parseCondition, 'name')
+        self.assertRaises(ValueError, parseCondition, '=value')
+
+    def testFilterParamsKeepExistingFilters(self):
+        params = filterParams([('name', None, 'x')], {'filter[0][property]': 'id'})
+        self.assertEqual(params['filter[1][property]'], 'name')
+        self.assertNotIn('filter[1][expression]', params)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import http.server
+import itertools
+import threading
+import time
+import unittest
+
+from Shopware.Client import SimpleClient
+from Shopware.Hedging import HedgingPolicy
+from Shopware.Transport import Httplib2Transport
+
+from tests.fakes import FakeTransport, created
+
+
+class SlowFirstHandler(http.server.BaseHTTPRequestHandler):
+    """Holds the first request until the test ends, answers all others"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if next(self.server.calls) == 0:
+            self.server.released.wait(10)
+        body = b'{"success": true, "data": {"id": 1}}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HedgingTest(unittest.TestCase):
+
+    def policy(self):
+        hedging = HedgingPolicy(minDelay=0.05, maxDelay=0.05, budget=1.0)
+        self.addCleanup(hedging.close)
+        return hedging
+
+    def testPrimaryRunsOnTheCallingThread(self):
+        threads = []
+
+        def handler(*args):
+            threads.append(threading.current_thread())
+            return created(*args)
+        hedging = self.policy()
+        client = SimpleClient('http://shop.test/api', 'user', 'key',
+            transport=FakeTransport(handler), hedging=hedging)
+
+        for i in range(5):
+            client.read('articles', 1)
+        self.assertEqual(threads, [threading.current_thread()] * 5)
+        self.assertEqual(hedging.stats['hedged'], 0)
+
+    def testHedgeWinsAfterThePrimaryFailed(self):
+        calls = itertools.count()
+
+        def handler(*args):
+            if next(calls) == 0:
+                time.sleep(0.1)
+                raise IOError("Connection reset")
+            time.sleep(0.2)
+            return created(*args)
+        hedging = self.policy()
+        client = SimpleClient('http://shop.test/api', 'user', 'key',
+            transport=FakeTransport(handler), hedging=hedging)
+
+        self.assertTrue(client.read('articles', 1)['success'])
+        self.assertEqual(hedging.stats['won'], 1)
+
+    def testHedgeInterruptsThePrimary(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowFirstHandler)
+        server.calls = itertools.count()
+        server.released = threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(server.released.set)
+
+        transport = Httplib2Transport(cache=None)
+        self.addCleanup(transport.close)
+        hedging = self.policy()
+        client = SimpleClient('http://127.0.0.1:{}/api'.format(server.server_address[1]),
+            'user', 'key', transport=transport, hedging=hedging)
+
+        start = time.time()
+        self.assertTrue(client.read('articles', 1)['success'])
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(hedging.stats['won'], 1)
+
+        ## The interrupted connection is replaced
+        self.assertTrue(client.read('articles', 1)['success'])
+        self.assertEqual(next(server.calls), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
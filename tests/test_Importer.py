@@ -0,0 +1,118 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson
+
+from Shopware.Client import ThreadedClient
+from Shopware.Importer import Importer, Progress, parseMapping
+
+from tests.fakes import FakeTransport, created
+
+
+def batches(method, resource, id, params, data):
+    """Answers batches per item, items without a number fail"""
+
+    if isinstance(data, list):
+        return 200, {'success': True, 'data': [
+            {'success': True, 'operation': 'create', 'data': {'id': i + 1}}
+            if item.get('mainDetail', {}).get('number') else
+            {'success': False, 'operation': 'create', 'message': 'Number missing'}
+            for i, item in enumerate(data)
+        ]}
+    return created(method, resource, id, params, data)
+
+
+class ImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+        self.transport = FakeTransport(batches)
+        self.client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=2, maxPending=4, transport=self.transport)
+        self.addCleanup(self.client.exit)
+
+    def importer(self, **kwargs):
+        return Importer(self.client, 'articles',
+            progress=Progress(out=io.StringIO()), **kwargs)
+
+    def writeLines(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with (gzip.open if name.endswith('.gz') else open)(path, 'wt') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        return path
+
+    def items(self):
+        """Returns the items sent by batch, in the order of the requests"""
+
+        return [item for method, resource, id, data in self.transport.sent('articles')
+            for item in data]
+
+    def testChunkedJsonlIsMappedAndUpserted(self):
+        path = self.writeLines('articles.jsonl', [
+            simplejson.dumps({'sku': 'SW{}'.format(i), 'price': '{}.5'.format(i)})
+            for i in range(1, 6)
+        ] + ['', '{broken', simplejson.dumps({'price': '1'})])
+        importer = self.importer(chunkSize=2, batchSize=2,
+            mapping=parseMapping(['sku=mainDetail.number',
+                'price=mainDetail.prices.0.price:float']))
+
+        counts = importer.run(path)
+
+        self.assertEqual(counts, {'read': 7, 'succeeded': 5, 'failed': 2})
+        self.assertEqual(self.items()[0], {'mainDetail': {'number': 'SW1',
+            'prices': [{'price': 1.5}]}})
+        self.assertEqual([item['mainDetail']['number'] for item in self.items()],
+            ['SW1', 'SW2', 'SW3', 'SW4', 'SW5'])
+        self.assertEqual([len(data) for method, resource, id, data in self.transport.sent()],
+            [2, 2, 1])
+
+    def testFailedBatchItemsAreCounted(self):
+        path = self.writeLines('articles.jsonl', [
+            simplejson.dumps({'mainDetail': {'number': 'SW1'}}),
+            simplejson.dumps({'mainDetail': {'number': ''}}),
+        ])
+
+        counts = self.importer().run(path)
+
+        self.assertEqual(counts, {'read': 2, 'succeeded': 1, 'failed': 1})
+
+    def testCompressedCsvIsCreated(self):
+        path = os.path.join(self.directory, 'articles.csv.gz')
+        with gzip.open(path, 'wt', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['number', 'name', 'active'])
+            for i in range(1, 4):
+                writer.writerow(['SW{}'.format(i), 'Article {}'.format(i), 'yes'])
+        importer = self.importer(mode='create', chunkSize=2,
+            mapping=parseMapping(['number=mainDetail.number', 'name', 'active:bool']))
+
+        counts = importer.run(path, delimiter=';')
+
+        self.assertEqual(counts, {'read': 3, 'succeeded': 3})
+        self.assertEqual(sorted(data['mainDetail']['number']
+            for method, resource, id, data in self.transport.sent()), ['SW1', 'SW2', 'SW3'])
+        self.assertTrue(all(method == 'POST' and data['active'] is True
+            for method, resource, id, data in self.transport.sent()))
+
+    def testWorkerProcessesKeepTheOrder(self):
+        path = self.writeLines('articles.jsonl', [
+            simplejson.dumps({'mainDetail': {'number': 'SW{}'.format(i)}})
+            for i in range(50)
+        ])
+
+        counts = self.importer(processes=2, chunkSize=3, batchSize=1000).run(path)
+
+        self.assertEqual(counts, {'read': 50, 'succeeded': 50})
+        self.assertEqual([item['mainDetail']['number'] for item in self.items()],
+            ['SW{}'.format(i) for i in range(50)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import itertools
+import unittest
+
+from Shopware.Client import SimpleClient
+
+from tests.fakes import FakeTransport
+
+
+class MediaCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        ids = itertools.count(1)
+        self.transport = FakeTransport(lambda method, resource, id, params, data:
+            (200, {'success': True, 'data': {'id': next(ids)}}))
+        self.client = SimpleClient('http://shop.test/api', 'user', 'key',
+            transport=self.transport)
+
+    def testSameUploadIsSentOnce(self):
+        first = self.client.uploadMedia(b'image', {'album': -1})
+        second = self.client.uploadMedia(bytearray(b'image'), {'album': -1})
+        self.assertEqual(first['data']['id'], second['data']['id'])
+        self.assertEqual(len(self.transport.sent('media')), 1)
+
+    def testOtherFieldsAreUploadedAgain(self):
+        first = self.client.uploadMedia(b'image', {'album': -1})
+        other = self.client.uploadMedia(b'image', {'album': -2})
+        described = self.client.uploadMedia(b'image', {'album': -1, 'description': 'x'})
+        self.assertEqual(len({first['data']['id'], other['data']['id'],
+            described['data']['id']}), 3)
+        self.assertEqual([data['album'] for method, resource, id, data
+            in self.transport.sent('media')], [-1, -2, -1])
+
+
+if __name__ == '__main__':
+    unittest.main()
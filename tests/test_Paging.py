@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Shopware.Paging import PageSizer
+
+
+## Entities per second of each page size, best at 400
+RATES = {100: 50, 200: 100, 400: 150, 800: 120, 1000: 90}
+
+
+class PageSizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def sizer(self, **kwargs):
+        kwargs.setdefault('minSize', 100)
+        kwargs.setdefault('maxSize', 1000)
+        kwargs.setdefault('initialSize', 200)
+        kwargs.setdefault('samples', 2)
+        kwargs.setdefault('step', 2)
+        return PageSizer(**kwargs)
+
+    def read(self, sizer, pages, seconds=None, received=None):
+        """Feed full pages read at the RATES, returns the sizes used"""
+
+        sizes = []
+        for i in range(pages):
+            size = sizer.size('articles')
+            sizes.append(size)
+            sizer.observe('articles', size, size,
+                seconds(size) if seconds else size / RATES[size],
+                received(size) if received else None)
+        return sizes
+
+    def testClimbsAndTurnsAroundAtTheBestSize(self):
+        sizer = self.sizer()
+
+        sizes = self.read(sizer, 12)
+
+        self.assertEqual(sizes[::2], [200, 400, 800, 400, 200, 400])
+        self.assertEqual(sizes[::2], sizes[1::2])
+        self.assertEqual(sizer.sizes['articles'], 400)
+
+    def testTurnsAroundAtTheMaxSize(self):
+        sizer = self.sizer(initialSize=800)
+
+        sizes = self.read(sizer, 8, seconds=lambda size: size / 100)
+
+        ## Equal rates keep the direction, the bound is measured again
+        ## before turning around
+        self.assertEqual(sizes[::2], [800, 1000, 1000, 500])
+
+    def testSlowPagesLowerTheCeiling(self):
+        sizer = self.sizer(maxSeconds=5)
+
+        sizes = self.read(sizer, 16, seconds=lambda size: 10 if size >= 800 else size / RATES[size])
+
+        self.assertEqual(sizes[:5], [200, 200, 400, 400, 800])
+        self.assertEqual(sizes[5], 400)
+        self.assertLessEqual(max(sizes[5:]), 400)
+        self.assertNotIn(800, sizer.states['articles']['rates'])
+        self.assertEqual(sizer.sizes['articles'], 400)
+
+    def testLargeResponsesLowerTheCeiling(self):
+        sizer = self.sizer(maxBytes=500 * 1000)
+
+        sizes = self.read(sizer, 16, received=lambda size: size * 1000)
+
+        self.assertEqual(sizer.states['articles']['ceiling'], 400)
+        self.assertLessEqual(max(sizes[5:]), 400)
+
+    def testPartialAndOutdatedPagesAreIgnored(self):
+        sizer = self.sizer()
+
+        sizer.observe('articles', 200, 120, 1.0)
+        sizer.observe('articles', 400, 400, 1.0)
+        sizer.observe('articles', 200, 200, 0)
+        self.assertEqual(sizer.states['articles']['measured'], [])
+
+        ## The median of the samples decides
+        sizer = self.sizer(samples=3)
+        for seconds in (2.0, 1.0, 4.0):
+            sizer.observe('articles', 200, 200, seconds)
+        self.assertEqual(sizer.states['articles']['rates'], {200: 100})
+
+    def testBestSizesAreSaved(self):
+        path = os.path.join(self.directory, 'pagesizes.json')
+        sizer = self.sizer(path=path)
+        self.read(sizer, 12)
+        sizer.save()
+
+        sizer = self.sizer(path=path)
+        self.assertEqual(sizer.size('articles'), 400)
+        self.assertEqual(sizer.size('variants'), 200)
+
+    def testCeilingLowersASavedSize(self):
+        path = os.path.join(self.directory, 'pagesizes.json')
+        sizer = self.sizer(path=path, maxSeconds=5)
+        sizer.sizes['articles'] = 800
+
+        sizer.observe('articles', 800, 800, 10)
+
+        self.assertEqual(sizer.sizes['articles'], 400)
+        self.assertEqual(sizer.size('articles'), 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+from Shopware.Client import ThreadedClient
+from Shopware.Products import ProductWriter
+from Shopware.Request import DependencyError
+
+from tests.fakes import FakeTransport, created
+
+
+def rejectArticles(method, resource, id, params, data):
+    if resource == 'articles':
+        return 400, {'success': False, 'message': "Invalid article"}
+    return created(method, resource, id, params, data)
+
+
+class SettledClient(ThreadedClient):
+    """Returns from upsert once the task is done, as if it failed at once"""
+
+    def upsert(self, *args, **kwargs):
+        task = ThreadedClient.upsert(self, *args, **kwargs)
+        self.join()
+        return task
+
+
+class ProductWriterTest(unittest.TestCase):
+
+    def testArticleFailedBeforeTheTranslationsArePushed(self):
+        client = SettledClient('http://shop.test/api', 'user', 'key',
+            numThreads=2, transport=FakeTransport(rejectArticles))
+        self.addCleanup(client.exit)
+
+        calls = []
+        write = ProductWriter(client).write(
+            {'name': 'Shirt', 'mainDetail': {'number': 'sw-1'}},
+            translations={2: {'name': 'Hemd'}},
+            callback=lambda write: calls.append(list(write.errors))
+        )
+
+        self.assertTrue(write.wait(5))
+        client.join()
+        ## Called once, with the errors of all parts
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([(part, number) for part, number, error in calls[0]],
+            [('article', 'sw-1'), ('translation', 'sw-1')])
+        self.assertEqual(len(write.tasks), 2)
+
+    def testVariantWithoutNumberPushesNothing(self):
+        transport = FakeTransport()
+        client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=1, transport=transport)
+        self.addCleanup(client.exit)
+
+        writer = ProductWriter(client, embedVariants=False)
+        self.assertRaises(ValueError, writer.write,
+            {'mainDetail': {'number': 'sw-1'}}, variants=[{'additionalText': 'Red'}])
+        client.join()
+        self.assertEqual(transport.sent(), [])
+
+    def testFailedPushStillFinishesTheWrite(self):
+        client = FailingBatchClient('http://shop.test/api', 'user', 'key',
+            numThreads=1, transport=FakeTransport())
+        self.addCleanup(client.exit)
+
+        writer = ProductWriter(client, embedVariants=False)
+        calls = []
+        with self.assertRaises(RuntimeError):
+            writer.write({'mainDetail': {'number': 'sw-1'}},
+                variants=[{'number': 'sw-1.1'}], callback=calls.append)
+
+        client.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([part for part, number, error in calls[0].errors], ['product'])
+        self.assertEqual(calls[0].counts, {'article': 1})
+
+    def testFailedImageFailsTheProduct(self):
+        def rejectMedia(method, resource, id, params, data):
+            if resource == 'media':
+                return 400, {'success': False, 'message': "Invalid image"}
+            return created(method, resource, id, params, data)
+        transport = FakeTransport(rejectMedia)
+        client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=2, transport=transport)
+        self.addCleanup(client.exit)
+
+        write = ProductWriter(client).write({'mainDetail': {'number': 'sw-1'}},
+            translations={2: {'name': 'Hemd'}}, images=[b'image'])
+
+        self.assertTrue(write.wait(5))
+        self.assertEqual([part for part, number, error in write.errors],
+            ['image', 'article', 'translation'])
+        self.assertIsInstance(write.errors[1][2], DependencyError)
+        self.assertEqual(transport.sent('articles'), [])
+
+
+class FailingBatchClient(ThreadedClient):
+
+    def upsertBatch(self, *args, **kwargs):
+        raise RuntimeError("Queue closed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Shopware.Replay import Recording, RecordingTransport, ReplayTransport
+
+from tests.fakes import FakeTransport
+
+URL = 'http://shop.test/api/articles/{}/?'
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, 'recording.jsonl.gz')
+
+        recorder = RecordingTransport(FakeTransport(), self.path)
+        for id in range(1, 4):
+            for body in (b'{"a": 1}', b'{"a": 2}'):
+                recorder.request('PUT', URL.format(id), body, {}, ('user', 'key'))
+        recorder.close()
+
+    def testMatchesByBody(self):
+        recording = Recording(self.path)
+        record = recording.find('PUT', URL.format(2), b'{"a": 2}')
+        self.assertEqual(record['path'], '/api/articles/2/')
+
+    def testUnrecordedBodyMatchesByUrl(self):
+        recording = Recording(self.path)
+        self.assertEqual(len(recording.keys), 3)
+
+        record = recording.find('PUT', URL.format(3), b'{"a": 3}')
+        self.assertEqual(record['path'], '/api/articles/3/')
+        ## Streamed bodies are not hashed
+        record = recording.find('PUT', URL.format(1), io.BytesIO(b'{"a": 1}'))
+        self.assertEqual(record['path'], '/api/articles/1/')
+        self.assertIsNone(recording.find('PUT', URL.format(4), b'{"a": 1}'))
+
+    def testReplay(self):
+        transport = ReplayTransport(self.path, speed=None)
+        status, content = transport.request('PUT', URL.format(1), b'{"a": 1}', {},
+            ('user', 'key'))
+        self.assertEqual(status, 200)
+        status, content = transport.request('GET', URL.format(1), None, {},
+            ('user', 'key'))
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
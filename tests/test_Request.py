@@ -0,0 +1,291 @@
+import unittest
+
+from Shopware.Client import ThreadedClient
+from Shopware.Index import IdIndex
+from Shopware.Request import LazyResponse, Request
+
+from tests.fakes import FakeTransport
+
+
+class FakeShop(object):
+    """Handler of a FakeTransport knowing articles by id and number, like
+    the shop does. Creates articles on POST and answers batches (PUT of a
+    list) per item. The query params of the requests are kept in *params*"""
+
+    def __init__(self, articles):
+        self.articles = dict(articles)
+        self.params = []
+
+    def find(self, id, params):
+        if params.get('useNumberAsId'):
+            for articleId, number in self.articles.items():
+                if number == id:
+                    return articleId
+            return None
+        return int(id) if id and int(id) in self.articles else None
+
+    def create(self, data):
+        number = IdIndex.numberOf('articles', data)
+        if number is None:
+            return None
+        articleId = max(self.articles or [0]) + 1
+        self.articles[articleId] = number
+        return articleId
+
+    def batch(self, items):
+        results = []
+        for item in items:
+            if 'id' in item:
+                articleId, operation = self.find(str(item['id']), {}), 'update'
+            else:
+                number = IdIndex.numberOf('articles', item)
+                articleId, operation = self.find(number, {'useNumberAsId': True}), 'update'
+                if articleId is None:
+                    articleId, operation = self.create(item), 'create'
+            if articleId is None:
+                results.append({'success': False, 'operation': operation,
+                    'message': 'Invalid article'})
+            else:
+                results.append({'success': True, 'operation': operation,
+                    'data': {'id': articleId}})
+        return results
+
+    def __call__(self, method, resource, id, params, data):
+        self.params.append(params)
+        if isinstance(data, list):
+            return 200, {'success': True, 'data': self.batch(data)}
+        if method == 'POST':
+            return 201, {'success': True, 'data': {'id': self.create(data)}}
+        articleId = self.find(id, params)
+        if articleId is None:
+            return 404, {'success': False, 'message': 'Article not found'}
+        return 200, {'success': True, 'data': {'id': articleId}}
+
+
+class LazyResponseTest(unittest.TestCase):
+
+    def testCompactShapeIsNotDecoded(self):
+        response = LazyResponse(b'{"success":true,"data":{"id":4711,"location":"x"}}')
+
+        self.assertTrue(response.success)
+        self.assertEqual(response.id, 4711)
+        self.assertIsNone(response.decoded)
+
+        self.assertEqual(response['data']['location'], 'x')
+        self.assertIsNotNone(response.decoded)
+
+    def testBufferIsNotCopied(self):
+        response = LazyResponse(bytearray(b'{"success":true,"data":{"id":1}}'))
+
+        self.assertEqual(response.id, 1)
+        self.assertIsNone(response.decoded)
+
+    def testOtherShapesAreDecoded(self):
+        bodies = [
+            b'{ "success": true, "data": { "id": 4711 } }',
+            b'{"data":{"id":4711},"success":true}',
+            b'{"success":true,"data":{"location":"x","id":4711}}',
+            b'{"success":true,"data":{"id":4711.0}}',
+        ]
+        for body in bodies:
+            response = LazyResponse(body)
+            self.assertTrue(response.success, body)
+            self.assertEqual(response.id, 4711, body)
+            self.assertIsNotNone(response.decoded, body)
+
+    def testSuccessWithoutData(self):
+        response = LazyResponse(b'{"success":true}')
+
+        self.assertTrue(response.success)
+        self.assertIsNone(response.decoded)
+        self.assertIsNone(response.id)
+
+    def testFailure(self):
+        response = LazyResponse(b'{"success":false,"message":"Invalid"}', 400)
+
+        self.assertFalse(response.success)
+        self.assertIsNone(response.id)
+        self.assertEqual(response['message'], 'Invalid')
+        self.assertEqual(response.status, 400)
+
+    def testStringId(self):
+        response = LazyResponse(b'{"success":true,"data":{"id":"SW10001"}}')
+
+        self.assertTrue(response.success)
+        self.assertEqual(response.id, 'SW10001')
+
+    def testAssignedKeysAreKeptAside(self):
+        response = LazyResponse(b'{"success":true,"data":{"id":1}}')
+        response['operation'] = 'create'
+
+        self.assertEqual(response.operation, 'create')
+        self.assertEqual(response['operation'], 'create')
+        self.assertIsNone(response.decoded)
+
+        self.assertEqual(dict(response), {'success': True, 'data': {'id': 1},
+            'operation': 'create'})
+        self.assertEqual(len(response), 3)
+        self.assertNotIn('operation', response.decoded)
+
+        del response['operation']
+        self.assertNotIn('operation', response)
+        self.assertEqual(len(response), 2)
+
+
+class PreparedRequestTest(unittest.TestCase):
+
+    def request(self, articles={7: 'SW1'}):
+        self.shop = FakeShop(articles)
+        self.transport = FakeTransport(self.shop)
+        self.index = IdIndex()
+        return Request('http://shop.test/api', 'user', 'key', index=self.index,
+            transport=self.transport)
+
+    def testNumberIsRedirectedToTheKnownId(self):
+        request = self.request()
+        self.index.set('articles', 'SW1', 7)
+
+        update = request.prepare('PUT', 'articles', {'useNumberAsId': True})
+        result = request.execute(update, 'SW1', {'name': 'Shirt'})
+
+        self.assertEqual(result['data']['id'], 7)
+        self.assertEqual(self.transport.sent(), [('PUT', 'articles', '7', {'name': 'Shirt'})])
+        self.assertEqual(self.shop.params, [{}])
+
+    def testOutdatedIdFallsBackToTheNumber(self):
+        request = self.request()
+        self.index.set('articles', 'SW1', 99)
+
+        update = request.prepare('PUT', 'articles', {'useNumberAsId': True})
+        result = request.execute(update, 'SW1', {'name': 'Shirt'})
+
+        self.assertEqual(result['data']['id'], 7)
+        self.assertEqual(self.transport.sent(), [
+            ('PUT', 'articles', '99', {'name': 'Shirt'}),
+            ('PUT', 'articles', 'SW1', {'name': 'Shirt'}),
+        ])
+        self.assertEqual(self.shop.params[1], {'useNumberAsId': 'True'})
+        self.assertEqual(self.index.get('articles', 'SW1'), 7)
+
+    def testUnknownNumberIsSentAsNumber(self):
+        request = self.request()
+
+        read = request.prepare('GET', 'articles', {'useNumberAsId': True})
+        request.execute(read, 'SW1')
+
+        self.assertEqual(self.transport.sent(), [('GET', 'articles', 'SW1', None)])
+
+    def testNoBodyForReadsAndDeletes(self):
+        request = self.request()
+
+        request.execute(request.prepare('GET', 'articles'), 7)
+        request.execute(request.prepare('DELETE', 'articles'), 7)
+        request.request('get', 'articles', 7)
+        request.request('delete', 'articles', 7)
+
+        ## An encoded empty payload would be recorded as ''
+        self.assertEqual([data for method, resource, id, data in self.transport.sent()],
+            [None] * 4)
+
+    def testPreparedTask(self):
+        self.request()
+        self.index.set('articles', 'SW1', 99)
+        client = ThreadedClient('http://shop.test/api', 'user', 'key', numThreads=1,
+            index=self.index, transport=self.transport)
+        self.addCleanup(client.exit)
+
+        update = client.prepare('PUT', 'articles', {'useNumberAsId': True})
+        task = client.pushPrepared(update, 'SW1', {'name': 'Shirt'})
+        read = client.pushPrepared(client.prepare('GET', 'articles'), 7)
+        self.assertTrue(client.join(5))
+
+        self.assertIsNone(task.error)
+        self.assertEqual(task.result['data']['id'], 7)
+        self.assertEqual(self.index.get('articles', 'SW1'), 7)
+        self.assertEqual(self.transport.sent()[-1], ('GET', 'articles', '7', None))
+        self.assertIsNone(read.error)
+
+
+class UpsertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shop = FakeShop({7: 'SW1'})
+        self.transport = FakeTransport(self.shop)
+        self.index = IdIndex()
+        self.request = Request('http://shop.test/api', 'user', 'key',
+            index=self.index, transport=self.transport)
+
+    def testExistingObjectIsUpdated(self):
+        result = self.request.upsert('articles', 'SW1', {'name': 'Shirt'})
+
+        self.assertEqual(result['operation'], 'update')
+        self.assertEqual(self.transport.sent(), [('PUT', 'articles', 'SW1', {'name': 'Shirt'})])
+        self.assertEqual(self.shop.params, [{'useNumberAsId': 'True'}])
+        self.assertEqual(self.index.get('articles', 'SW1'), 7)
+
+    def testKnownIdIsUpdatedById(self):
+        self.index.set('articles', 'SW1', 7)
+
+        result = self.request.upsert('articles', 'SW1', {'name': 'Shirt'})
+
+        self.assertEqual(result['operation'], 'update')
+        self.assertEqual(self.transport.sent(), [('PUT', 'articles', '7', {'name': 'Shirt'})])
+
+    def testUnknownObjectIsCreated(self):
+        result = self.request.upsert('articles', 'SW2', {'name': 'Pants'})
+
+        self.assertEqual(result['operation'], 'create')
+        self.assertEqual(result['data']['id'], 8)
+        self.assertEqual(self.transport.sent(), [
+            ('PUT', 'articles', 'SW2', {'name': 'Pants'}),
+            ('POST', 'articles', None, {'name': 'Pants', 'mainDetail': {'number': 'SW2'}}),
+        ])
+        self.assertEqual(self.index.get('articles', 'SW2'), 8)
+
+    def testBatchResultsFillTheIndex(self):
+        self.index.set('articles', 'SW1', 7)
+
+        results = self.request.upsertBatch('articles', [
+            ('SW1', {'name': 'Shirt'}),
+            ('SW2', {'name': 'Pants'}),
+            (None, {'name': 'Without number'}),
+        ], batchSize=2)
+
+        self.assertEqual([result['operation'] for result in results],
+            ['update', 'create', 'create'])
+        self.assertEqual([result['success'] for result in results], [True, True, False])
+        self.assertEqual(self.transport.sent(), [
+            ('PUT', 'articles', None, [
+                {'id': 7, 'name': 'Shirt', 'mainDetail': {'number': 'SW1'}},
+                {'name': 'Pants', 'mainDetail': {'number': 'SW2'}},
+            ]),
+            ('PUT', 'articles', None, [
+                {'name': 'Without number', 'mainDetail': {'number': None}},
+            ]),
+        ])
+        self.assertEqual(self.index.get('articles', 'SW2'), 8)
+        self.assertEqual(self.index.ids['articles'], {'SW1': 7, 'SW2': 8})
+
+    def testThreadedClientTasks(self):
+        client = ThreadedClient('http://shop.test/api', 'user', 'key', numThreads=2,
+            index=self.index, transport=self.transport)
+        self.addCleanup(client.exit)
+
+        update = client.upsert('articles', 'SW1', {'name': 'Shirt'})
+        create = client.upsert('articles', 'SW2', {'name': 'Pants'})
+        self.assertTrue(client.join(5))
+        batch = client.upsertBatch('articles', {'SW2': {'name': 'Pants'},
+            'SW3': {'name': 'Socks'}})
+        self.assertTrue(client.join(5))
+
+        self.assertEqual(update.result['operation'], 'update')
+        self.assertEqual(create.result['operation'], 'create')
+        self.assertEqual([result['operation'] for result in batch.result],
+            ['update', 'create'])
+        self.assertEqual(self.index.ids['articles'], {'SW1': 7, 'SW2': 8, 'SW3': 9})
+        ## The id of SW2 was known to the index when the batch was sent
+        self.assertEqual(self.transport.sent()[-1][3][0]['id'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
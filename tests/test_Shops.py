@@ -0,0 +1,80 @@
+import time
+import unittest
+
+from Shopware.Shops import RateLimiter, ShopManager
+
+from tests.fakes import FakeTransport, Gate
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def testBurstThenRate(self):
+        limiter = RateLimiter(10, burst=2)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+        ## Waiting threads queue up behind each other
+        self.assertAlmostEqual(limiter.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(limiter.reserve(), 0.2, delta=0.01)
+
+
+class ShopManagerTest(unittest.TestCase):
+
+    def testMaxRate(self):
+        transport = FakeTransport()
+        manager = ShopManager(numThreads=4, transport=transport)
+        self.addCleanup(manager.exit)
+        slow = manager.addShop('slow', 'http://slow.test/api', 'user', 'key',
+            maxRate=50, maxConcurrent=2)
+        fast = manager.addShop('fast', 'http://fast.test/api', 'user', 'key')
+
+        start = time.time()
+        for i in range(75):
+            slow.push('articles', 'GET', id=i)
+        for i in range(75):
+            fast.push('articles', 'GET', id=i)
+        fast.join()
+        self.assertLess(time.time() - start, 0.4)
+
+        slow.join()
+        ## 50 at once, the other 25 at 50 per second
+        self.assertGreaterEqual(time.time() - start, 0.45)
+        self.assertEqual(manager.stats()['slow']['succeeded'], 75)
+
+    def testStatsOfUncappedShop(self):
+        gate = Gate()
+        manager = ShopManager(numThreads=3, transport=FakeTransport(gate))
+        self.addCleanup(manager.exit)
+        shop = manager.addShop('de', 'http://de.test/api', 'user', 'key')
+
+        for i in range(5):
+            shop.push('articles', 'GET', id=i)
+        self.assertTrue(gate.waitBlocked(3))
+        stats = manager.stats()['de']
+        self.assertEqual((stats['pending'], stats['running']), (5, 3))
+
+        gate.open()
+        shop.join()
+        stats = manager.stats()['de']
+        self.assertEqual((stats['pending'], stats['running'], stats['succeeded']), (0, 0, 5))
+
+    def testShopClientMethods(self):
+        transport = FakeTransport()
+        manager = ShopManager(numThreads=4, transport=transport, timeout=5)
+        self.addCleanup(manager.exit)
+        shop = manager.addShop('de', 'http://de.test/api', 'user', 'key',
+            maxConcurrent=2)
+
+        self.assertEqual(shop.warmUp(5)['ready'], 2)
+        self.assertIs(shop.transport, transport)
+        self.assertEqual(shop.timeout, 5)
+        self.assertIsNone(shop.sink)
+
+        shop.setDeadline(30)
+        read = shop.pushPrepared(shop.prepare('GET', 'articles'), 1)
+        self.assertTrue(shop.join(5))
+        self.assertIsNone(read.error)
+        self.assertIsNotNone(read.deadline)
+
+
+if __name__ == '__main__':
+    unittest.main()
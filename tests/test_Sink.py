@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Shopware.Sink import SqliteSink
+from Shopware.Tasks import APITask
+
+
+class SqliteSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, 'results.db')
+
+    def task(self, id, seconds=0.1):
+        task = APITask('articles', 'PUT', id=id)
+        task.result = {'success': True, 'data': {'id': id}}
+        task.seconds = seconds
+        return task
+
+    def testBrokenRowKeepsTheBatch(self):
+        sink = SqliteSink(self.path, flushInterval=0.01, maxRetries=2)
+        sink.record(self.task(1))
+        ## Cannot be bound as a parameter
+        sink.record(self.task(2, seconds=object()))
+        sink.record(self.task(3))
+        sink.close()
+
+        self.assertEqual(sink.counts(), {'success': 2})
+        self.assertEqual([row['target'] for row in sink.select()], ['1', '3'])
+        self.assertEqual(sink.dropped, 1)
+
+    def testUnrecordableTaskIsCounted(self):
+        sink = SqliteSink(self.path, flushInterval=0.01)
+        task = self.task(1)
+        task.tags = None
+        sink.record(task)
+        sink.record(self.task(2))
+        sink.flush()
+
+        self.assertEqual(sink.dropped, 1)
+        self.assertEqual(sink.counts(), {'success': 1})
+        sink.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
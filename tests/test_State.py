@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Shopware.Index import IdIndex
+from Shopware.Paging import PageSizer
+from Shopware.State import readJson, replacing, writeJson
+from Shopware.Sync import Watermarks
+
+
+class StateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, 'state.json')
+
+    def testRoundTrip(self):
+        writeJson(self.path, {'a': 1})
+        writeJson(self.path, {'a': 2})
+        self.assertEqual(readJson(self.path), {'a': 2})
+        self.assertEqual(os.listdir(self.directory), ['state.json'])
+
+    def testFailedWriteKeepsTheFile(self):
+        writeJson(self.path, {'a': 1})
+        with self.assertRaises(RuntimeError):
+            with replacing(self.path) as f:
+                f.write('{"a": ')
+                raise RuntimeError()
+        self.assertEqual(readJson(self.path), {'a': 1})
+        self.assertEqual(os.listdir(self.directory), ['state.json'])
+
+    def testStatefulClassesUseIt(self):
+        index = IdIndex(self.path)
+        index.set('articles', 'sw-1', 5)
+        index.save()
+        self.assertEqual(IdIndex(self.path).get('articles', 'sw-1'), 5)
+
+        sizer = PageSizer(self.path + '.sizes')
+        sizer.sizes['articles'] = 800
+        sizer.save()
+        self.assertEqual(PageSizer(self.path + '.sizes').size('articles'), 800)
+
+        path = self.path + '.marks'
+        self.assertFalse(os.path.exists(path))
+        marks = Watermarks(path)
+        marks.marks['articles'] = 'x'
+        marks.save()
+        self.assertEqual(readJson(path), {'articles': 'x'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Shopware.Client import ThreadedClient
+from Shopware.Index import IdIndex
+from Shopware.Stock import InvalidRow, Snapshot, StockSync, readRows
+
+from tests.fakes import FakeTransport
+
+
+class Shop(object):
+    """Handler knowing some variants, it never creates one"""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __call__(self, method, resource, id, params, data):
+        if id is None:
+            return 200, {'success': True, 'data': [self.update(item.get('id'))
+                for item in data]}
+        if params.get('useNumberAsId'):
+            id = self.ids.get(id)
+        outcome = self.update(id)
+        return (200 if outcome['success'] else 404), outcome
+
+    def update(self, id):
+        if id not in self.ids.values():
+            return {'success': False, 'message': "Variant not found"}
+        return {'success': True, 'operation': 'update', 'data': {'id': id}}
+
+
+class StockSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = FakeTransport(Shop({'sw-1': 11, 'sw-2': 12}))
+        self.client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=2, transport=self.transport, index=IdIndex())
+        self.addCleanup(self.client.exit)
+        self.snapshot = Snapshot()
+
+    def testUnknownNumbersFail(self):
+        sync = StockSync(self.client, 'variants', self.snapshot)
+        counts = sync.run([('sw-1', 5, 9.99), ('sw-2', 6, None), ('sw-9', 7, None)])
+
+        self.assertEqual(counts['updated'], 2)
+        self.assertEqual(counts['failed'], 1)
+        self.assertEqual(self.snapshot.get('sw-9'), (None, None))
+        self.assertEqual(sorted(id for method, resource, id, data
+            in self.transport.sent()), ['sw-1', 'sw-2', 'sw-9'])
+
+    def testKnownNumbersAreBatchedById(self):
+        sync = StockSync(self.client, 'variants', self.snapshot)
+        sync.run([('sw-1', 5, None), ('sw-2', 6, None)])
+        del self.transport.requests[:]
+
+        counts = sync.run([('sw-1', 4, None), ('sw-2', 6, None)])
+        ## The counts add up over the runs of a sync
+        self.assertEqual(counts['updated'], 3)
+        self.assertEqual(self.transport.sent(),
+            [('PUT', 'variants', None, [{'inStock': 4, 'id': 11, 'number': 'sw-1'}])])
+
+    def testPricesAreOnlySentOnRequest(self):
+        StockSync(self.client, 'variants', self.snapshot).run([('sw-1', None, 9.99)])
+        self.assertEqual(self.transport.sent(), [])
+
+        StockSync(self.client, 'variants', self.snapshot,
+            replacePrices=True).run([('sw-1', None, 9.99)])
+        data = self.transport.sent()[0][3]
+        self.assertEqual(data['prices'], [{'customerGroupKey': 'EK', 'price': 9.99}])
+
+    def testBadRowsAreCountedAsFailed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        feed = os.path.join(directory, 'stock.csv')
+        with open(feed, 'w') as f:
+            f.write("number,stock,price\nsw-1,5,\n,3,\nsw-2,many,\nsw-3,1,1.5.0\n")
+
+        rows = list(readRows(feed))
+        self.assertEqual(rows[0], ('sw-1', 5, None))
+        self.assertTrue(all(isinstance(row, InvalidRow) for row in rows[1:]))
+
+        snapshot = Snapshot(os.path.join(directory, 'stock.snapshot'))
+        counts = StockSync(self.client, 'variants', snapshot).run(readRows(feed))
+        self.assertEqual((counts['read'], counts['updated'], counts['failed']), (4, 1, 3))
+        self.assertEqual(Snapshot(snapshot.path).get('sw-1'), (5, None))
+
+    def testBrokenFeedStillSavesTheSnapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        snapshot = Snapshot(os.path.join(directory, 'stock.snapshot'))
+
+        def rows():
+            yield ('sw-1', 5, None)
+            raise IOError("Connection to the ERP lost")
+        sync = StockSync(self.client, 'variants', snapshot, batchSize=1)
+        self.assertRaises(IOError, sync.run, rows())
+        self.assertEqual(Snapshot(snapshot.path).get('sw-1'), (5, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import collections
+import os
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from Shopware.Client import ThreadedClient
+from Shopware.Tasks import APITask, MediaTask
+from Shopware.Media import MediaCache
+from Shopware.WorkQueue import ShardedQueue, SpillQueue
+
+from tests.fakes import FakeTransport, created
+
+
+class ShardedQueueTest(unittest.TestCase):
+
+    def testSameKeyIsNotHandedOutTwice(self):
+        ## Both workers share the single shard
+        tasks = ShardedQueue(1, idleWait=0.01)
+        first = APITask('articles', 'PUT', id=1, data={'seq': 1})
+        second = APITask('articles', 'PUT', id=1, data={'seq': 2})
+        other = APITask('articles', 'PUT', id=2, data={'seq': 3})
+        for task in (first, second, other):
+            tasks.put(task)
+        owner, thief = tasks.worker(0), tasks.worker(1)
+
+        self.assertIs(owner.get(timeout=1), first)
+        ## While the first task of the key runs, its next task is held back
+        self.assertIs(thief.get(timeout=1), other)
+        self.assertRaises(queue.Empty, thief.get, timeout=0.05)
+
+        owner.task_done()
+        self.assertIs(thief.get(timeout=1), second)
+
+    def testPerKeyOrderWithManyWorkers(self):
+        applied = collections.defaultdict(list)
+
+        def handler(method, resource, id, params, data):
+            time.sleep(random.random() * 0.002)
+            applied[id].append(data['seq'])
+            return created(method, resource, id, params, data)
+
+        client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=6, sharded=True, transport=FakeTransport(handler))
+        self.addCleanup(client.exit)
+
+        expected = collections.defaultdict(list)
+        for seq in range(300):
+            id = str(random.randint(1, 10))
+            expected[id].append(seq)
+            client.push('articles', 'PUT', id=id, data={'seq': seq})
+        self.assertTrue(client.join(10))
+
+        self.assertEqual(dict(applied), dict(expected))
+
+
+class SlowToPickle(object):
+    """Holds up the pickling of the task it belongs to until released"""
+
+    entered = threading.Event()
+    released = threading.Event()
+
+    def __reduce__(self):
+        SlowToPickle.entered.set()
+        SlowToPickle.released.wait(5)
+        return (SlowToPickle, ())
+
+
+class SpillQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def testOrderAndCallbacksAcrossSegments(self):
+        tasks = SpillQueue(maxInMemory=4, directory=self.directory, segmentSize=512)
+        self.addCleanup(tasks.close)
+
+        callbacks = {}
+        pushed = []
+        for seq in range(60):
+            success = lambda task, seq=seq: seq
+            error = lambda error, task, seq=seq: -seq
+            task = APITask('articles', 'PUT', id=seq, data={'seq': seq},
+                successCallback=success, errorCallback=error)
+            callbacks[seq] = (success, error)
+            tasks.put(task)
+            ## Keep some of them referenced, e.g. as a dependency would
+            if seq % 10 == 0:
+                pushed.append(task)
+
+        self.assertEqual(tasks.qsize(), 60)
+        self.assertGreater(len([name for name in os.listdir(self.directory)
+            if name.endswith('.segment')]), 1)
+
+        taken = [tasks.get(timeout=1) for seq in range(60)]
+        self.assertEqual([task.data['seq'] for task in taken], list(range(60)))
+        for task in taken:
+            seq = task.data['seq']
+            self.assertIs(task.successCallback, callbacks[seq][0])
+            self.assertIs(task.errorCallback, callbacks[seq][1])
+
+        ## Referenced tasks keep their identity
+        for task in pushed:
+            self.assertIs(taken[task.data['seq']], task)
+
+        ## Consumed segments are removed
+        self.assertRaises(queue.Empty, tasks.get, timeout=0.01)
+        self.assertEqual([name for name in os.listdir(self.directory)
+            if name.endswith('.segment')], [])
+
+    def testConcurrentPutsKeepTheirOrder(self):
+        tasks = SpillQueue(maxInMemory=1, directory=self.directory)
+        self.addCleanup(tasks.close)
+        self.addCleanup(SlowToPickle.released.set)
+
+        tasks.put(APITask('articles', 'PUT', id=0, data={'seq': 0}))
+        slow = threading.Thread(target=tasks.put, args=(
+            APITask('articles', 'PUT', id=1, data={'seq': 1, 'slow': SlowToPickle()}),))
+        slow.start()
+        self.assertTrue(SlowToPickle.entered.wait(5))
+        ## Pickled right away, but put after the slow one
+        fast = threading.Thread(target=tasks.put, args=(
+            APITask('articles', 'PUT', id=2, data={'seq': 2}),))
+        fast.start()
+        time.sleep(0.05)
+        SlowToPickle.released.set()
+        slow.join(5)
+        fast.join(5)
+
+        taken = [tasks.get(timeout=1) for seq in range(3)]
+        self.assertEqual([task.data['seq'] for task in taken], [0, 1, 2])
+
+    def testUnpicklableTasksKeepTheirPlace(self):
+        tasks = SpillQueue(maxInMemory=2, directory=self.directory, segmentSize=256)
+        self.addCleanup(tasks.close)
+
+        media = MediaTask(b'content', MediaCache())
+        for seq in range(5):
+            tasks.put(APITask('articles', 'PUT', id=seq, data={'seq': seq}))
+        tasks.put(media)
+        tasks.put(APITask('articles', 'PUT', id=5, data={'seq': 5}))
+
+        taken = [tasks.get(timeout=1) for seq in range(7)]
+        self.assertIs(taken[5], media)
+        self.assertEqual([task.data['seq'] for task in taken if task is not media],
+            list(range(6)))
+
+    def testClientWithSpilledBacklog(self):
+        transport = FakeTransport()
+        client = ThreadedClient('http://shop.test/api', 'user', 'key',
+            numThreads=2, spillAfter=5, spillDirectory=self.directory,
+            transport=transport)
+        self.addCleanup(client.exit)
+
+        results = []
+        for seq in range(100):
+            client.push('articles', 'PUT', id=seq, data={'seq': seq},
+                successCallback=lambda task: results.append(task.data['seq']))
+        self.assertTrue(client.join(10))
+        self.assertEqual(sorted(results), list(range(100)))
+        self.assertEqual(len(transport.sent()), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
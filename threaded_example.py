@@ -10,6 +10,7 @@ import time
 ## Get the actual client
 import Shopware.Request
 from Shopware.Client import ThreadedClient
+from Shopware.Callbacks import OrderedExecutor
 
 
 
@@ -19,12 +20,15 @@ class Example(object):
         self.successCounter = 0
         self.errorCounter = 0
 
-        ## Create a threaded client with the default of 3 threads
+        ## Create a threaded client with the default of 3 threads. The
+        ## callbacks run one after another in a separate thread, so the
+        ## counters need no locking and printing does not stall the workers
         self.client = ThreadedClient(
             "http://shopware.dev/api",
             "demo",
             "demo",
-            numThreads=3
+            numThreads=3,
+            callbackExecutor=OrderedExecutor()
         )
 
         ## Set default callbacks